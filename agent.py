@@ -1,36 +1,67 @@
 import asyncio
 import json
-from datetime import date, timedelta, datetime
-from collections import Counter
+import os
+from contextlib import contextmanager
+from config import AGENT_ORCHESTRATION
+from plugins.anomalie_plugin import AnomaliePlugin
 from plugins.metrics_plugin import MetricsPlugin
 from plugins.report_plugin import ReportPlugin
+from utils.client_ranking import clients_page_request
+from utils.order_sources import OrderStoreSource, default_source_path
+from utils.order_store import OrderStore
+from utils.period_query import parse_period_query
+from utils.tracing import serve_metrics_from_env, tracer
 
-try:
-    with open('data/pedidos.json', 'r', encoding='utf-8') as f:
-        PEDIDOS_JSON_STR = f.read()
-except FileNotFoundError:
+PEDIDOS_PATH = 'data/pedidos.json'
+
+if not os.path.exists(PEDIDOS_PATH):
     print("Erro: Arquivo 'data/pedidos.json' não encontrado. O agente não pode continuar.")
-    PEDIDOS_JSON_STR = "{}"
+
+@contextmanager
+def traced_turn(user_input: str):
+    """Agrupa os spans de um comando e, com AGENT_TRACING=1, imprime o tempo de cada etapa."""
+    with tracer.turn(user_input.strip()) as turn:
+        yield turn
+    if tracer.enabled:
+        print(f"\n[trace] {turn.format()}")
+
 
 async def run_agent():
     print("--- Executando agente em modo único ---")
     metrics_plugin = MetricsPlugin()
     
-    metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-    clients_metrics = metrics_plugin.query_clients_metrics(PEDIDOS_JSON_STR)
+    metrics, clients_metrics = metrics_plugin.stream_metrics(PEDIDOS_PATH)
 
     print("\n--- Métricas Gerais ---")
     print(json.dumps(metrics, indent=2, ensure_ascii=False))
     
-    print("\n--- Métricas de Clientes ---")
+    print("\n--- Métricas de Clientes (maiores gastos) ---")
     print(json.dumps(clients_metrics, indent=2, ensure_ascii=False))
 
 
 async def chat_loop():
-    print("\nDigite mensagens para o agente. Comandos disponíveis: /metrics, /clients_metrics, /anomalies, /exit")
+    print("\nDigite mensagens para o agente. Comandos disponíveis: /metrics, /clients_metrics, /periodo <quando>, /anomalies, /exit")
     context = {}
     metrics_plugin = MetricsPlugin()
     report_plugin = ReportPlugin()
+    anomalie_plugin = AnomaliePlugin(chat_service=report_plugin._chat)
+    source_path = default_source_path(PEDIDOS_PATH)
+    try:
+        # ORDER_SOURCE, o log append-only ou o JSON (com o snapshot binário quando em dia);
+        # a cada comando, `refresh()` só incorpora o que mudou na fonte.
+        order_source = metrics_plugin.load_order_source(source_path)
+    except FileNotFoundError:
+        order_source = OrderStoreSource(OrderStore())
+    except json.JSONDecodeError:
+        print(f"Erro: '{source_path}' não é um JSON válido.")
+        order_source = OrderStoreSource(OrderStore())
+    metrics_plugin.order_source = order_source
+    orchestrator = None
+    if AGENT_ORCHESTRATION == "kernel":
+        from plugins.kernel_orchestrator import KernelOrchestrator
+
+        orchestrator = KernelOrchestrator(metrics_plugin, anomalie_plugin, report_plugin)
+    history = []
 
     while True:
         try:
@@ -45,106 +76,170 @@ async def chat_loop():
             print("Tchau!")
             break
 
-        if user_input.strip().lower() == "/metrics":
-            metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-            context["metrics"] = metrics
+        added = order_source.refresh()
+        if added:
+            print(f"(fonte de pedidos atualizada: {added} pedido(s) lido(s))")
 
-            print("\n\n--- Métricas Gerais ---")
-            print(f"Restaurante: {metrics.get('restaurant_name')}")
+        with traced_turn(user_input):
+            if user_input.strip().lower() == "/metrics":
+                metrics = order_source.metrics()
+                context["metrics"] = metrics
 
-            grand_total = metrics.get('grand_total_sold', 0.0)
-            print(f"Valor Total Vendido: R$ {grand_total:.2f}")
+                print("\n\n--- Métricas Gerais ---")
+                print(f"Restaurante: {metrics.get('restaurant_name')}")
 
-            print("\nAnálise de Tempo de Preparo:")
-            
-            avg_today_seconds = metrics.get('avg_prep_today_seconds', 0)
-            if avg_today_seconds > 0:
-                avg_today_minutes = avg_today_seconds / 60
-                print(f"  Média (Hoje): {avg_today_minutes:.2f} minutos ({avg_today_seconds}s)")
-            else:
-                print("  Média (Hoje): Nenhum pedido concluído hoje.")
-
-            avg_30d_seconds = metrics.get('avg_prep_last_30d_seconds', 0)
-            if avg_30d_seconds > 0:
-                avg_30d_minutes = avg_30d_seconds / 60
-                print(f"  Média (Últimos 30 dias): {avg_30d_minutes:.2f} minutos ({avg_30d_seconds}s)")
-
-            avg_overall_seconds = metrics.get('avg_prep_overall_seconds', 0)
-            if avg_overall_seconds > 0:
-                avg_overall_minutes = avg_overall_seconds / 60
-                print(f"  Média (Geral): {avg_overall_minutes:.2f} minutos ({avg_overall_seconds}s)")
+                grand_total = metrics.get('grand_total_sold', 0.0)
+                print(f"Valor Total Vendido: R$ {grand_total:.2f}")
+
+                print("\nAnálise de Tempo de Preparo:")
             
-            avg_by_day = metrics.get('avg_prep_time_by_day_seconds', {})
-            if avg_by_day:
-                print("\n  Análise de Tempo por Dia da Semana (Média Geral):")
-                for day, seconds in avg_by_day.items():
-                    if seconds > 0:
-                        minutes = seconds / 60
-                        print(f"    - {day}: {minutes:.2f} min ({seconds}s)")
-
-            sales_by_month = metrics.get('sales_by_month', {})
-            print("\nAnálise Mensal de Vendas:")
-            for month, month_data in sales_by_month.items():
-                month_total = month_data.get('total_value_sold', 0.0)
-                print(f"\n  --- Mês: {month} ---")
-                print(f"    Valor Vendido no Mês: R$ {month_total:.2f}")
-                days_data = month_data.get('sales_by_day', {})
-                if days_data:
-                    print("    Pedidos por Dia da Semana:")
-                    for day, count in sorted(days_data.items()):
-                        print(f"      - {day}: {count} pedido(s)")
+                avg_today_seconds = metrics.get('avg_prep_today_seconds', 0)
+                if avg_today_seconds > 0:
+                    avg_today_minutes = avg_today_seconds / 60
+                    print(f"  Média (Hoje): {avg_today_minutes:.2f} minutos ({avg_today_seconds}s)")
+                else:
+                    print("  Média (Hoje): Nenhum pedido concluído hoje.")
+
+                avg_30d_seconds = metrics.get('avg_prep_last_30d_seconds', 0)
+                if avg_30d_seconds > 0:
+                    avg_30d_minutes = avg_30d_seconds / 60
+                    print(f"  Média (Últimos 30 dias): {avg_30d_minutes:.2f} minutos ({avg_30d_seconds}s)")
+
+                avg_overall_seconds = metrics.get('avg_prep_overall_seconds', 0)
+                if avg_overall_seconds > 0:
+                    avg_overall_minutes = avg_overall_seconds / 60
+                    print(f"  Média (Geral): {avg_overall_minutes:.2f} minutos ({avg_overall_seconds}s)")
+
+                # A média esconde a cauda lenta: os percentis mostram os pedidos que atrasam.
+                percentiles = metrics.get('prep_percentiles_seconds', {})
+                for label, key in (("Hoje", "today"), ("Últimos 30 dias", "30d"), ("Geral", "overall")):
+                    values = percentiles.get(key)
+                    if values and values["p50"] > 0:
+                        print(f"  Percentis ({label}): p50 {values['p50'] / 60:.2f} | p90 {values['p90'] / 60:.2f} | p99 {values['p99'] / 60:.2f} min")
             
-            top_products = metrics.get('top_products', [])
-            print("\nTop 3 Produtos Mais Vendidos:")
-            for i, product in enumerate(top_products, 1):
-                print(f"  {i}. {product.get('name')} - {product.get('sold')} unidades")
+                avg_by_day = metrics.get('avg_prep_time_by_day_seconds', {})
+                if avg_by_day:
+                    print("\n  Análise de Tempo por Dia da Semana (Média Geral):")
+                    for day, seconds in avg_by_day.items():
+                        if seconds > 0:
+                            minutes = seconds / 60
+                            print(f"    - {day}: {minutes:.2f} min ({seconds}s)")
+
+                sales_by_month = metrics.get('sales_by_month', {})
+                print("\nAnálise Mensal de Vendas:")
+                for month, month_data in sales_by_month.items():
+                    month_total = month_data.get('total_value_sold', 0.0)
+                    print(f"\n  --- Mês: {month} ---")
+                    print(f"    Valor Vendido no Mês: R$ {month_total:.2f}")
+                    days_data = month_data.get('sales_by_day', {})
+                    if days_data:
+                        print("    Pedidos por Dia da Semana:")
+                        for day, count in sorted(days_data.items()):
+                            print(f"      - {day}: {count} pedido(s)")
             
-            print("\n-------------------------------------\n")
-            continue
-
-        if user_input.strip().lower() == "/clients_metrics":
-            metrics = metrics_plugin.query_clients_metrics(PEDIDOS_JSON_STR)
-            context["clients_metrics"] = metrics
+                top_products = metrics.get('top_products', [])
+                print("\nTop 3 Produtos Mais Vendidos:")
+                for i, product in enumerate(top_products, 1):
+                    print(f"  {i}. {product.get('name')} - {product.get('sold')} unidades")
             
-            print("\n--- Métricas por Cliente ---")
-            print(f"{'Cliente':<20} | {'Pedidos':<7} | {'Total Gasto':<15}")
-            print("-" * 50)
-            for name, values in metrics.items():
-                total_gasto_str = f"R$ {values['valor_total_gasto']:.2f}"
-                print(f"{name:<20} | {values['numero_de_pedidos']:<7} | {total_gasto_str:<15}")
-            continue
+                print("\n-------------------------------------\n")
+                continue
+
+            if user_input.strip().lower().split(" ", 1)[0] == "/clients_metrics":
+                page = order_source.clients_page(**clients_page_request(user_input, context.get("clients_page")))
+                context["clients_page"] = page
+                order = "nº de pedidos" if page["sort_by"] == "numero_de_pedidos" else "valor gasto"
+
+                print(f"\n--- Métricas por Cliente ({page['offset'] + 1}-{page['offset'] + len(page['clients'])} de {page['total_clients']}, por {order}) ---")
+                print(f"{'#':<5} | {'Cliente':<20} | {'ID':<8} | {'Pedidos':<7} | {'Total Gasto':<15}")
+                print("-" * 68)
+                for position, client in enumerate(page["clients"], page["offset"] + 1):
+                    total_gasto_str = f"R$ {client['valor_total_gasto']:.2f}"
+                    print(f"{position:<5} | {client['nome']:<20} | {client['cliente_id']!s:<8} | {client['numero_de_pedidos']:<7} | {total_gasto_str:<15}")
+                if page["next_cursor"]:
+                    print("\n(/clients_metrics próxima para continuar; /clients_metrics pedidos para ordenar por pedidos)")
+                continue
         
-        if user_input.strip().lower() == "/anomalies":
-            print("\n🔎 Analisando métricas em busca de anomalias com a IA...")
-            
-            metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-            metrics_str = json.dumps(metrics, indent=2, ensure_ascii=False)
-
-            anomaly_prompt = f"""
-            Você é um analista de dados sênior especializado em operações de restaurantes.
-            Sua tarefa é encontrar anomalias, padrões interessantes ou pontos de risco nos dados de métricas a seguir.
-            Seja direto e aponte os achados em formato de lista (bullet points).
-            Considere correlações entre os dados, como tempo de preparo em dias específicos, vendas de produtos em certos meses, etc.
-            Se nada parecer fora do comum, apenas responda "Nenhuma anomalia significativa foi detectada.".
-
-            Aqui estão os dados das métricas:
-            {metrics_str}
-            """
-
-            response = await report_plugin._chat.complete(anomaly_prompt)
-            
-            print("\n--- Análise de Anomalias da IA ---")
-            print(response)
-            print("-------------------------------------\n")
-            continue
-
-        if user_input.strip().lower() == "/report":
-            print("O comando /report está temporariamente desativado.")
-            continue
-
-        print("Agente: Comando não reconhecido. Use /metrics, /clients_metrics ou /anomalies.")
+            if user_input.strip().lower() == "/anomalies":
+                print("\n🔎 Analisando o histórico em busca de anomalias...")
+
+                scan = metrics_plugin.scan_anomalies(order_source.anomaly_store())
+                findings = scan["findings"]
+                if not findings:
+                    # Nada sinalizado pelo monitoramento local: a IA não é chamada.
+                    print(f"Nenhuma anomalia significativa foi detectada ({scan['start_date']} a {scan['end_date']}).")
+                    continue
+
+                print(f"\n--- Anomalias ({scan['start_date']} a {scan['end_date']}) ---")
+                for finding in findings:
+                    print(f"  [{finding['severity']}] {finding['message']}")
+
+                print("\n--- Explicação da IA ---")
+                prompt_stats = []
+                try:
+                    # O prompt sai em JSON compacto e dentro do orçamento de tokens (PROMPT_TOKEN_BUDGET).
+                    async for chunk in anomalie_plugin.stream_anomalies_with_ai(
+                        metrics=order_source.metrics(), findings=findings, on_prompt_stats=prompt_stats.append
+                    ):
+                        print(chunk, end="", flush=True)
+                except RuntimeError as e:
+                    # O Gemini só é configurado no primeiro uso; sem chave, só os comandos locais funcionam.
+                    print(f"Erro: {e}")
+                for stats in prompt_stats:
+                    print(f"\n[prompt] {stats['prompt_tokens']} tokens estimados; {stats['saved_tokens']} tokens ({stats['saved_bytes']} bytes) economizados")
+                print("\n-------------------------------------\n")
+                continue
+
+            if user_input.strip().lower().split(maxsplit=1)[0] == "/periodo":
+                query = parse_period_query(
+                    user_input.strip().partition(" ")[2],
+                    product_names=order_source.product_names,
+                    client_names=order_source.client_names,
+                )
+                result = metrics_plugin.range_query(order_source, **query)
+                if "error" in result:
+                    print(f"Erro: {result['error']}")
+                    continue
+
+                print("\n--- Métricas do Período ---")
+                filters = ", ".join(f"{key}: {value}" for key, value in result["filters"].items() if value)
+                if filters:
+                    print(f"Filtros: {filters}")
+                periods = [("Atual", result["current"])]
+                if "previous" in result:
+                    periods.append(("Anterior", result["previous"]))
+                for label, period in periods:
+                    print(f"\n  {label} ({period['start_date']} a {period['end_date']}):")
+                    print(f"    Pedidos: {period['orders']} | Vendido: R$ {period['total_sold']:.2f} | Ticket médio: R$ {period['avg_ticket']:.2f}")
+                    print(f"    Preparo médio: {period['avg_prep_seconds'] / 60:.2f} min")
+                    for product in period["top_products"]:
+                        print(f"    - {product['name']}: {product['sold']} unidades")
+                if "change" in result:
+                    change = result["change"]
+                    pct = f" ({change['total_sold_pct']:+.1f}%)" if change["total_sold_pct"] is not None else ""
+                    print(f"\n  Variação: {change['orders']:+d} pedido(s), R$ {change['total_sold']:+.2f}{pct}")
+                continue
+
+            if user_input.strip().lower() == "/report":
+                print("O comando /report está temporariamente desativado.")
+                continue
+
+            if orchestrator is not None and not user_input.strip().startswith("/"):
+                # Perguntas livres: uma ida e volta ao modelo, com as métricas no contexto.
+                try:
+                    answer = await orchestrator.answer(user_input, history)
+                except RuntimeError as e:
+                    print(f"Erro: {e}")
+                    continue
+                history += [{"role": "user", "content": user_input}, {"role": "assistant", "content": answer}]
+                print(f"Agente: {answer}")
+                print(f"({orchestrator.last_turn['model_calls']} chamada(s) ao modelo; ferramentas: {', '.join(orchestrator.last_turn['tool_calls']) or 'nenhuma'})")
+                continue
+
+            print("Agente: Comando não reconhecido. Use /metrics, /clients_metrics, /periodo ou /anomalies.")
 
 if __name__ == "__main__":
+    serve_metrics_from_env()
     try:
         asyncio.run(chat_loop())
     except KeyboardInterrupt:
@@ -1,14 +1,20 @@
 import streamlit as st
-import asyncio
-import json
+import queue
 import pandas as pd
 import os
-from datetime import date, timedelta, datetime
-from collections import Counter
 from plugins.metrics_plugin import MetricsPlugin
 from plugins.report_plugin import ReportPlugin
 from plugins.anomalie_plugin import AnomaliePlugin
 from plugins.ai_router import AIIntentRouter
+from utils.anomaly_engine import format_findings
+from utils.async_utils import BackgroundLoop
+from utils.client_ranking import clients_page_request
+from utils.period_query import parse_period_query
+from utils.report_pipeline import format_anomalies_markdown
+from utils.report_scheduler import ReportIndex, ReportScheduler
+from utils.tracing import serve_metrics_from_env, tracer
+from utils.order_sources import default_source_path
+from config import AGENT_ORCHESTRATION, REPORT_REFRESH_SECONDS, REPORTS_DIR
 
 st.set_page_config(
     page_title="iFood Analytics Agent",
@@ -16,8 +22,84 @@ st.set_page_config(
     layout="wide"
 )
 
+PEDIDOS_PATH = 'data/pedidos.json'
+
+
+@st.cache_resource
+def get_resources() -> dict:
+    """Plugins, roteador e event loop compartilhados pelo processo (sobrevivem aos reruns)."""
+    serve_metrics_from_env()
+    report_plugin = ReportPlugin()
+    loop = BackgroundLoop()
+    metrics_plugin = MetricsPlugin()
+    anomalie_plugin = AnomaliePlugin()
+    # ORDER_SOURCE (JSON, log NDJSON ou SQLite); sem ele, o log append-only se existir, senão o JSON.
+    # A cada rerun, `refresh()` só incorpora o que mudou na fonte.
+    order_source = metrics_plugin.load_order_source(default_source_path(PEDIDOS_PATH))
+    metrics_plugin.order_source = order_source
+    # Relatório e anomalias pré-calculados em segundo plano; /report serve o último na hora.
+    report_scheduler = ReportScheduler(
+        loop,
+        metrics_plugin,
+        anomalie_plugin,
+        report_plugin,
+        PEDIDOS_PATH,
+        index=ReportIndex(REPORTS_DIR),
+        interval_seconds=REPORT_REFRESH_SECONDS,
+        order_source=order_source,
+    )
+    if REPORT_REFRESH_SECONDS > 0:
+        report_scheduler.start()
+    orchestrator = None
+    if AGENT_ORCHESTRATION == "kernel":
+        # Importado só neste modo: o Semantic Kernel custa segundos para carregar.
+        from plugins.kernel_orchestrator import KernelOrchestrator
+
+        orchestrator = KernelOrchestrator(metrics_plugin, anomalie_plugin, report_plugin)
+    return {
+        "loop": loop,
+        "metrics_plugin": metrics_plugin,
+        "report_plugin": report_plugin,
+        "anomalie_plugin": anomalie_plugin,
+        "router": AIIntentRouter(chat_service=report_plugin._chat),
+        "report_scheduler": report_scheduler,
+        "order_source": order_source,
+        "orchestrator": orchestrator,
+    }
+
+
+def format_period(period: dict) -> str:
+    line = f"{period['start_date']} a {period['end_date']}: **{period['orders']}** pedido(s), **R$ {period['total_sold']:.2f}**"
+    line += f" (ticket médio R$ {period['avg_ticket']:.2f}, preparo médio {round(period['avg_prep_seconds'] / 60, 1)} min)"
+    if period["top_products"]:
+        line += "<br>Mais vendidos: " + ", ".join(f"{product['name']} ({product['sold']})" for product in period["top_products"])
+    return line
+
+
+def format_clients_page(page: dict) -> str:
+    """Tabela só com os clientes da página, mais a indicação de como pedir a próxima."""
+    first = page["offset"] + 1
+    last = page["offset"] + len(page["clients"])
+    order = "nº de pedidos" if page["sort_by"] == "numero_de_pedidos" else "valor gasto"
+    lines = [
+        "### 👥 Métricas de Clientes\n",
+        f"_Clientes {first}–{last} de {page['total_clients']}, por {order}._\n",
+        "| # | Cliente | ID | Nº de Pedidos | Total Gasto (R$) |",
+        "| --- | --- | --- | --- | --- |",
+    ]
+    for position, client in enumerate(page["clients"], first):
+        lines.append(
+            f"| {position} | {client['nome']} | {client['cliente_id']} | {client['numero_de_pedidos']} | R$ {client['valor_total_gasto']:.2f} |"
+        )
+    if page["next_cursor"]:
+        lines.append("\nPara continuar: `/clients_metrics próxima` (ou `/clients_metrics pedidos` para ordenar por pedidos).")
+    return "\n".join(lines)
+
+
 if "messages" not in st.session_state: st.session_state.messages = []
 if "metrics" not in st.session_state: st.session_state.metrics = None
+if "last_trace" not in st.session_state: st.session_state.last_trace = None
+if "clients_page" not in st.session_state: st.session_state.clients_page = None
 
 st.title("👤 iFood Analytics Agent")
 st.markdown("""
@@ -29,23 +111,28 @@ st.sidebar.title("📊 Painel Rápido")
 st.sidebar.markdown("### Comandos Disponíveis")
 st.sidebar.markdown("""
 - `/metrics` - Atualizar métricas gerais
-- `/clients_metrics` - Ver métricas de clientes
-- `/anomalies` - Detectar anomalias com IA
-- `/report` - Gerar relatório completo
+- `/clients_metrics` - Ranking de clientes, página a página (`próxima`, `pedidos`)
+- `/periodo <quando>` - Métricas de um período (ex.: `/periodo sexta passada vs anterior`)
+- `/anomalies` - Última análise de anomalias (`/anomalies novo` refaz agora)
+- `/report` - Último relatório completo (`/report novo` gera outro agora)
 - `/clear` - Limpar conversa
 """)
 
 try:
-    with open('data/pedidos.json', 'r', encoding='utf-8') as f:
-        PEDIDOS_JSON_STR = f.read()
-    
-    report_plugin = ReportPlugin()
-    router = AIIntentRouter(chat_service=report_plugin._chat) 
-    metrics_plugin = MetricsPlugin()
-    anomalie_plugin = AnomaliePlugin()
-    
+    resources = get_resources()
+    loop = resources["loop"]
+    report_plugin = resources["report_plugin"]
+    router = resources["router"]
+    metrics_plugin = resources["metrics_plugin"]
+    anomalie_plugin = resources["anomalie_plugin"]
+    report_scheduler = resources["report_scheduler"]
+    order_source = resources["order_source"]
+    orchestrator = resources["orchestrator"]
+    if order_source.refresh():
+        st.session_state.metrics = None
+
     if st.session_state.metrics is None:
-        st.session_state.metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
+        st.session_state.metrics = order_source.metrics()
     
     if st.session_state.metrics:
         st.sidebar.markdown("---")
@@ -78,6 +165,12 @@ try:
         if m.get('top_products'):
             st.sidebar.markdown(f"**Mais vendido:** {m['top_products'][0]['name']}")
     
+    if tracer.enabled and st.session_state.last_trace:
+        trace = st.session_state.last_trace
+        with st.sidebar.expander("⏱️ Tempos do último turno"):
+            st.caption(f"'{trace['label']}': {trace['total_ms']} ms")
+            st.dataframe(pd.DataFrame(trace["spans"]).fillna(0), hide_index=True)
+
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"], unsafe_allow_html=True)
@@ -91,98 +184,147 @@ try:
             with st.spinner("Analisando..."):
                 response = ""
                 
-                clean_prompt = prompt.strip().lower()
-
-                if clean_prompt == "/clear":
-                    st.session_state.messages = []
-                    st.rerun()
-                else:
-                    intent = asyncio.run(router.route_intent_async(prompt))
-                    intent_function = intent.get("function")
-
-                    if clean_prompt == "/metrics":
-                        intent_function = "query_metrics"
-                    elif clean_prompt == "/clients_metrics":
-                        intent_function = "query_clients_metrics"
-                    elif clean_prompt == "/anomalies":
-                        intent_function = "detect_anomalies_with_ai"
-                    elif clean_prompt == "/report":
-                        intent_function = "generate_report"
-
-                    if intent_function == "query_metrics":
-                        metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-                        st.session_state.metrics = metrics
-                        response = f"### 📊 Métricas Gerais Atualizadas\n\n"
-                        response += f"**Valor Total Vendido:** R$ {metrics.get('grand_total_sold', 0.0):.2f}\n\n"
-                        response += "**Análise de Tempo de Preparo:**\n"
-                        avg_today_s = metrics.get('avg_prep_today_seconds', 0)
-                        avg_30d_s = metrics.get('avg_prep_30d_seconds', 0)
-                        avg_overall_s = metrics.get('avg_prep_seconds', 0)
-                        response += f"- **Hoje:** {round(avg_today_s / 60, 1)} min ({avg_today_s}s)\n"
-                        response += f"- **Últimos 30 Dias:** {round(avg_30d_s / 60, 1)} min ({avg_30d_s}s)\n"
-                        response += f"- **Geral (todo o período):** {round(avg_overall_s / 60, 1)} min ({avg_overall_s}s)\n"
-                        st.markdown(response)
-
-                    elif intent_function == "query_clients_metrics":
-                        client_metrics = metrics_plugin.query_clients_metrics(PEDIDOS_JSON_STR)
-                        if client_metrics:
-                            response = "### 👥 Métricas de Clientes\n\n"
-                            response += "| Cliente | Nº de Pedidos | Total Gasto (R$) |\n| --- | --- | --- |\n"
-                            for name, data in client_metrics.items():
-                                response += f"| {name} | {data['numero_de_pedidos']} | R$ {data['valor_total_gasto']:.2f} |\n"
+                with tracer.turn(prompt.strip()) as turn:
+                    clean_prompt = prompt.strip().lower()
+
+                    if clean_prompt == "/clear":
+                        st.session_state.messages = []
+                        st.rerun()
+                    else:
+                        # Comandos com barra e perguntas comuns são roteados localmente, sem chamar a IA.
+                        # No modo kernel, o resto vai direto ao orquestrador, sem a IA do roteador.
+                        intent = loop.run(router.route_intent_async(prompt, allow_llm=orchestrator is None))
+                        intent_function = intent.get("function")
+
+                        if intent_function == "query_metrics":
+                            metrics = order_source.metrics()
+                            st.session_state.metrics = metrics
+                            response = f"### 📊 Métricas Gerais Atualizadas\n\n"
+                            response += f"**Valor Total Vendido:** R$ {metrics.get('grand_total_sold', 0.0):.2f}\n\n"
+                            response += "**Análise de Tempo de Preparo:**\n"
+                            avg_today_s = metrics.get('avg_prep_today_seconds', 0)
+                            avg_30d_s = metrics.get('avg_prep_30d_seconds', 0)
+                            avg_overall_s = metrics.get('avg_prep_seconds', 0)
+                            response += f"- **Hoje:** {round(avg_today_s / 60, 1)} min ({avg_today_s}s)\n"
+                            response += f"- **Últimos 30 Dias:** {round(avg_30d_s / 60, 1)} min ({avg_30d_s}s)\n"
+                            response += f"- **Geral (todo o período):** {round(avg_overall_s / 60, 1)} min ({avg_overall_s}s)\n"
+                            percentiles = metrics.get('prep_percentiles_seconds', {})
+                            if percentiles:
+                                response += "\n**Percentis de Preparo (p50 / p90 / p99):**\n"
+                                for label, key in (("Hoje", "today"), ("Últimos 30 Dias", "30d"), ("Geral", "overall")):
+                                    values = percentiles[key]
+                                    response += f"- **{label}:** {' / '.join(f'{round(values[p] / 60, 1)} min' for p in ('p50', 'p90', 'p99'))}\n"
                             st.markdown(response)
-                        else:
-                            response = "Nenhuma métrica de cliente encontrada."
+
+                        elif intent_function == "query_clients_metrics":
+                            # Só a página pedida é montada e desenhada; o cursor fica na sessão.
+                            page = order_source.clients_page(**clients_page_request(prompt, st.session_state.clients_page))
+                            if page["clients"]:
+                                st.session_state.clients_page = page
+                                response = format_clients_page(page)
+                            else:
+                                response = "Nenhuma métrica de cliente encontrada."
                             st.markdown(response)
 
-                    elif intent_function == "detect_anomalies_with_ai":
-                        metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-                        response = asyncio.run(anomalie_plugin.detect_anomalies_with_ai(metrics=metrics))
-                        st.markdown(response)
-
-                    elif intent_function == "generate_report":
-                        st.info("Gerando relatório completo...")
-                        metrics = metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-                        st.info("Detectando anomalias com IA...")
-                        alerts_text = asyncio.run(anomalie_plugin.detect_anomalies_with_ai(metrics=metrics))
-                        alerts_list = [line.strip("* ") for line in alerts_text.split('\n') if line.strip()]
-                        st.info("Compilando o relatório final...")
-                        report_json_str = asyncio.run(
-                            report_plugin.generate_report(
-                                restaurant_name=metrics.get("restaurant_name", "N/A"),
-                                top_products=metrics.get("top_products", []),
-                                avg_prep_seconds=metrics.get("avg_prep_seconds", 0),
-                                avg_prep_today_seconds=metrics.get("avg_prep_today_seconds", 0),
-                                avg_prep_30d_seconds=metrics.get("avg_prep_30d_seconds", 0),
-                                alerts=alerts_list,
+                        elif intent_function == "query_range":
+                            question = prompt.strip()
+                            if question.startswith("/"):
+                                question = question.partition(" ")[2]
+                            query = parse_period_query(
+                                question,
+                                product_names=order_source.product_names,
+                                client_names=order_source.client_names,
                             )
-                        )
-                        try:
-                            report_data = json.loads(report_json_str)
-                            response = f"### 📄 {report_data.get('title', 'Relatório de Performance')}\n\n"
-                            response += f"**Resumo:** {report_data.get('summary', 'N/A')}\n\n"
-                            response += "**Recomendações da IA:**\n"
-                            for rec in report_data.get('recommendations', []):
-                                response += f"- {rec}\n"
-                        except json.JSONDecodeError:
-                            response = f"**Ocorreu um erro ao formatar o relatório. Resposta da IA:**\n\n{report_json_str}"
-                        
-                        reports_dir = "reports"
-                        os.makedirs(reports_dir, exist_ok=True)
-                        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                        file_name = f"report_{timestamp}.md"
-                        file_path = os.path.join(reports_dir, file_name)
-                        with open(file_path, "w", encoding="utf-8") as f:
-                            f.write(response)
-                        st.success(f"Relatório salvo em: `{file_path}`")
-                        st.markdown(response)
-
-                    else: 
-                        m = st.session_state.metrics if st.session_state.metrics else metrics_plugin.query_metrics(PEDIDOS_JSON_STR)
-                        context_info = f"Contexto para responder a pergunta: Desempenho de hoje (tempo de preparo): {m.get('avg_prep_today_seconds', 0)} segundos. Desempenho geral (tempo de preparo): {m.get('avg_prep_seconds', 0)} segundos. Pergunta do usuário: {prompt}"
-                        response = asyncio.run(report_plugin._chat.complete(context_info))
-                        st.markdown(response)
+                            result = metrics_plugin.range_query(order_source, **query)
+                            if "error" in result:
+                                response = f"❌ {result['error']}"
+                            else:
+                                filters = ", ".join(f"{key}: {value}" for key, value in result["filters"].items() if value)
+                                response = "### 📅 Métricas do Período\n\n"
+                                if filters:
+                                    response += f"_Filtros: {filters}_\n\n"
+                                response += f"- **Atual:** {format_period(result['current'])}\n"
+                                if "previous" in result:
+                                    change = result["change"]
+                                    response += f"- **Anterior:** {format_period(result['previous'])}\n\n"
+                                    pct = f" ({change['total_sold_pct']:+.1f}%)" if change["total_sold_pct"] is not None else ""
+                                    response += f"**Variação:** {change['orders']:+d} pedido(s), R$ {change['total_sold']:+.2f}{pct}\n"
+                            st.markdown(response, unsafe_allow_html=True)
+
+                        elif intent_function == "detect_anomalies_with_ai":
+                            latest = report_scheduler.latest()
+                            if latest is not None and "novo" not in clean_prompt.split()[1:]:
+                                # Análise já materializada pelo agendador: resposta imediata.
+                                if report_scheduler.is_stale(latest):
+                                    report_scheduler.request_refresh()
+                                response = f"_{report_scheduler.freshness(latest)}._\n\n{latest['anomalies_markdown']}"
+                                st.markdown(response)
+                            else:
+                                # O monitoramento local decide; a IA só explica o que foi sinalizado.
+                                scan = metrics_plugin.scan_anomalies(order_source.anomaly_store())
+                                findings = scan["findings"]
+                                if findings:
+                                    header = f"### 🔎 Anomalias ({scan['start_date']} a {scan['end_date']})\n\n{format_findings(findings)}\n\n"
+                                    st.markdown(header)
+                                    metrics = order_source.metrics()
+                                    explanation = st.write_stream(
+                                        loop.iterate(anomalie_plugin.stream_anomalies_with_ai(metrics=metrics, findings=findings))
+                                    )
+                                    response = header + explanation
+                                else:
+                                    response = format_anomalies_markdown(scan, "")
+                                    st.markdown(response)
+
+                        elif intent_function == "generate_report":
+                            latest = report_scheduler.latest()
+                            if latest is not None and "novo" not in clean_prompt.split()[1:]:
+                                if report_scheduler.is_stale(latest):
+                                    report_scheduler.request_refresh()
+                                response = f"_{report_scheduler.freshness(latest)}._\n\n{latest['report_markdown']}"
+                                st.markdown(response)
+                                with st.expander("Análise de anomalias"):
+                                    st.markdown(latest["anomalies_markdown"])
+                                st.caption(f"Arquivo: `{os.path.join(report_scheduler.index.reports_dir, latest['report_file'])}`")
+                            else:
+                                st.info("Gerando relatório completo (métricas, anomalias e relatório em um único pipeline)...")
+                                with st.expander("Análise de anomalias", expanded=True):
+                                    anomaly_placeholder = st.empty()
+                                anomaly_chunks = []
+                                # O pipeline roda no loop de fundo; os trechos voltam por uma fila
+                                # para serem desenhados na thread do script do Streamlit.
+                                chunk_queue = queue.SimpleQueue()
+                                refresh_future = loop.submit(
+                                    report_scheduler.refresh(force=True, on_anomaly_chunk=chunk_queue.put)
+                                )
+                                while not (refresh_future.done() and chunk_queue.empty()):
+                                    try:
+                                        anomaly_chunks.append(chunk_queue.get(timeout=0.05))
+                                    except queue.Empty:
+                                        continue
+                                    anomaly_placeholder.markdown("".join(anomaly_chunks))
+                                latest = refresh_future.result()
+                                response = latest["report_markdown"]
+                                file_path = os.path.join(report_scheduler.index.reports_dir, latest["report_file"])
+                                st.success(f"Relatório salvo em: `{file_path}`")
+                                st.markdown(response)
+                                pipeline_result = report_scheduler.last_pipeline_result
+                                with st.expander("Tempos do pipeline"):
+                                    st.caption(f"Total: {pipeline_result.total_ms:.0f} ms")
+                                    st.table(pd.DataFrame(pipeline_result.timings).T)
+
+                        elif orchestrator is not None:
+                            # Uma ida e volta com as métricas no contexto; ferramentas só quando preciso.
+                            response = loop.run(orchestrator.answer(prompt, st.session_state.messages[:-1]))
+                            st.markdown(response)
+
+                        else: 
+                            m = st.session_state.metrics if st.session_state.metrics else order_source.metrics()
+                            context_info = f"Contexto para responder a pergunta: Desempenho de hoje (tempo de preparo): {m.get('avg_prep_today_seconds', 0)} segundos. Desempenho geral (tempo de preparo): {m.get('avg_prep_seconds', 0)} segundos. Pergunta do usuário: {prompt}"
+                            response = st.write_stream(loop.iterate(report_plugin._chat.stream(context_info)))
                 
+                if tracer.enabled:
+                    st.session_state.last_trace = {"label": turn.label, "total_ms": round(turn.duration_ms, 1), "spans": turn.breakdown()}
+
                 st.session_state.messages.append({"role": "assistant", "content": response})
                 st.rerun()
 
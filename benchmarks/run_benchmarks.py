@@ -0,0 +1,352 @@
+"""
+Benchmarks dos caminhos quentes: tempo de import dos pontos de entrada, métricas (vazão e
+pico de memória por tamanho de histórico) e latência do roteador, do relatório e do modo kernel contra um LLM
+falso com atraso configurável.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.run_benchmarks --sizes 1000,10000,100000 --llm-delay 0.2
+
+Os resultados vão para um JSON em `benchmarks/results/`, para comparar entre versões.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from connectors.chat_transport import FakeChatTransport
+from connectors.gemini_connector import GeminiChatService
+from plugins.ai_router import AIIntentRouter
+from plugins.metrics_plugin import MetricsPlugin
+from plugins.report_plugin import ReportPlugin
+from utils.anomaly_engine import scan_order_history
+from utils.columnar_metrics import calculate_store_metrics
+from utils.dataset_cache import DatasetCache
+from utils.order_log import OrderFeed, OrderLog, import_legacy
+from utils.order_sources import OrderStoreSource
+from utils.order_store import OrderStore
+from utils.sqlite_orders import SQLiteOrderSource, import_orders
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders, write_orders
+
+ROUTER_PROMPTS = [
+    "/metrics",
+    "/report",
+    "quais os principais dados?",
+    "quem são meus melhores clientes?",
+    "veja se tem algo de errado nos números",
+    "me mostre o resumo de performance",
+    "olá, tudo bem?",
+    "qual prato devo colocar em promoção amanhã?",
+]
+
+# Pontos de entrada cujo import não deve carregar o SDK do Gemini nem o Semantic Kernel.
+STARTUP_MODULES = ["main", "agent", "plugins.metrics_plugin", "plugins.ai_router", "plugins.report_plugin"]
+HEAVY_MODULES = ["google.generativeai", "semantic_kernel"]
+
+# Pergunta livre que o roteador local não resolve: no modo "router" custa roteamento + resposta.
+FREE_FORM_PROMPT = "qual prato devo colocar em promoção amanhã?"
+
+FAKE_REPORT = '{"title": "Relatório", "summary": "ok", "top_products": [], "alerts": [], "recommendations": []}'
+
+
+def _timed(func, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _peak_memory_mb(func) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1e6, 3)
+    finally:
+        tracemalloc.stop()
+
+
+def _summary(samples: list, orders: int | None = None) -> dict:
+    best = min(samples)
+    result = {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "best_ms": round(best * 1000, 3),
+    }
+    if orders:
+        result["orders_per_second"] = round(orders / best, 1) if best > 0 else None
+    return result
+
+
+def bench_startup(repeat: int) -> dict:
+    """Import de cada ponto de entrada num interpretador novo e sem GEMINI_API_KEY."""
+    env = {key: value for key, value in os.environ.items() if key != "GEMINI_API_KEY"}
+    code = (
+        "import importlib, json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "importlib.import_module(sys.argv[1])\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    results = {}
+    for module in STARTUP_MODULES:
+        samples = []
+        heavy = []
+        for _ in range(repeat):
+            completed = subprocess.run([sys.executable, "-c", code, module], env=env, capture_output=True, text=True)
+            if completed.returncode != 0:
+                results[module] = {"error": completed.stderr.strip().splitlines()[-1:]}
+                break
+            measured = json.loads(completed.stdout.strip().splitlines()[-1])
+            samples.append(measured["seconds"])
+            heavy = measured["heavy"]
+        else:
+            results[module] = {**_summary(samples), "heavy_modules_loaded": heavy}
+    return results
+
+
+def bench_metrics(size: int, workdir: str, repeat: int, backends: list, seed: int) -> dict:
+    path = write_orders(os.path.join(workdir, f"pedidos_{size}.json"), size, seed=seed)
+    with open(path, "r", encoding="utf-8") as f:
+        pedidos_json_str = f.read()
+
+    entry = {"orders": size, "file_mb": round(os.path.getsize(path) / 1e6, 3), "operations": {}}
+    operations = entry["operations"]
+
+    for backend in backends:
+        # Cache novo a cada chamada: mede o caminho frio (parse + agregação).
+        def cold_metrics(backend=backend):
+            MetricsPlugin(cache=DatasetCache(), backend=backend).query_metrics(pedidos_json_str)
+
+        operations[f"query_metrics[{backend}]"] = {
+            **_summary(_timed(cold_metrics, repeat), size),
+            "peak_memory_mb": _peak_memory_mb(cold_metrics),
+        }
+
+    pedidos_data = json.loads(pedidos_json_str)
+    order_store = OrderStore.from_pedidos_data(pedidos_data)
+    operations["order_store"] = {
+        **_summary(_timed(lambda: OrderStore.from_pedidos_data(pedidos_data), repeat), size),
+        "columns_mb": round(order_store.nbytes() / 1e6, 3),
+        "peak_memory_mb": _peak_memory_mb(lambda: OrderStore.from_pedidos_data(pedidos_data)),
+    }
+    operations["order_store_aggregate"] = _summary(_timed(order_store._aggregate, repeat), size)
+    # Mesmas colunas, agregação vetorizada (backend `pandas`); deve ficar uma ordem de grandeza abaixo.
+    operations["order_store_aggregate[columnar]"] = _summary(_timed(lambda: calculate_store_metrics(order_store), repeat), size)
+    operations["anomaly_scan"] = _summary(_timed(lambda: scan_order_history(order_store), repeat), size)
+    del pedidos_data, order_store
+
+    warm_plugin = MetricsPlugin(cache=DatasetCache())
+    warm_plugin.query_metrics(pedidos_json_str)
+    operations["query_metrics[warm_cache]"] = _summary(_timed(lambda: warm_plugin.query_metrics(pedidos_json_str), repeat), size)
+
+    def cold_clients():
+        MetricsPlugin(cache=DatasetCache()).query_clients_metrics(pedidos_json_str)
+
+    operations["query_clients_metrics"] = {
+        **_summary(_timed(cold_clients, repeat), size),
+        "peak_memory_mb": _peak_memory_mb(cold_clients),
+    }
+
+    client_table = warm_plugin.order_store(pedidos_json_str).client_table()
+    first_page = client_table.page()
+    operations["clients_page[next]"] = _summary(
+        _timed(lambda: client_table.page(cursor=first_page["next_cursor"]), repeat), size
+    )
+
+    def streamed():
+        MetricsPlugin().stream_metrics(path)
+
+    operations["stream_metrics"] = {
+        **_summary(_timed(streamed, repeat), size),
+        "peak_memory_mb": _peak_memory_mb(streamed),
+    }
+
+    metrics = warm_plugin.query_metrics(pedidos_json_str)
+    operations["detect_anomalies"] = _summary(_timed(lambda: warm_plugin.detect_anomalies(metrics), repeat))
+
+    # Log append-only: retomar do checkpoint e incorporar 1000 pedidos novos não dependem do histórico.
+    log_path = os.path.join(workdir, f"pedidos_{size}.ndjson")
+    import_legacy(path, log_path)
+    feed = OrderFeed.open(log_path)
+    operations["order_log[resume]"] = _summary(_timed(lambda: OrderFeed.open(log_path), repeat), size)
+    new_orders = list(generate_orders(1000, seed=seed + 1))
+
+    def poll_new_orders():
+        OrderLog(log_path).append(new_orders)
+        feed.poll()
+
+    operations["order_log[poll_1000]"] = _summary(_timed(poll_new_orders, repeat), len(new_orders))
+    for leftover in (log_path, feed.checkpoint_path, feed.snapshot_path):
+        os.remove(leftover)
+
+    # SQLite indexado: importação, métricas e resumo de período saem de agregações em SQL.
+    db_path = os.path.join(workdir, f"pedidos_{size}.db")
+    started = time.perf_counter()
+    import_orders(path, db_path)
+    operations["sqlite[import]"] = _summary([time.perf_counter() - started], size)
+    source = SQLiteOrderSource(db_path)
+    operations["sqlite[metrics]"] = _summary(_timed(lambda: SQLiteOrderSource(db_path).metrics(), repeat), size)
+    last_day = datetime.fromisoformat(max(pedido["data_pedido"] for pedido in new_orders)).date()
+    operations["sqlite[summarize_30d]"] = _summary(
+        _timed(lambda: source.summarize(last_day - timedelta(days=30), last_day), repeat), size
+    )
+    first_page = source.clients_page()
+    operations["sqlite[clients_page_next]"] = _summary(
+        _timed(lambda: source.clients_page(cursor=first_page["next_cursor"]), repeat), size
+    )
+    source.close()
+    for leftover in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+    os.remove(path)
+    return entry
+
+
+async def bench_llm_paths(delay: float, repeat: int) -> dict:
+    def respond(prompt: str) -> str:
+        if "JSON no formato" in prompt:
+            return FAKE_REPORT
+        return '{"plugin": "MetricsPlugin", "function": "query_metrics"}'
+
+    chat = GeminiChatService(transport=FakeChatTransport(responder=respond, delay=delay), cache=None)
+    router = AIIntentRouter(chat_service=chat)
+    report_plugin = ReportPlugin(chat_service=chat)
+
+    router_samples = {}
+    for prompt in ROUTER_PROMPTS:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            intent = await router.route_intent_async(prompt)
+            samples.append(time.perf_counter() - started)
+        router_samples[prompt] = {"tier": intent.get("tier"), **_summary(samples)}
+
+    report_samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await report_plugin.generate_report(
+            restaurant_name="Restaurante Sintético",
+            top_products=[{"name": "Tapioca", "sold": 10}],
+            avg_prep_seconds=900,
+            avg_prep_today_seconds=950,
+            avg_prep_30d_seconds=880,
+            alerts=[],
+        )
+        report_samples.append(time.perf_counter() - started)
+
+    # Pergunta livre no modo "router": a IA escolhe a função e depois responde (duas chamadas).
+    # Serviço próprio e sem teto de taxa, para medir só as idas e voltas.
+    free_form_chat = GeminiChatService(
+        transport=FakeChatTransport(responder=respond, delay=delay), cache=None, requests_per_minute=float("inf")
+    )
+    free_form_router = AIIntentRouter(chat_service=free_form_chat)
+    free_form_samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await free_form_router.route_intent_async(FREE_FORM_PROMPT)
+        await free_form_chat.complete(FREE_FORM_PROMPT)
+        free_form_samples.append(time.perf_counter() - started)
+
+    return {
+        "llm_delay_seconds": delay,
+        "router": router_samples,
+        "router_tiers": router.routing_stats(),
+        "report_plugin": _summary(report_samples),
+        "router_free_form": {"model_calls": 2, **_summary(free_form_samples)},
+        "kernel": await bench_kernel_orchestrator(delay, repeat, report_plugin),
+    }
+
+
+async def bench_kernel_orchestrator(delay: float, repeat: int, report_plugin: ReportPlugin) -> dict:
+    """Modo kernel com o chat falso: pergunta respondida pelo contexto x duas ferramentas em paralelo."""
+    # Importado aqui: o Semantic Kernel não entra no tempo de import medido em `bench_startup`.
+    from connectors.kernel_chat import FakeKernelChatCompletion, tool_call
+    from plugins.anomalie_plugin import AnomaliePlugin
+    from plugins.kernel_orchestrator import KernelOrchestrator
+
+    orders = list(generate_orders(10000))
+    order_store = OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": orders})
+    end = max(order["data_pedido"] for order in orders)[:10]
+    start = (datetime.fromisoformat(end) - timedelta(days=6)).date().isoformat()
+
+    def respond(chat_history, tools):
+        if chat_history.messages[-1].role == "user" and "semana" in chat_history.messages[-1].content:
+            return [
+                tool_call("MetricsPlugin-get_period_metrics", start_date=start, end_date=end, compare_previous=True),
+                tool_call("MetricsPlugin-get_anomalies"),
+            ]
+        return "Resposta."
+
+    chat_completion = FakeKernelChatCompletion(responder=respond, delay=delay)
+    metrics_plugin = MetricsPlugin(order_source=OrderStoreSource(order_store))
+    orchestrator = KernelOrchestrator(metrics_plugin, AnomaliePlugin(chat_service=report_plugin._chat), report_plugin, chat_completion=chat_completion)
+
+    entry = {}
+    for label, question in (("context_only", FREE_FORM_PROMPT), ("parallel_tools", "como foi a última semana?")):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await orchestrator.answer(question)
+            samples.append(time.perf_counter() - started)
+        entry[label] = {**orchestrator.last_turn, **_summary(samples)}
+    return entry
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> str:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="tamanhos de histórico, separados por vírgula (até 10000000)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backends", default="python,pandas")
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="atraso (s) do LLM falso")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    backends = [backend for backend in args.backends.split(",") if backend]
+
+    results = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "metrics": [],
+    }
+    print("Tempo de import dos pontos de entrada...")
+    results["startup"] = bench_startup(args.repeat)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"Métricas com {size} pedidos...")
+            results["metrics"].append(bench_metrics(size, workdir, args.repeat, backends, args.seed))
+
+    print("Roteador, relatório e modo kernel com LLM falso...")
+    results["llm"] = asyncio.run(bench_llm_paths(args.llm_delay, args.repeat))
+
+    output = args.output or os.path.join("benchmarks", "results", f"benchmark_{datetime.now():%Y-%m-%d_%H-%M-%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em: {output}")
+    return output
+
+
+if __name__ == "__main__":
+    main()
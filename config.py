@@ -1,17 +1,66 @@
 import os
+import threading
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 
 load_dotenv()
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise RuntimeError("GEMINI_API_KEY environment variable is not set.")
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
-genai.configure(api_key=api_key)
+# Opt-in response cache for GeminiChatService (see connectors/response_cache.py)
+GEMINI_CACHE_ENABLED = os.getenv("GEMINI_CACHE", "").strip().lower() in {"1", "true", "yes", "on"}
+GEMINI_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "3600"))
+GEMINI_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "256"))
+GEMINI_CACHE_DB = os.getenv("GEMINI_CACHE_DB") or None
 
-# Expose a configured Gemini model instance for the app
-gemini_model = genai.GenerativeModel("gemini-2.0-flash")
+# Shared connector limits (see connectors/gemini_connector.py)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_RATE_BURST = float(os.getenv("GEMINI_RATE_BURST", "5"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
 
+# Estimated-token budget for metrics-heavy prompts (see utils/prompt_utils.py)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
 
+# Append-only order log tailed by the CLI and the app when present (see utils/order_log.py)
+ORDER_LOG_PATH = os.getenv("ORDER_LOG_PATH", "data/pedidos.ndjson")
+
+# Order data source (.json, .ndjson or .db/.sqlite); unset picks the log, then the legacy JSON
+ORDER_SOURCE = os.getenv("ORDER_SOURCE") or None
+
+# Free-form questions: "router" (intent router + LLM answer) or "kernel" (Semantic Kernel function calling)
+AGENT_ORCHESTRATION = os.getenv("AGENT_ORCHESTRATION", "router").strip().lower()
+
+# Background refresh of /report and /anomalies (see utils/report_scheduler.py); 0 disables it
+REPORT_REFRESH_SECONDS = float(os.getenv("REPORT_REFRESH_SECONDS", "3600"))
+REPORTS_DIR = os.getenv("REPORTS_DIR", "reports")
+
+_gemini_model = None
+_gemini_lock = threading.Lock()
+
+
+def get_gemini_model():
+    """
+    Configures the Gemini SDK and builds the model on first use, so that importing
+    this module (and local-only commands such as /metrics) needs neither the key nor the SDK.
+    """
+    global _gemini_model
+    if _gemini_model is None:
+        with _gemini_lock:
+            if _gemini_model is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise RuntimeError("GEMINI_API_KEY environment variable is not set.")
+
+                import google.generativeai as genai
+
+                genai.configure(api_key=api_key)
+                _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _gemini_model
+
+
+def __getattr__(name):
+    # Backwards compatible `from config import gemini_model`, now built lazily.
+    if name == "gemini_model":
+        return get_gemini_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,58 @@
+import asyncio
+import inspect
+
+
+class TransientChatError(Exception):
+    """Falha temporária do backend (quota, indisponibilidade); a chamada pode ser repetida."""
+
+
+class ChatTransport:
+    """
+    Interface mínima de um backend de chat usado pelo GeminiChatService.
+    Implementações devem levantar `TransientChatError` (ou um erro listado em
+    `retryable_errors`) para falhas que valem nova tentativa.
+    """
+
+    model_name = "unknown"
+    retryable_errors: tuple = (TransientChatError,)
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str):
+        """Itera os pedaços de texto da resposta; por padrão entrega a resposta inteira de uma vez."""
+        yield await self.generate(prompt)
+
+
+class FakeChatTransport(ChatTransport):
+    """
+    Backend local para testes offline: responde com `responder(prompt)`, com a
+    próxima resposta da lista `responses` ou com um eco do prompt, após `delay` segundos.
+    """
+
+    model_name = "fake-chat"
+
+    def __init__(self, responses: list[str] | None = None, responder=None, delay: float = 0.0, chunk_size: int = 20) -> None:
+        self._responses = list(responses or [])
+        self._responder = responder
+        self._delay = delay
+        self._chunk_size = chunk_size
+        self.calls = []
+
+    async def generate(self, prompt: str) -> str:
+        self.calls.append(prompt)
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        if self._responder is not None:
+            response = self._responder(prompt)
+            return await response if inspect.isawaitable(response) else response
+        if self._responses:
+            return self._responses.pop(0)
+        return f"[fake] {prompt[-200:]}"
+
+    async def stream(self, prompt: str):
+        # O atraso fica no primeiro pedaço, simulando o time-to-first-token.
+        text = await self.generate(prompt)
+        for start in range(0, len(text), self._chunk_size):
+            yield text[start:start + self._chunk_size]
+            await asyncio.sleep(0)
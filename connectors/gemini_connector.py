@@ -1,17 +1,264 @@
 import asyncio
+import functools
+import threading
+import time
+import weakref
 from typing import Any, Dict
 
-from config import gemini_model
+from config import (
+    GEMINI_CACHE_DB,
+    GEMINI_CACHE_ENABLED,
+    GEMINI_CACHE_MAX_ENTRIES,
+    GEMINI_CACHE_TTL_SECONDS,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_RETRIES,
+    GEMINI_MODEL_NAME,
+    GEMINI_RATE_BURST,
+    GEMINI_REQUESTS_PER_MINUTE,
+    get_gemini_model,
+)
+from connectors.chat_transport import ChatTransport, TransientChatError
+from connectors.rate_limit import ConcurrencyLimit, TokenBucket, backoff_delay
+from connectors.response_cache import ResponseCache
+from utils.tracing import tracer
+
+_default_cache = None
+_shared_service = None
+_shared_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache | None:
+    """Cache compartilhado por todas as instâncias, criado só se `GEMINI_CACHE` estiver ativo."""
+    global _default_cache
+    if GEMINI_CACHE_ENABLED and _default_cache is None:
+        _default_cache = ResponseCache(
+            max_entries=GEMINI_CACHE_MAX_ENTRIES,
+            ttl_seconds=GEMINI_CACHE_TTL_SECONDS,
+            db_path=GEMINI_CACHE_DB,
+        )
+    return _default_cache
+
+
+@functools.cache
+def gemini_retryable_errors() -> tuple:
+    """Erros de quota/indisponibilidade do Gemini que valem nova tentativa (import adiado)."""
+    import google.api_core.exceptions as google_exceptions
+
+    return (
+        TransientChatError,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.TooManyRequests,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+
+
+class GeminiTransport(ChatTransport):
+    """O SDK do Gemini só é importado e configurado na primeira chamada ao modelo."""
+
+    def __init__(self, model=None) -> None:
+        self._model_override = model
+        if model is not None:
+            self.model_name = getattr(model, "model_name", "gemini")
+        else:
+            # Mesmo nome que o SDK expõe, para as chaves do cache não mudarem.
+            self.model_name = GEMINI_MODEL_NAME if "/" in GEMINI_MODEL_NAME else f"models/{GEMINI_MODEL_NAME}"
+        self._async_loop = None
+
+    @property
+    def _model(self):
+        return self._model_override or get_gemini_model()
+
+    @property
+    def retryable_errors(self) -> tuple:
+        return gemini_retryable_errors()
+
+    def _uses_native_async(self) -> bool:
+        # O cliente gRPC assíncrono fica preso ao primeiro event loop que o usou;
+        # em outro loop (ex.: um asyncio.run avulso) usamos a API bloqueante numa thread.
+        loop = asyncio.get_running_loop()
+        if self._async_loop is None:
+            self._async_loop = loop
+        return loop is self._async_loop
+
+    async def generate(self, prompt: str) -> str:
+        if self._uses_native_async():
+            response = await self._model.generate_content_async(prompt)
+        else:
+            response = await asyncio.to_thread(self._model.generate_content, prompt)
+        _annotate_usage(response)
+        return response.text if hasattr(response, "text") else str(response)
+
+    async def stream(self, prompt: str):
+        if self._uses_native_async():
+            response = await self._model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    yield text
+            _annotate_usage(response)
+            return
+
+        chunks = await asyncio.to_thread(lambda: iter(self._model.generate_content(prompt, stream=True)))
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, done)
+            if chunk is done:
+                return
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+
+
+def _annotate_usage(response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        tracer.annotate(
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            response_tokens=getattr(usage, "candidates_token_count", 0) or 0,
+            total_tokens=getattr(usage, "total_token_count", 0) or 0,
+        )
+
+
+def _chunk_text(chunk) -> str:
+    try:
+        return chunk.text
+    except ValueError:
+        # Pedaços sem partes de texto (ex.: só o finish_reason) não têm `.text`.
+        return ""
+
 
 class GeminiChatService:
-    def __init__(self) -> None:
-        self._model = gemini_model
+    """
+    Conector de chat com limite de concorrência, rate limit (token bucket), retry com
+    backoff exponencial e coalescência de prompts idênticos em andamento (singleflight).
+    O backend é plugável via `transport`; use `get_chat_service()` para a instância compartilhada.
+    """
+
+    def __init__(
+        self,
+        cache: ResponseCache | None = None,
+        transport: ChatTransport | None = None,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+        rate_burst: float = GEMINI_RATE_BURST,
+        max_retries: int = GEMINI_MAX_RETRIES,
+    ) -> None:
+        self._transport = transport or GeminiTransport()
+        self._model_name = self._transport.model_name
+        self._cache = cache if cache is not None else get_default_cache()
+        # Concorrência e rate limit valem para todos os event loops/threads que usam a instância.
+        self._concurrency = ConcurrencyLimit(max_concurrency)
+        self._rate_limiter = TokenBucket(requests_per_minute / 60.0, rate_burst)
+        self._max_retries = max_retries
+        # As tasks em andamento (singleflight) são ligadas a um event loop; um dict por loop.
+        self._per_loop = weakref.WeakKeyDictionary()
+
+    @property
+    def cache(self) -> ResponseCache | None:
+        return self._cache
+
+    @property
+    def transport(self) -> ChatTransport:
+        return self._transport
+
+    def _in_flight(self) -> dict:
+        loop = asyncio.get_running_loop()
+        in_flight = self._per_loop.get(loop)
+        if in_flight is None:
+            in_flight = self._per_loop[loop] = {}
+        return in_flight
 
     async def complete(self, prompt: str) -> str:
-        response = await asyncio.to_thread(self._model.generate_content, prompt)
-        return response.text if hasattr(response, "text") else str(response)
+        with tracer.span("llm.complete", model=self._model_name, prompt_chars=len(prompt)) as span:
+            key = ResponseCache.make_key(self._model_name, prompt)
+            if self._cache is not None:
+                cached = self._cache.get(key)
+                span.set(cache_hit=cached is not None)
+                if cached is not None:
+                    span.set(response_chars=len(cached))
+                    return cached
+
+            in_flight = self._in_flight()
+            task = in_flight.get(key)
+            span.set(coalesced=task is not None)
+            if task is None:
+                task = asyncio.ensure_future(self._generate(prompt, key))
+                in_flight[key] = task
+                task.add_done_callback(lambda _: in_flight.pop(key, None))
+            # shield: se um dos chamadores for cancelado, os demais continuam esperando a mesma chamada.
+            text = await asyncio.shield(task)
+            span.set(response_chars=len(text))
+            return text
+
+    async def _generate(self, prompt: str, key: str) -> str:
+        async with self._concurrency:
+            attempt = 0
+            while True:
+                await self._rate_limiter.acquire()
+                try:
+                    text = await self._transport.generate(prompt)
+                    break
+                except self._transport.retryable_errors:
+                    if attempt >= self._max_retries:
+                        raise
+                    await asyncio.sleep(backoff_delay(attempt))
+                    attempt += 1
+
+        if self._cache is not None:
+            self._cache.set(key, text)
+        return text
+
+    async def stream(self, prompt: str):
+        """
+        Itera os pedaços de texto à medida que chegam do modelo. Só há retry antes do
+        primeiro pedaço; a resposta completa vai para o cache ao final. Streams não
+        são coalescidos: para o texto inteiro use `complete`.
+        """
+        with tracer.span("llm.stream", model=self._model_name, prompt_chars=len(prompt)) as span:
+            key = ResponseCache.make_key(self._model_name, prompt)
+            if self._cache is not None:
+                cached = self._cache.get(key)
+                span.set(cache_hit=cached is not None)
+                if cached is not None:
+                    span.set(response_chars=len(cached))
+                    yield cached
+                    return
+
+            started = time.perf_counter()
+            chunks = []
+            async with self._concurrency:
+                attempt = 0
+                while True:
+                    await self._rate_limiter.acquire()
+                    try:
+                        async for chunk in self._transport.stream(prompt):
+                            if not chunks:
+                                span.set(time_to_first_chunk_ms=round((time.perf_counter() - started) * 1000, 3))
+                            chunks.append(chunk)
+                            yield chunk
+                        break
+                    except self._transport.retryable_errors:
+                        if chunks or attempt >= self._max_retries:
+                            raise
+                        await asyncio.sleep(backoff_delay(attempt))
+                        attempt += 1
+
+            response = "".join(chunks)
+            span.set(chunks=len(chunks), response_chars=len(response))
+            if self._cache is not None:
+                self._cache.set(key, response)
 
     async def complete_json(self, prompt: str) -> str:
         return await self.complete(prompt)
 
 
+def get_chat_service() -> GeminiChatService:
+    """Instância única do conector, compartilhada por todos os plugins do processo."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = GeminiChatService()
+    return _shared_service
@@ -0,0 +1,276 @@
+import asyncio
+import functools
+import inspect
+import json
+import threading
+from typing import Any, ClassVar
+
+from pydantic import PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceType
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents import (
+    AuthorRole,
+    ChatHistory,
+    ChatMessageContent,
+    FunctionCallContent,
+    FunctionResultContent,
+    TextContent,
+)
+
+from config import GEMINI_MAX_RETRIES, GEMINI_MODEL_NAME, GEMINI_RATE_BURST, GEMINI_REQUESTS_PER_MINUTE, get_gemini_model
+from connectors.gemini_connector import gemini_retryable_errors
+from connectors.rate_limit import TokenBucket, backoff_delay
+from utils.tracing import tracer
+
+# O Gemini não aceita "-" (separador do Semantic Kernel) nos nomes das funções.
+TOOL_NAME_SEPARATOR = "__"
+TOOL_MODES = {
+    FunctionChoiceType.AUTO: "AUTO",
+    FunctionChoiceType.NONE: "NONE",
+    FunctionChoiceType.REQUIRED: "ANY",
+}
+
+RETRYABLE_ERRORS = gemini_retryable_errors()
+
+_shared_completion = None
+_shared_lock = threading.Lock()
+
+
+class KernelChatSettings(PromptExecutionSettings):
+    """Declarações das ferramentas e modo de chamada, preenchidos pelo `FunctionChoiceBehavior`."""
+
+    tools: list[dict[str, Any]] | None = None
+    tool_mode: str | None = None
+
+
+def tool_declaration(metadata) -> dict:
+    """Declaração de uma função do kernel no formato de function calling do Gemini."""
+    properties = {}
+    for param in metadata.parameters:
+        if not param.include_in_function_choices:
+            continue
+        schema = dict(param.schema_data or {"type": "string"})
+        if schema.get("type") == "array" and "items" not in schema:
+            # O Gemini exige o tipo dos itens de listas.
+            schema["items"] = {"type": "string"}
+        properties[param.name] = schema
+    declaration = {
+        "name": metadata.custom_fully_qualified_name(TOOL_NAME_SEPARATOR),
+        "description": metadata.description or "",
+    }
+    if properties:
+        declaration["parameters"] = {
+            "type": "object",
+            "properties": properties,
+            "required": [p.name for p in metadata.parameters if p.is_required and p.include_in_function_choices],
+        }
+    return declaration
+
+
+def _update_tool_settings(configuration, settings: KernelChatSettings, choice_type: FunctionChoiceType) -> None:
+    settings.tool_mode = TOOL_MODES[choice_type]
+    functions = configuration.available_functions or []
+    settings.tools = [tool_declaration(metadata) for metadata in functions] or None
+
+
+def kernel_function_name(tool_name: str) -> str:
+    """`Plugin__funcao` (nome da ferramenta) -> `Plugin-funcao` (nome no kernel)."""
+    return tool_name.replace(TOOL_NAME_SEPARATOR, "-", 1)
+
+
+def tool_result_json(result) -> Any:
+    """Resultado de uma ferramenta em tipos JSON (dicts, listas, números e strings)."""
+    return json.loads(json.dumps(result, ensure_ascii=False, default=str))
+
+
+class ToolCallingChatCompletion(ChatCompletionClientBase):
+    """
+    Base dos serviços de chat do kernel com function calling: o Semantic Kernel cuida do
+    laço de chamadas automáticas (e roda em paralelo as chamadas de uma mesma resposta);
+    as subclasses só implementam `_respond`, uma ida e volta ao modelo.
+    """
+
+    SUPPORTS_FUNCTION_CALLING: ClassVar[bool] = True
+
+    def get_prompt_execution_settings_class(self) -> type[PromptExecutionSettings]:
+        return KernelChatSettings
+
+    def _update_function_choice_settings_callback(self):
+        return _update_tool_settings
+
+    def _reset_function_choice_settings(self, settings: KernelChatSettings) -> None:
+        settings.tools = None
+        settings.tool_mode = None
+
+    async def _inner_get_chat_message_contents(self, chat_history: ChatHistory, settings: KernelChatSettings) -> list[ChatMessageContent]:
+        with tracer.span("llm.kernel_chat", model=self.ai_model_id, messages=len(chat_history), tools=len(settings.tools or [])) as span:
+            message = await self._respond(chat_history, settings)
+            span.set(tool_calls=sum(isinstance(item, FunctionCallContent) for item in message.items))
+            return [message]
+
+    async def _respond(self, chat_history: ChatHistory, settings: KernelChatSettings) -> ChatMessageContent:
+        raise NotImplementedError
+
+
+def tool_call(name: str, **arguments) -> dict:
+    """Chamada de ferramenta para as respostas do `FakeKernelChatCompletion` (`name` = "Plugin-funcao")."""
+    return {"name": name, "arguments": arguments}
+
+
+class FakeKernelChatCompletion(ToolCallingChatCompletion):
+    """
+    Modelo local para testes offline do kernel: cada ida e volta responde com
+    `responder(chat_history, tools)`, com a próxima resposta de `responses` ou com um eco da
+    última mensagem, após `delay` segundos. Uma resposta é um texto ou uma lista de
+    `tool_call(...)`, que o kernel executa (em paralelo) antes da próxima ida e volta.
+    """
+
+    _responder: Any = PrivateAttr(default=None)
+    _responses: list = PrivateAttr(default_factory=list)
+    _delay: float = PrivateAttr(default=0.0)
+    _calls: list = PrivateAttr(default_factory=list)
+
+    def __init__(self, responses: list | None = None, responder=None, delay: float = 0.0) -> None:
+        super().__init__(ai_model_id="fake-kernel-chat")
+        self._responses = list(responses or [])
+        self._responder = responder
+        self._delay = delay
+
+    @property
+    def calls(self) -> list:
+        """Uma entrada por ida e volta: as mensagens enviadas e os nomes das ferramentas oferecidas."""
+        return self._calls
+
+    async def _respond(self, chat_history: ChatHistory, settings: KernelChatSettings) -> ChatMessageContent:
+        tools = [tool["name"] for tool in settings.tools or []]
+        self._calls.append({"messages": list(chat_history.messages), "tools": tools})
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        if self._responder is not None:
+            response = self._responder(chat_history, tools)
+            if inspect.isawaitable(response):
+                response = await response
+        elif self._responses:
+            response = self._responses.pop(0)
+        else:
+            response = f"[fake] {chat_history.messages[-1].content}"
+
+        if isinstance(response, ChatMessageContent):
+            return response
+        if isinstance(response, str):
+            return ChatMessageContent(role=AuthorRole.ASSISTANT, content=response, ai_model_id=self.ai_model_id)
+        round_number = len(self._calls)
+        items = [
+            FunctionCallContent(id=f"call_{round_number}_{index}", name=call["name"], arguments=json.dumps(call["arguments"], ensure_ascii=False))
+            for index, call in enumerate(response)
+        ]
+        return ChatMessageContent(role=AuthorRole.ASSISTANT, items=items, ai_model_id=self.ai_model_id)
+
+
+class GeminiKernelChatCompletion(ToolCallingChatCompletion):
+    """
+    Gemini com function calling nativo, pelo SDK `google-generativeai` (o mesmo do
+    `GeminiTransport`, configurado só na primeira chamada). Tem o mesmo rate limit e retry
+    com backoff do `GeminiChatService`; sem cache, já que as respostas dependem das ferramentas.
+    """
+
+    _rate_limiter: Any = PrivateAttr(default=None)
+    _max_retries: int = PrivateAttr(default=GEMINI_MAX_RETRIES)
+
+    def __init__(
+        self,
+        requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+        rate_burst: float = GEMINI_RATE_BURST,
+        max_retries: int = GEMINI_MAX_RETRIES,
+    ) -> None:
+        super().__init__(ai_model_id=GEMINI_MODEL_NAME)
+        self._rate_limiter = TokenBucket(requests_per_minute / 60.0, rate_burst)
+        self._max_retries = max_retries
+
+    async def _respond(self, chat_history: ChatHistory, settings: KernelChatSettings) -> ChatMessageContent:
+        get_gemini_model()  # configura a chave da API (ou levanta RuntimeError sem ela)
+        system = "\n".join(message.content for message in chat_history.messages if message.role == AuthorRole.SYSTEM)
+        model = _system_model(system)
+        request = {}
+        if settings.tools:
+            request["tools"] = [{"function_declarations": settings.tools}]
+            request["tool_config"] = {"function_calling_config": {"mode": settings.tool_mode or "AUTO"}}
+        contents = _gemini_contents(chat_history)
+
+        attempt = 0
+        while True:
+            await self._rate_limiter.acquire()
+            try:
+                # API bloqueante numa thread: o cliente assíncrono fica preso ao primeiro event loop.
+                response = await asyncio.to_thread(model.generate_content, contents, **request)
+                break
+            except RETRYABLE_ERRORS:
+                if attempt >= self._max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+
+        items = []
+        for index, part in enumerate(response.candidates[0].content.parts):
+            if part.function_call.name:
+                call = type(part.function_call).to_dict(part.function_call)
+                items.append(FunctionCallContent(
+                    id=f"{call['name']}_{index}",
+                    name=kernel_function_name(call["name"]),
+                    arguments=json.dumps(call.get("args") or {}, ensure_ascii=False),
+                ))
+            elif part.text:
+                items.append(TextContent(text=part.text))
+        return ChatMessageContent(role=AuthorRole.ASSISTANT, items=items, ai_model_id=self.ai_model_id)
+
+
+@functools.lru_cache(maxsize=8)
+def _system_model(system: str):
+    """Modelo do Gemini para um prompt de sistema; reaproveitado enquanto o prompt não muda."""
+    import google.generativeai as genai
+
+    return genai.GenerativeModel(GEMINI_MODEL_NAME, system_instruction=system or None)
+
+
+def _gemini_contents(chat_history: ChatHistory) -> list:
+    """
+    Histórico no formato do Gemini. Os resultados de chamadas paralelas vão juntos numa única
+    mensagem, logo depois da mensagem do modelo que as pediu.
+    """
+    contents = []
+    for message in chat_history.messages:
+        if message.role == AuthorRole.SYSTEM:
+            continue
+        parts = []
+        for item in message.items:
+            if isinstance(item, FunctionCallContent):
+                parts.append({"function_call": {
+                    "name": item.custom_fully_qualified_name(TOOL_NAME_SEPARATOR),
+                    "args": item.parse_arguments() or {},
+                }})
+            elif isinstance(item, FunctionResultContent):
+                parts.append({"function_response": {
+                    "name": item.custom_fully_qualified_name(TOOL_NAME_SEPARATOR),
+                    "response": {"result": tool_result_json(item.result)},
+                }})
+            elif isinstance(item, TextContent) and item.text:
+                parts.append({"text": item.text})
+        if not parts:
+            continue
+        role = "model" if message.role == AuthorRole.ASSISTANT else "user"
+        if message.role == AuthorRole.TOOL and contents and contents[-1]["role"] == "user" and "function_response" in contents[-1]["parts"][0]:
+            contents[-1]["parts"].extend(parts)
+        else:
+            contents.append({"role": role, "parts": parts})
+    return contents
+
+
+def get_kernel_chat_completion() -> ToolCallingChatCompletion:
+    """Serviço de chat do kernel compartilhado pelo processo (Gemini, criado no primeiro uso)."""
+    global _shared_completion
+    if _shared_completion is None:
+        with _shared_lock:
+            if _shared_completion is None:
+                _shared_completion = GeminiKernelChatCompletion()
+    return _shared_completion
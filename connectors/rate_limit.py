@@ -0,0 +1,105 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Limitador token-bucket: `rate_per_second` tokens por segundo, até `capacity` acumulados.
+    É thread-safe, então vale para todas as sessões/event loops do processo.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float) -> None:
+        self._rate = rate_per_second
+        self._capacity = max(capacity, 1.0)
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Consome um token se houver; senão devolve quantos segundos esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self._rate
+
+    async def acquire(self) -> None:
+        if self._rate <= 0:
+            return
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class ConcurrencyLimit:
+    """
+    Limite de chamadas simultâneas para o processo inteiro: as vagas são contadas sob um
+    `threading.Lock` e, ao liberar, entregues em ordem de chegada a quem espera, em qualquer
+    event loop (via `call_soon_threadsafe`), sem ocupar threads com a espera.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit = max(1, limit)
+        self._active = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self._limit and not self._waiters:
+                self._active += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            # A vaga já tinha sido entregue a este chamador cancelado: passa para o próximo.
+            if granted:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(_grant, future)
+                    return
+                except RuntimeError:
+                    # Loop já fechado: ninguém mais espera por essa vaga.
+                    continue
+            self._active -= 1
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+
+def _grant(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def backoff_delay(attempt: int, base_seconds: float = 1.0, max_seconds: float = 16.0) -> float:
+    """Backoff exponencial com jitter completo: aleatório em [0, min(max, base * 2^attempt)]."""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
@@ -1,16 +1,160 @@
 import json
+import re
+import time
+from collections import Counter
 from connectors.gemini_connector import GeminiChatService
 from utils.prompt_utils import FORMAT_ROUTER_PROMPT, render_prompt
+from utils.text_utils import normalize_text
+from utils.tracing import tracer
+
+SLASH_COMMANDS = {
+    "/metrics": {"plugin": "MetricsPlugin", "function": "query_metrics"},
+    "/clients_metrics": {"plugin": "MetricsPlugin", "function": "query_clients_metrics"},
+    "/periodo": {"plugin": "MetricsPlugin", "function": "query_range"},
+    "/anomalies": {"plugin": "AnomaliePlugin", "function": "detect_anomalies_with_ai"},
+    "/report": {"plugin": "ReportPlugin", "function": "generate_report"},
+}
+
+# Vocabulário extra por intenção, somado aos exemplos do FORMAT_ROUTER_PROMPT.
+INTENT_KEYWORDS = {
+    ("MetricsPlugin", "query_metrics"): [
+        "metricas", "vendas", "vendido", "faturamento", "tempo de preparo", "preparo",
+        "produtos mais vendidos", "mais vendidos", "principais dados", "numeros de hoje",
+    ],
+    ("MetricsPlugin", "query_clients_metrics"): [
+        "clientes", "cliente", "melhores clientes", "quem mais comprou", "total gasto", "gastou",
+    ],
+    ("MetricsPlugin", "query_range"): [
+        "ontem", "anteontem", "semana passada", "mes passado", "ultimos dias", "periodo",
+        "comparado", "comparada", "comparar", "anterior", "sexta passada", "ultima sexta",
+        "segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo",
+    ],
+    ("AnomaliePlugin", "detect_anomalies_with_ai"): [
+        "anomalia", "anomalias", "algo de errado", "errado", "problema", "problemas",
+        "estranho", "fora do comum", "incomum", "alerta", "alertas",
+    ],
+    ("ReportPlugin", "generate_report"): [
+        "relatorio", "resumo", "resumo de performance", "performance", "desempenho",
+    ],
+    (None, None): [
+        "ola", "oi", "tudo bem", "bom dia", "boa tarde", "boa noite", "obrigado", "obrigada",
+    ],
+}
+
+STOP_WORDS = {
+    "a", "o", "as", "os", "e", "de", "do", "da", "dos", "das", "me", "meu", "meus", "minha",
+    "minhas", "se", "tem", "nos", "no", "na", "que", "sao", "quais", "qual", "um", "uma",
+    "veja", "mostre", "para", "por", "com", "em", "eu", "voce", "como", "esta", "estao",
+    "foi", "ha", "algum", "alguma", "sobre", "quero", "ver", "gere", "gerar", "detecte", "detectar",
+}
+
+_EXAMPLE_PATTERN = re.compile(r'Entrada do usuário: "(.*?)"\s*Resposta:\s*(\{.*?\})', re.DOTALL)
+
+
+def content_tokens(text: str) -> list:
+    return [token for token in normalize_text(text).split() if token not in STOP_WORDS]
+
+
+def extract_ngrams(text: str) -> set:
+    tokens = content_tokens(text)
+    ngrams = set(tokens)
+    ngrams.update(" ".join(pair) for pair in zip(tokens, tokens[1:]))
+    return ngrams
+
+
+class LocalIntentClassifier:
+    """
+    Classificador local por palavras-chave/n-gramas, montado a partir dos exemplos do
+    FORMAT_ROUTER_PROMPT e do vocabulário em INTENT_KEYWORDS.
+    """
+
+    def __init__(self, router_prompt: str = FORMAT_ROUTER_PROMPT) -> None:
+        self._features = {}
+        for user_input, raw_intent in _EXAMPLE_PATTERN.findall(router_prompt):
+            intent = json.loads(raw_intent)
+            self._add_examples((intent.get("plugin"), intent.get("function")), [user_input])
+        for intent, keywords in INTENT_KEYWORDS.items():
+            self._add_examples(intent, keywords)
+
+    def _add_examples(self, intent: tuple, texts: list) -> None:
+        features = self._features.setdefault(intent, Counter())
+        for text in texts:
+            for ngram in extract_ngrams(text):
+                # Bigramas são mais específicos que palavras soltas.
+                features[ngram] = max(features[ngram], 2 if " " in ngram else 1)
+
+    def classify(self, user_input: str) -> tuple[dict, float]:
+        """
+        Confiança = cobertura x margem: a fração das palavras da entrada explicada pelos
+        n-gramas da melhor intenção, vezes a vantagem dela sobre a segunda.
+        """
+        tokens = content_tokens(user_input)
+        ngrams = extract_ngrams(user_input)
+        scores = sorted(
+            (([ngram for ngram in features if ngram in ngrams], intent) for intent, features in self._features.items()),
+            key=lambda item: sum(self._features[item[1]][ngram] for ngram in item[0]),
+            reverse=True,
+        )
+        (matched, best_intent), second = scores[0], scores[1] if len(scores) > 1 else ([], None)
+        best_score = sum(self._features[best_intent][ngram] for ngram in matched)
+        if best_score == 0:
+            return {"plugin": None, "function": None}, 0.0
+        second_score = sum(self._features[second[1]][ngram] for ngram in second[0]) if second[1] is not None else 0
+        covered = {word for ngram in matched for word in ngram.split()}
+        coverage = sum(token in covered for token in tokens) / len(tokens)
+        margin = (best_score - second_score) / best_score
+        confidence = coverage * margin
+        return {"plugin": best_intent[0], "function": best_intent[1]}, round(confidence, 3)
+
 
 class AIIntentRouter:
-    def __init__(self, chat_service: GeminiChatService):
+    def __init__(self, chat_service: GeminiChatService, confidence_threshold: float = 0.6):
         self._chat = chat_service
+        self._classifier = LocalIntentClassifier()
+        self._confidence_threshold = confidence_threshold
+        self.tier_counts = Counter()
+        self.tier_seconds = Counter()
+
+    def routing_stats(self) -> dict:
+        """Quantas rotas cada camada resolveu e o tempo médio (ms) gasto em cada uma."""
+        return {
+            tier: {
+                "count": count,
+                "avg_ms": round(self.tier_seconds[tier] * 1000 / count, 3),
+            }
+            for tier, count in self.tier_counts.items()
+        }
+
+    def _record(self, intent: dict, tier: str, confidence: float, started: float) -> dict:
+        self.tier_counts[tier] += 1
+        self.tier_seconds[tier] += time.perf_counter() - started
+        tracer.annotate(tier=tier, confidence=confidence)
+        return {**intent, "tier": tier, "confidence": confidence}
 
-    async def route_intent_async(self, user_input: str) -> dict:
-        """ 
-        Usa a IA para determinar qual plugin/função chamar com base na entrada do usuário.
+    async def route_intent_async(self, user_input: str, allow_llm: bool = True) -> dict:
         """
-        
+        Determina qual plugin/função chamar com base na entrada do usuário: comandos
+        com barra são resolvidos na hora, depois o classificador local, e a IA só é
+        chamada quando a confiança local é baixa. `tier` indica quem respondeu.
+        Com `allow_llm=False` (modo kernel), a baixa confiança vira intenção nula, sem chamar a IA.
+        """
+        with tracer.span("AIIntentRouter.route_intent_async"):
+            started = time.perf_counter()
+
+            # O comando é a primeira palavra: "/periodo sexta passada" também é um comando.
+            command = user_input.strip().lower().split(maxsplit=1)
+            if command and command[0] in SLASH_COMMANDS:
+                return self._record(SLASH_COMMANDS[command[0]], "slash", 1.0, started)
+
+            intent, confidence = self._classifier.classify(user_input)
+            if confidence >= self._confidence_threshold:
+                return self._record(intent, "local", confidence, started)
+            if not allow_llm:
+                return self._record({"plugin": None, "function": None}, "local", confidence, started)
+
+            return self._record(await self._route_with_llm(user_input), "llm", confidence, started)
+
+    async def _route_with_llm(self, user_input: str) -> dict:
         prompt = render_prompt(FORMAT_ROUTER_PROMPT, {"user_input":user_input})
 
         raw_response = await self._chat.complete(prompt)
@@ -18,7 +162,7 @@ class AIIntentRouter:
         try:
             json_start = raw_response.find('{')
             json_end = raw_response.rfind('}') + 1
-            
+
             if json_start != -1 and json_end != -1:
                 json_string = raw_response[json_start:json_end]
                 intent_data = json.loads(json_string)
@@ -29,4 +173,4 @@ class AIIntentRouter:
             # Se falhar, retorna uma intenção nula para o tratamento de fallback
             pass
 
-        return {"plugin": None, "function": None}
\ No newline at end of file
+        return {"plugin": None, "function": None}
@@ -1,22 +1,51 @@
-import json
-from semantic_kernel.functions import kernel_function
-from connectors.gemini_connector import GeminiChatService
-from utils.prompt_utils import FORMAT_ANOMALIE_PROMPT, render_prompt
+from utils.kernel_functions import kernel_function
+from connectors.gemini_connector import GeminiChatService, get_chat_service
+from utils.prompt_utils import (
+    FORMAT_ANOMALIE_PROMPT,
+    FORMAT_EXPLAIN_ANOMALIES_PROMPT,
+    NO_ANOMALIES_MESSAGE,
+    build_metrics_prompt,
+)
+from utils.tracing import traced, tracer
+
+# Achados mais graves que entram no prompt; o resto fica só na lista local.
+MAX_FINDINGS_IN_PROMPT = 20
 
 class AnomaliePlugin:
-    def __init__(self) -> None:
-        self._chat = GeminiChatService()
+    def __init__(self, chat_service: GeminiChatService | None = None, max_prompt_tokens: int | None = None) -> None:
+        self._chat = chat_service or get_chat_service()
+        self._max_prompt_tokens = max_prompt_tokens
+
+    def _build_prompt(self, metrics: dict, findings: list | None = None) -> tuple[str, dict]:
+        """Prompt (análise aberta, ou só a explicação dos `findings`) e as estatísticas de economia."""
+        if findings is None:
+            return build_metrics_prompt(FORMAT_ANOMALIE_PROMPT, metrics, self._max_prompt_tokens)
+        findings_text = "\n".join(
+            f"- [{finding['severity']}] {finding['message']}" for finding in findings[:MAX_FINDINGS_IN_PROMPT]
+        )
+        return build_metrics_prompt(
+            FORMAT_EXPLAIN_ANOMALIES_PROMPT, metrics, self._max_prompt_tokens, values={"findings": findings_text}
+        )
 
     @kernel_function(name="detect_anomalies_with_ai", description="Detecta anomalias nas métricas")
-    async def detect_anomalies_with_ai(self, metrics: dict) -> str:
+    @traced("AnomaliePlugin.detect_anomalies_with_ai")
+    async def detect_anomalies_with_ai(self, metrics: dict, findings: list | None = None) -> str:
+        if findings is not None and not findings:
+            # Nada sinalizado pelo monitoramento local: a IA nem é chamada.
+            tracer.annotate(skipped_llm=True)
+            return NO_ANOMALIES_MESSAGE
+        prompt, _ = self._build_prompt(metrics, findings)
+        return await self._chat.complete(prompt)
 
-        metrics_json_str = json.dumps(metrics, indent=2, ensure_ascii=False)
-        
-        prompt_text = render_prompt(
-            FORMAT_ANOMALIE_PROMPT,
-            {
-                "metrics_data": metrics_json_str,
-            },
-        )
-        
-        return await self._chat.complete(prompt_text)
\ No newline at end of file
+    @traced("AnomaliePlugin.stream_anomalies_with_ai")
+    async def stream_anomalies_with_ai(self, metrics: dict, findings: list | None = None, on_prompt_stats=None):
+        """Como `detect_anomalies_with_ai`, em pedaços; `on_prompt_stats` recebe as estatísticas do prompt."""
+        if findings is not None and not findings:
+            tracer.annotate(skipped_llm=True)
+            yield NO_ANOMALIES_MESSAGE
+            return
+        prompt, stats = self._build_prompt(metrics, findings)
+        if on_prompt_stats is not None:
+            on_prompt_stats(stats)
+        async for chunk in self._chat.stream(prompt):
+            yield chunk
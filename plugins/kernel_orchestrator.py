@@ -0,0 +1,109 @@
+from datetime import date
+
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+from semantic_kernel.contents import AuthorRole, ChatHistory, FunctionCallContent, FunctionResultContent
+from semantic_kernel.functions import KernelArguments
+
+from connectors.kernel_chat import ToolCallingChatCompletion, get_kernel_chat_completion
+from plugins.anomalie_plugin import AnomaliePlugin
+from plugins.metrics_plugin import MetricsPlugin
+from plugins.report_plugin import ReportPlugin
+from utils.kernel_functions import register_kernel_functions
+from utils.prompt_utils import FORMAT_KERNEL_SYSTEM_PROMPT, build_metrics_prompt
+from utils.tracing import tracer
+
+# Ferramentas oferecidas ao modelo. As funções `query_*` (que recebem o JSON dos pedidos) e as
+# que já chamam a IA por dentro ficam registradas no kernel, mas fora da lista.
+KERNEL_TOOLS = (
+    "MetricsPlugin-get_metrics",
+    "MetricsPlugin-get_clients",
+    "MetricsPlugin-get_period_metrics",
+    "MetricsPlugin-get_anomalies",
+    "ReportPlugin-generate_report",
+)
+MAX_AUTO_INVOKE_ROUNDS = 3
+MAX_HISTORY_MESSAGES = 6
+
+
+class KernelOrchestrator:
+    """
+    Perguntas livres num só `Kernel` com os três plugins e function calling automático. O
+    prompt de sistema já traz as métricas atuais, então a pergunta típica se resolve numa
+    única ida e volta ao modelo; quando ele pede ferramentas, o kernel roda em paralelo as
+    chamadas de uma mesma resposta e devolve os resultados numa segunda ida e volta.
+    """
+
+    def __init__(
+        self,
+        metrics_plugin: MetricsPlugin,
+        anomalie_plugin: AnomaliePlugin,
+        report_plugin: ReportPlugin,
+        chat_completion: ToolCallingChatCompletion | None = None,
+        max_prompt_tokens: int | None = None,
+    ) -> None:
+        self.metrics_plugin = metrics_plugin
+        self.chat_completion = chat_completion or get_kernel_chat_completion()
+        self._max_prompt_tokens = max_prompt_tokens
+        self.kernel = Kernel()
+        for plugin in (metrics_plugin, anomalie_plugin, report_plugin):
+            self.kernel.add_plugin(register_kernel_functions(plugin), plugin_name=type(plugin).__name__)
+        self.kernel.add_service(self.chat_completion)
+        self.last_turn = None
+
+    def _settings(self):
+        settings_class = self.chat_completion.get_prompt_execution_settings_class()
+        return settings_class(
+            function_choice_behavior=FunctionChoiceBehavior.Auto(
+                filters={"included_functions": list(KERNEL_TOOLS)},
+                maximum_auto_invoke_attempts=MAX_AUTO_INVOKE_ROUNDS,
+            )
+        )
+
+    async def _system_prompt(self) -> str:
+        metrics = await self.metrics_plugin.get_metrics()
+        prompt, _ = build_metrics_prompt(
+            FORMAT_KERNEL_SYSTEM_PROMPT,
+            metrics,
+            self._max_prompt_tokens,
+            values={"restaurant_name": metrics.get("restaurant_name", ""), "today": date.today().isoformat()},
+        )
+        return prompt
+
+    async def answer(self, question: str, history: list | None = None) -> str:
+        """
+        Responde `question`; `history` são as mensagens anteriores ({"role", "content"}, como
+        em `st.session_state.messages`), das quais só as últimas vão para o modelo.
+        `last_turn` guarda quantas idas e voltas houve e quais ferramentas rodaram.
+        """
+        with tracer.span("KernelOrchestrator.answer") as span:
+            chat_history = ChatHistory(system_message=await self._system_prompt())
+            for message in (history or [])[-MAX_HISTORY_MESSAGES:]:
+                if message["role"] == "user":
+                    chat_history.add_user_message(message["content"])
+                elif message["role"] == "assistant":
+                    chat_history.add_assistant_message(message["content"])
+            chat_history.add_user_message(question)
+            first_new = len(chat_history.messages)
+
+            result = await self.chat_completion.get_chat_message_content(
+                chat_history, self._settings(), kernel=self.kernel, arguments=KernelArguments()
+            )
+
+            # O kernel acrescenta ao histórico cada pedido de ferramentas e os resultados.
+            added = chat_history.messages[first_new:]
+            tool_rounds = sum(
+                message.role == AuthorRole.ASSISTANT and any(isinstance(item, FunctionCallContent) for item in message.items)
+                for message in added
+            )
+            # Chamadas a funções fora de KERNEL_TOOLS também voltam como resultado (a recusa do
+            # kernel), mas não rodaram.
+            tool_calls = [
+                item.name
+                for message in added
+                for item in message.items
+                if isinstance(item, FunctionResultContent) and item.name in KERNEL_TOOLS
+            ]
+            self.last_turn = {"model_calls": tool_rounds + 1, "tool_calls": tool_calls}
+            span.set(model_calls=tool_rounds + 1, tool_calls=len(tool_calls))
+            return result.content if result is not None else ""
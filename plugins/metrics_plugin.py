@@ -1,121 +1,255 @@
+import asyncio
 import json
-from datetime import datetime, timedelta, date
-from collections import Counter
-from semantic_kernel.functions import kernel_function
+import os
+from datetime import date, timedelta
+from utils.kernel_functions import kernel_function
+from utils.client_ranking import DEFAULT_PAGE_SIZE
+from utils.dataset_cache import DatasetCache, dataset_cache
+from utils.metrics_aggregation import WEEKDAYS, ClientsAggregator, MetricsAggregator
+from utils.order_sources import OrderSource, open_order_source
+from utils.order_store import OrderStore
+from utils.order_stream import OrderStream
+from utils.tracing import traced, tracer
+
+METRICS_BACKENDS = ("python", "pandas")
 
 class MetricsPlugin:
+    def __init__(self, cache: DatasetCache | None = None, backend: str | None = None, order_source: OrderSource | None = None) -> None:
+        self._cache = cache or dataset_cache
+        # Fonte usada pelas funções `get_*`, que o modelo chama sem precisar passar os pedidos.
+        self.order_source = order_source
+        self._backend = (backend or os.getenv("METRICS_BACKEND", "python")).lower()
+        if self._backend not in METRICS_BACKENDS:
+            raise ValueError(f"METRICS_BACKEND inválido: {self._backend!r}. Use um de {METRICS_BACKENDS}.")
 
-    def _calculate_clients_metrics_from_data(self, pedidos_data: dict) -> dict:
-        client_metrics = {}
-        pedidos = pedidos_data.get("pedidos", [])
+    def order_store(self, pedidos_json_str: str) -> OrderStore:
+        """Pedidos em forma colunar compacta, montados uma vez por conteúdo (cache compartilhado)."""
+        return self._cache.derive(pedidos_json_str, "order_store", OrderStore.from_pedidos_data)
 
-        for pedido in pedidos:
-            client_name = pedido["cliente"]["nome"]
-            order_total = pedido["total"]
+    @traced("MetricsPlugin.load_order_source")
+    def load_order_source(self, source_path: str) -> OrderSource:
+        """
+        Fonte de pedidos escolhida pela extensão: JSON legado, log NDJSON ou banco SQLite
+        indexado (ver `utils/order_sources.py`). Todas respondem métricas, clientes e períodos.
+        """
+        return open_order_source(source_path)
 
-            if client_name not in client_metrics:
-                client_metrics[client_name] = {
-                    "numero_de_pedidos": 0,
-                    "valor_total_gasto": 0.0
-                }
-            
-            client_metrics[client_name]["numero_de_pedidos"] += 1
-            client_metrics[client_name]["valor_total_gasto"] += order_total
-            client_metrics[client_name]["valor_total_gasto"] = round(client_metrics[client_name]["valor_total_gasto"], 2)
+    @traced("MetricsPlugin.stream_metrics")
+    def stream_metrics(self, pedidos_path: str) -> tuple[dict, dict]:
+        """
+        Calcula métricas gerais e de clientes em uma única passada pelo arquivo
+        (JSON legado ou NDJSON), sem materializar a lista de pedidos. Dos clientes,
+        devolve a primeira página do ranking por valor gasto.
+        """
+        stream = OrderStream(pedidos_path)
+        metrics_aggregator = MetricsAggregator()
+        clients_aggregator = ClientsAggregator()
+        for pedido in stream:
+            metrics_aggregator.add(pedido)
+            clients_aggregator.add(pedido)
+        metrics_aggregator.set_restaurant(stream.restaurante)
+        return metrics_aggregator.result(), clients_aggregator.table().page()
 
-        return client_metrics
-    
-    def _calculate_metrics_from_data(self, pedidos_data: dict) -> dict:
-        restaurant_name = pedidos_data.get("restaurante", {}).get("nome", "Nome não encontrado")
-        pedidos = pedidos_data.get("pedidos", [])
-        
-        today = date.today()
-        thirty_days_ago = today - timedelta(days=30)
-
-        today_prep_seconds = 0.0
-        today_orders_count = 0
-        last_30d_prep_seconds = 0.0
-        last_30d_orders_count = 0
-        overall_prep_seconds = 0.0
-        overall_orders_count = 0
-        
-        prep_time_by_day = { day: {'total_seconds': 0.0, 'count': 0} for day in ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]}
-        grand_total_sold = 0.0
-        sales_by_month = {}
-        product_counter = Counter()
-
-        for pedido in pedidos:
-            grand_total_sold += pedido["total"]
-            try:
-                pedido_dt = datetime.fromisoformat(pedido["data_pedido"])
-                pedido_date = pedido_dt.date()
-
-                if pedido.get("data_recebimento") and pedido.get("data_envio"):
-                    recebimento_dt = datetime.fromisoformat(pedido["data_recebimento"])
-                    envio_dt = datetime.fromisoformat(pedido["data_envio"])
-                    prep_time_seconds = (envio_dt - recebimento_dt).total_seconds()
-
-                    overall_prep_seconds += prep_time_seconds
-                    overall_orders_count += 1
-                    
-                    prep_time_by_day[pedido["dia_semana"]]['total_seconds'] += prep_time_seconds
-                    prep_time_by_day[pedido["dia_semana"]]['count'] += 1
-
-                    if pedido_date == today:
-                        today_prep_seconds += prep_time_seconds
-                        today_orders_count += 1
-                    elif thirty_days_ago <= pedido_date < today:
-                        last_30d_prep_seconds += prep_time_seconds
-                        last_30d_orders_count += 1
-                
-                month_year = pedido_dt.strftime("%Y-%m")
-                if month_year not in sales_by_month:
-                    sales_by_month[month_year] = {"total_value_sold": 0.0, "sales_by_day": Counter()}
-                sales_by_month[month_year]["total_value_sold"] += pedido["total"]
-                sales_by_month[month_year]["sales_by_day"][pedido["dia_semana"]] += 1
-                for item in pedido.get("itens", []):
-                    product_counter[item["nome"]] += item["quantidade"]
-
-            except (ValueError, TypeError, KeyError):
-                continue
-        
-        avg_prep_today_seconds = int(today_prep_seconds / today_orders_count) if today_orders_count > 0 else 0
-        avg_prep_last_30d_seconds = int(last_30d_prep_seconds / last_30d_orders_count) if last_30d_orders_count > 0 else 0
-        avg_prep_overall_seconds = int(overall_prep_seconds / overall_orders_count) if overall_orders_count > 0 else 0
-        
-        avg_prep_time_by_day_seconds = { day: int(data['total_seconds'] / data['count']) if data['count'] > 0 else 0 for day, data in prep_time_by_day.items() }
-        for month_data in sales_by_month.values():
-            month_data["total_value_sold"] = round(month_data["total_value_sold"], 2)
-        top_products = [ {"name": name, "sold": count} for name, count in product_counter.most_common(3) ]
-
-        return {
-            "restaurant_name": restaurant_name,
-            "grand_total_sold": round(grand_total_sold, 2),
-            "avg_prep_today_seconds": avg_prep_today_seconds,
-            "avg_prep_30d_seconds": avg_prep_last_30d_seconds,
-            "avg_prep_seconds": avg_prep_overall_seconds,
-            "avg_prep_time_by_day_seconds": avg_prep_time_by_day_seconds,
-            "sales_by_month": sales_by_month,
-            "top_products": top_products,
-        }
-    
     @kernel_function(name="query_metrics", description="Busca métricas atuais do restaurante a partir de um JSON de pedidos")
+    @traced("MetricsPlugin.query_metrics")
     def query_metrics(self, pedidos_json_str: str) -> dict:
         try:
-            pedidos_data = json.loads(pedidos_json_str)
-            return self._calculate_metrics_from_data(pedidos_data)
+            order_store = self.order_store(pedidos_json_str)
+            with tracer.span("metrics.aggregate", backend=self._backend, orders=len(order_store)):
+                if self._backend == "pandas":
+                    # Os dois backends partem das mesmas colunas (em cache); só a agregação muda.
+                    from utils.columnar_metrics import calculate_store_metrics
+                    return calculate_store_metrics(order_store)
+                return order_store.metrics()
         except json.JSONDecodeError:
             return {"error": "JSON inválido"}
     
-    @kernel_function(name="query_clients_metrics", description="Busca das metricas gerais dos clientes")
-    def query_clients_metrics(self, pedidos_json_str: str) -> dict:
+    @kernel_function(
+        name="query_clients_metrics",
+        description=(
+            "Busca uma página do ranking de clientes (pedidos e total gasto por cliente), ordenada por "
+            "'valor_total_gasto' ou 'numero_de_pedidos'. Para a próxima página, repita com o 'next_cursor' retornado"
+        ),
+    )
+    @traced("MetricsPlugin.query_clients_metrics")
+    def query_clients_metrics(
+        self,
+        pedidos_json_str: str,
+        sort_by: str = "valor_total_gasto",
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: str | None = None,
+    ) -> dict:
+        try:
+            return self.order_store(pedidos_json_str).client_table().page(sort_by, limit, cursor)
+        except json.JSONDecodeError:
+            return {"error": "JSON inválido"}
+        except ValueError as exc:
+            return {"error": str(exc)}
+
+    @kernel_function(name="query_top_clients", description="Busca os K clientes que mais gastaram ou que mais fizeram pedidos")
+    @traced("MetricsPlugin.query_top_clients")
+    def query_top_clients(self, pedidos_json_str: str, k: int = 3, sort_by: str = "valor_total_gasto") -> dict:
         try:
-            pedidos_data = json.loads(pedidos_json_str)
-            return self._calculate_clients_metrics_from_data(pedidos_data)
+            table = self.order_store(pedidos_json_str).client_table()
+            return {"sort_by": sort_by, "total_clients": len(table), "clients": table.top(k, sort_by)}
         except json.JSONDecodeError:
             return {"error": "JSON inválido"}
+        except ValueError as exc:
+            return {"error": str(exc)}
+
+    def range_query(
+        self,
+        order_store: OrderStore | OrderSource,
+        start_date: str,
+        end_date: str,
+        weekday: str | None = None,
+        client: str | None = None,
+        product: str | None = None,
+        compare_previous: bool = False,
+    ) -> dict:
+        """
+        Resumo de um período (datas ISO, `end_date` inclusiva) com filtros opcionais. Com
+        `compare_previous`, compara com o período anterior de mesmo tamanho; períodos menores
+        que uma semana são comparados com os mesmos dias da semana anterior (sexta x sexta).
+        `order_store` pode ser um `OrderStore` ou qualquer `OrderSource` (ex.: SQLite).
+        """
+        try:
+            start = date.fromisoformat(start_date)
+            end = date.fromisoformat(end_date) + timedelta(days=1)
+        except (TypeError, ValueError):
+            return {"error": "Data inválida; use o formato AAAA-MM-DD."}
+        if end <= start:
+            return {"error": "A data final deve ser igual ou posterior à inicial."}
+        weekday_code = None
+        if weekday:
+            if weekday not in WEEKDAYS:
+                return {"error": f"Dia da semana inválido: {weekday}. Use um de {WEEKDAYS}."}
+            weekday_code = WEEKDAYS.index(weekday)
+
+        def period(period_start: date, period_end: date) -> dict:
+            summary = order_store.summarize(period_start, period_end, weekday_code, client, product)
+            return {
+                "start_date": period_start.isoformat(),
+                "end_date": (period_end - timedelta(days=1)).isoformat(),
+                **summary,
+            }
+
+        with tracer.span("metrics.range_query", days=(end - start).days, compare_previous=compare_previous) as span:
+            result = {
+                "restaurant_name": order_store.restaurante.get("nome", "Nome não encontrado"),
+                "filters": {"weekday": weekday, "client": client, "product": product},
+                "current": period(start, end),
+            }
+            if compare_previous:
+                length = (end - start).days
+                shift = timedelta(days=7 if length < 7 else length)
+                previous = result["previous"] = period(start - shift, end - shift)
+                current = result["current"]
+                result["change"] = {
+                    "orders": current["orders"] - previous["orders"],
+                    "total_sold": round(current["total_sold"] - previous["total_sold"], 2),
+                    "total_sold_pct": (
+                        round((current["total_sold"] / previous["total_sold"] - 1) * 100, 1)
+                        if previous["total_sold"] else None
+                    ),
+                    "avg_prep_seconds": current["avg_prep_seconds"] - previous["avg_prep_seconds"],
+                }
+            span.set(orders=result["current"]["orders"])
+            return result
+
+    @kernel_function(name="query_range", description="Métricas de um período (datas AAAA-MM-DD) com filtros de dia da semana, cliente ou produto e comparação com o período anterior")
+    @traced("MetricsPlugin.query_range")
+    def query_range(
+        self,
+        pedidos_json_str: str,
+        start_date: str,
+        end_date: str,
+        weekday: str | None = None,
+        client: str | None = None,
+        product: str | None = None,
+        compare_previous: bool = False,
+    ) -> dict:
+        try:
+            order_store = self.order_store(pedidos_json_str)
+        except json.JSONDecodeError:
+            return {"error": "JSON inválido"}
+        return self.range_query(order_store, start_date, end_date, weekday, client, product, compare_previous)
+
+    @traced("MetricsPlugin.scan_anomalies")
+    def scan_anomalies(self, order_store: OrderStore, today: date | None = None) -> dict:
+        """
+        Monitoramento estatístico local do histórico (ver `utils/anomaly_engine.py`): achados
+        estruturados com severidade, sem custo de API. A IA só entra para explicá-los.
+        """
+        # Importado sob demanda para não pagar o import do numpy na inicialização.
+        from utils.anomaly_engine import scan_order_history
+
+        result = scan_order_history(order_store, today)
+        tracer.annotate(orders=len(order_store), findings=len(result["findings"]))
+        return result
+
+    @kernel_function(name="query_anomalies", description="Detecta anomalias estatísticas (vendas, pedidos, preparo e demanda por produto) no histórico de pedidos, sem usar IA")
+    @traced("MetricsPlugin.query_anomalies")
+    def query_anomalies(self, pedidos_json_str: str) -> dict:
+        try:
+            return self.scan_anomalies(self.order_store(pedidos_json_str))
+        except json.JSONDecodeError:
+            return {"error": "JSON inválido"}
+
+    def _bound_source(self) -> OrderSource:
+        if self.order_source is None:
+            raise ValueError("Nenhuma fonte de pedidos vinculada ao MetricsPlugin.")
+        return self.order_source
+
+    @kernel_function(name="get_metrics", description="Métricas atuais do restaurante: vendas, tempos de preparo (médias e percentis), vendas por mês e produtos mais vendidos")
+    @traced("MetricsPlugin.get_metrics")
+    async def get_metrics(self) -> dict:
+        # As funções `get_*` rodam numa thread: chamadas em paralelo pelo kernel não travam o event loop.
+        return await asyncio.to_thread(self._bound_source().metrics)
+
+    @kernel_function(
+        name="get_clients",
+        description=(
+            "Página do ranking de clientes (pedidos e total gasto), ordenada por 'valor_total_gasto' ou "
+            "'numero_de_pedidos'. Para a próxima página, repita com o 'next_cursor' retornado"
+        ),
+    )
+    @traced("MetricsPlugin.get_clients")
+    async def get_clients(self, sort_by: str = "valor_total_gasto", limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+        try:
+            return await asyncio.to_thread(self._bound_source().clients_page, sort_by, limit, cursor)
+        except ValueError as exc:
+            return {"error": str(exc)}
+
+    @kernel_function(
+        name="get_period_metrics",
+        description=(
+            "Métricas de um período (start_date e end_date no formato AAAA-MM-DD, end_date inclusiva), com filtros "
+            "opcionais de dia da semana (ex.: 'Sexta-feira'), cliente ou produto e comparação com o período anterior"
+        ),
+    )
+    @traced("MetricsPlugin.get_period_metrics")
+    async def get_period_metrics(
+        self,
+        start_date: str,
+        end_date: str,
+        weekday: str | None = None,
+        client: str | None = None,
+        product: str | None = None,
+        compare_previous: bool = False,
+    ) -> dict:
+        return await asyncio.to_thread(
+            self.range_query, self._bound_source(), start_date, end_date, weekday, client, product, compare_previous
+        )
+
+    @kernel_function(name="get_anomalies", description="Anomalias estatísticas da última semana (vendas, pedidos, preparo e demanda por produto), com severidade")
+    @traced("MetricsPlugin.get_anomalies")
+    async def get_anomalies(self) -> dict:
+        source = self._bound_source()
+        return await asyncio.to_thread(lambda: self.scan_anomalies(source.anomaly_store()))
 
     @kernel_function(name="detect_anomalies", description="Detecta anomalias nas métricas")
+    @traced("MetricsPlugin.detect_anomalies")
     def detect_anomalies(self, metrics: dict) -> list:
         alerts = []
         if metrics["avg_prep_seconds"] > metrics["avg_prep_30d_seconds"] * 1.25:
@@ -1,23 +1,25 @@
 import json
-from semantic_kernel.functions import kernel_function
-from connectors.gemini_connector import GeminiChatService
-from utils.prompt_utils import FORMAT_REPORT_PROMPT, render_prompt
+from utils.kernel_functions import kernel_function
+from connectors.gemini_connector import GeminiChatService, get_chat_service
+from utils.prompt_utils import FORMAT_REPORT_PROMPT, compact_json, render_prompt
+from utils.tracing import traced
 
 class ReportPlugin:
-    def __init__(self) -> None:
-        self._chat = GeminiChatService()
+    def __init__(self, chat_service: GeminiChatService | None = None) -> None:
+        self._chat = chat_service or get_chat_service()
 
     @kernel_function(name="generate_report", description="Gera relatório consolidado em JSON")
+    @traced("ReportPlugin.generate_report")
     async def generate_report(self, restaurant_name: str, top_products: list, avg_prep_seconds: int, avg_prep_today_seconds: int, avg_prep_30d_seconds: int, alerts: list) -> str:
         prompt_text = render_prompt(
             FORMAT_REPORT_PROMPT,
             {
                 "restaurant_name": restaurant_name,
-                "top_products": top_products,
+                "top_products": compact_json(top_products),
                 "avg_prep": avg_prep_seconds,
                 "avg_prep_today": avg_prep_today_seconds,
                 "avg_prep_30d": avg_prep_30d_seconds,
-                "alerts": alerts,
+                "alerts": compact_json(alerts),
             },
         )
         raw_response = await self._chat.complete(prompt_text)
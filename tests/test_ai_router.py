@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+from connectors import gemini_connector
+from connectors.chat_transport import FakeChatTransport
+from connectors.gemini_connector import GeminiChatService
+from plugins.ai_router import AIIntentRouter, LocalIntentClassifier
+
+ANOMALIES = {"plugin": "AnomaliePlugin", "function": "detect_anomalies_with_ai"}
+NO_INTENT = {"plugin": None, "function": None}
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(gemini_connector, "GEMINI_CACHE_ENABLED", False)
+    monkeypatch.setattr(gemini_connector, "_default_cache", None)
+    transport = FakeChatTransport(responder=lambda prompt: json.dumps(ANOMALIES if "problema" in prompt else NO_INTENT))
+    router = AIIntentRouter(GeminiChatService(transport=transport, requests_per_minute=float("inf")))
+    router.transport = transport
+    return router
+
+
+def route(router, text: str) -> dict:
+    return asyncio.run(router.route_intent_async(text))
+
+
+@pytest.mark.parametrize("text, function", [
+    ("quais os principais dados?", "query_metrics"),
+    ("Quais são os produtos mais vendidos?", "query_metrics"),
+    ("Como está o tempo de preparo?", "query_metrics"),
+    ("quem são meus melhores clientes?", "query_clients_metrics"),
+    ("como foi a última sexta comparada com a anterior?", "query_range"),
+    ("veja se tem algo de errado nos números", "detect_anomalies_with_ai"),
+    ("me mostre o resumo de performance", "generate_report"),
+    ("olá, tudo bem?", None),
+])
+def test_on_topic_questions_are_routed_locally(router, text, function):
+    intent = route(router, text)
+
+    assert (intent["function"], intent["tier"]) == (function, "local")
+    assert router.transport.calls == []
+
+
+@pytest.mark.parametrize("text", [
+    "qual a previsão do tempo amanhã?",
+    "qual prato devo colocar em promoção amanhã?",
+    "me fale sobre futebol",
+])
+def test_off_topic_questions_go_to_the_llm(router, text):
+    intent = route(router, text)
+
+    assert intent["tier"] == "llm"
+    assert intent["function"] is None
+    assert len(router.transport.calls) == 1
+
+
+@pytest.mark.parametrize("text", [
+    "tem algum problema no tempo de preparo?",
+    "Há algum problema nas vendas?",
+])
+def test_ambiguous_questions_go_to_the_llm(router, text):
+    # Vocabulário de duas intenções (anomalias e métricas): a margem baixa derruba a confiança.
+    intent = route(router, text)
+
+    assert intent["tier"] == "llm"
+    assert intent["function"] == "detect_anomalies_with_ai"
+
+
+def test_single_keyword_in_a_longer_question_is_not_confident():
+    _, confidence = LocalIntentClassifier().classify("qual a previsão do tempo amanhã?")
+
+    assert confidence < 0.6
+
+
+def test_without_llm_low_confidence_becomes_no_intent(router):
+    intent = asyncio.run(router.route_intent_async("qual a previsão do tempo amanhã?", allow_llm=False))
+
+    assert (intent["function"], intent["tier"]) == (None, "local")
+    assert router.transport.calls == []
+
+
+def test_slash_commands_take_the_first_word(router):
+    assert route(router, "/periodo sexta passada")["function"] == "query_range"
+    assert route(router, "/report")["tier"] == "slash"
@@ -0,0 +1,96 @@
+import random
+from datetime import date, datetime, timedelta
+
+from utils.anomaly_engine import scan_order_history
+from utils.metrics_aggregation import WEEKDAYS
+from utils.order_store import OrderStore
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT
+
+TODAY = date(2025, 6, 30)
+HISTORY_DAYS = 84
+SPIKE_DAY = date(2025, 6, 26)
+SLOW_DAY = date(2025, 6, 27)
+
+
+def history(seed: int, spike: bool = False, slow: bool = False, drop: bool = False) -> OrderStore:
+    """
+    12 semanas de pedidos estáveis (ruído com seed) até ontem, com anomalias injetadas na
+    última semana: pico de pedidos, preparo lento ou o "Bolo" deixando de ser vendido.
+    """
+    rng = random.Random(seed)
+    pedidos = []
+    for offset in range(HISTORY_DAYS, 0, -1):
+        day = TODAY - timedelta(days=offset)
+        count = 60 if spike and day == SPIKE_DAY else rng.randint(18, 22)
+        prep_mean = 2700 if slow and day == SLOW_DAY else 900
+        for index in range(count):
+            ordered_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=11, minutes=index * 10)
+            received_at = ordered_at + timedelta(seconds=60)
+            itens = [{"nome": "Café", "quantidade": 1, "preco_unitario": 8.0}]
+            if index % 2 == 0 and not (drop and offset <= 7):
+                itens.append({"nome": "Bolo", "quantidade": 1, "preco_unitario": 12.0})
+            pedidos.append({
+                "cliente": {"id": index % 15, "nome": f"Cliente {index % 15}"},
+                "data_pedido": ordered_at.isoformat(),
+                "dia_semana": WEEKDAYS[day.weekday()],
+                "data_recebimento": received_at.isoformat(),
+                "data_envio": (received_at + timedelta(seconds=rng.gauss(prep_mean, 60))).isoformat(),
+                "itens": itens,
+                "total": round(rng.uniform(30, 50), 2),
+            })
+    return OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos})
+
+
+def kinds(result: dict) -> set:
+    return {(finding["kind"], finding["start_date"]) for finding in result["findings"]}
+
+
+def test_stable_history_has_no_findings():
+    for seed in (1, 2, 3):
+        result = scan_order_history(history(seed), TODAY)
+        assert result["findings"] == []
+        assert (result["start_date"], result["end_date"]) == ("2025-06-23", "2025-06-29")
+        assert result["last_order_date"] == "2025-06-29"
+
+
+def test_seasonal_zscore_flags_order_spike():
+    result = scan_order_history(history(4, spike=True), TODAY)
+
+    assert kinds(result) == {("orders_spike", "2025-06-26"), ("sales_spike", "2025-06-26")}
+    orders = next(finding for finding in result["findings"] if finding["kind"] == "orders_spike")
+    assert orders["value"] == 60
+    assert 18 <= orders["expected"] <= 22
+    assert orders["z_score"] >= 5 and orders["severity"] == "high"
+
+
+def test_ewma_flags_slow_prep_day():
+    result = scan_order_history(history(5, slow=True), TODAY)
+
+    assert kinds(result) == {("prep_time_spike", "2025-06-27")}
+    finding = result["findings"][0]
+    assert 2600 <= finding["value"] <= 2800
+    assert 850 <= finding["expected"] <= 950
+
+
+def test_poisson_flags_product_drop():
+    result = scan_order_history(history(6, drop=True), TODAY)
+
+    assert kinds(result) == {("product_demand_drop", "2025-06-23")}
+    finding = result["findings"][0]
+    assert finding["product"] == "Bolo"
+    assert finding["value"] == 0
+    assert finding["end_date"] == "2025-06-29"
+    assert finding["z_score"] <= -3
+
+
+def test_findings_sorted_by_severity_and_window_follows_history():
+    result = scan_order_history(history(7, spike=True, slow=True, drop=True), TODAY)
+
+    scores = [abs(finding["z_score"]) for finding in result["findings"]]
+    assert scores == sorted(scores, reverse=True)
+    assert {finding["kind"] for finding in result["findings"]} == {"orders_spike", "sales_spike", "prep_time_spike", "product_demand_drop"}
+
+    # O histórico parou há mais de uma semana: a janela termina no último dia com pedidos.
+    later = scan_order_history(history(7), TODAY + timedelta(days=10))
+    assert later["end_date"] == "2025-06-29"
+    assert scan_order_history(OrderStore(), TODAY)["findings"] == []
@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+from utils.client_ranking import ClientTable, InvalidCursorError, clients_page_request
+from utils.metrics_aggregation import ClientsAggregator
+from utils.metrics_store import IncrementalMetricsStore
+
+
+def make_table(count: int, seed: int) -> ClientTable:
+    # Poucos valores distintos, para o ranking ter muitos empates.
+    rng = random.Random(seed)
+    orders = [rng.randint(1, 5) for _ in range(count)]
+    spent = [rng.choice([10.0, 25.5, 40.0, 99.9]) * rng.randint(1, 3) for _ in range(count)]
+    return ClientTable([f"c{index}" for index in range(count)], [f"Cliente {index}" for index in range(count)], orders, spent)
+
+
+def walk_pages(page_fn, sort_by: str, limit: int, cursor: str | None = None) -> list:
+    pages = []
+    while True:
+        page = page_fn(sort_by, limit, cursor)
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def expected_ids(table: ClientTable, sort_by: str) -> list:
+    values = table.orders if sort_by == "numero_de_pedidos" else table.spent
+    return [table.ids[index] for index in sorted(range(len(table)), key=lambda index: (-values[index], index))]
+
+
+@pytest.mark.parametrize("sort_by", ["valor_total_gasto", "numero_de_pedidos"])
+@pytest.mark.parametrize("limit", [1, 7, 50, 500])
+def test_pages_cover_ranking_without_gaps_or_duplicates(sort_by, limit):
+    table = make_table(203, seed=5)
+    pages = walk_pages(table.page, sort_by, limit)
+
+    ids = [client["cliente_id"] for page in pages for client in page["clients"]]
+    assert ids == expected_ids(table, sort_by)
+    assert len(set(ids)) == len(table)
+    assert [page["offset"] for page in pages] == list(range(0, len(table), limit))
+    assert all(page["total_clients"] == len(table) for page in pages)
+
+
+def test_ties_follow_first_appearance():
+    table = ClientTable(["a", "b", "c", "d"], ["A", "B", "C", "D"], [2, 3, 2, 2], [50.0, 10.0, 50.0, 80.0])
+
+    by_orders = walk_pages(table.page, "numero_de_pedidos", 2)
+    assert [client["cliente_id"] for page in by_orders for client in page["clients"]] == ["b", "a", "c", "d"]
+    by_spent = walk_pages(table.page, "valor_total_gasto", 1)
+    assert [client["cliente_id"] for page in by_spent for client in page["clients"]] == ["d", "a", "c", "b"]
+
+
+def test_cursor_belongs_to_its_sort():
+    table = make_table(30, seed=1)
+    page = table.page("valor_total_gasto", 10)
+
+    with pytest.raises(InvalidCursorError):
+        table.page("numero_de_pedidos", 10, page["next_cursor"])
+    with pytest.raises(InvalidCursorError):
+        table.page("valor_total_gasto", 10, "nao-e-um-cursor")
+
+
+def test_page_request_switches_sort_and_restarts():
+    table = make_table(30, seed=2)
+    first = table.page(**clients_page_request("/clients_metrics"), limit=10)
+    assert first["sort_by"] == "valor_total_gasto"
+
+    following = clients_page_request("próxima página", first)
+    assert following == {"sort_by": "valor_total_gasto", "cursor": first["next_cursor"]}
+    assert table.page(**following, limit=10)["offset"] == 10
+
+    # Trocar a ordenação recomeça do topo, mesmo pedindo a próxima página.
+    switched = clients_page_request("próxima página por pedidos", first)
+    assert switched == {"sort_by": "numero_de_pedidos", "cursor": None}
+    by_orders = table.page(**switched, limit=10)
+    assert [client["cliente_id"] for client in by_orders["clients"]] == expected_ids(table, "numero_de_pedidos")[:10]
+
+
+def test_incremental_store_pages_follow_new_orders():
+    store = IncrementalMetricsStore()
+    for index in range(40):
+        store.add_order({"cliente": {"id": index, "nome": f"Cliente {index}"}, "total": float(index % 7)})
+
+    first = store.clients_page("valor_total_gasto", 10)
+    second = store.clients_page("valor_total_gasto", 10, first["next_cursor"])
+    # Um cliente que já foi listado passa a gastar mais: as páginas seguintes
+    # continuam do cursor com o estado novo, sem repetir quem já apareceu.
+    store.add_order({"cliente": {"id": 39, "nome": "Cliente 39"}, "total": 100.0})
+    rest = walk_pages(store.clients_page, "valor_total_gasto", 10, second["next_cursor"])
+
+    seen = [client["cliente_id"] for page in [first, second, *rest] for client in page["clients"]]
+    assert len(seen) == len(set(seen)) == 40
+    assert store.clients_page("valor_total_gasto", 1)["clients"][0]["cliente_id"] == 39
+
+
+def test_aggregator_table_is_cached_until_next_order():
+    aggregator = ClientsAggregator()
+    aggregator.add({"cliente": {"id": 1, "nome": "A"}, "total": 10.0})
+    table = aggregator.table()
+    assert aggregator.table() is table
+
+    aggregator.add({"cliente": {"id": 2, "nome": "B"}, "total": 20.0})
+    assert aggregator.table() is not table
+    assert [client["cliente_id"] for client in aggregator.table().page("valor_total_gasto")["clients"]] == [2, 1]
@@ -0,0 +1,124 @@
+import json
+import math
+import random
+from datetime import date
+
+import pytest
+
+from plugins.metrics_plugin import MetricsPlugin
+from utils.columnar_metrics import calculate_store_metrics
+from utils.dataset_cache import DatasetCache
+from utils.metrics_aggregation import MetricsAggregator
+from utils.order_store import OrderStore
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders
+
+TODAY = date(2025, 6, 30)
+
+
+def reference_metrics(pedidos_data: dict, today: date = TODAY) -> dict:
+    aggregator = MetricsAggregator()
+    aggregator.set_restaurant(pedidos_data.get("restaurante", {}))
+    aggregator.add_many(pedidos_data["pedidos"])
+    return aggregator.result(today)
+
+
+def dump(metrics: dict) -> str:
+    # JSON sem `sort_keys`: compara valores, tipos (int x float) e a ordem das chaves.
+    return json.dumps(metrics, ensure_ascii=False)
+
+
+def assert_parity(pedidos_data: dict, today: date = TODAY) -> None:
+    expected = dump(reference_metrics(pedidos_data, today))
+    assert dump(calculate_store_metrics(OrderStore.from_pedidos_data(pedidos_data), today)) == expected
+
+
+def synthetic_data(count: int, seed: int) -> dict:
+    return {"restaurante": SYNTHETIC_RESTAURANT, "pedidos": list(generate_orders(count, seed=seed, end_date=TODAY, days=400))}
+
+
+def order(day: str, items: list, total: float = 10.0, prep_seconds: int | None = 600) -> dict:
+    pedido = {
+        "cliente": {"id": 1, "nome": "Ana"},
+        "data_pedido": f"{day}T12:00:00",
+        "dia_semana": ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"][date.fromisoformat(day).weekday()],
+        "itens": items,
+        "total": total,
+    }
+    if prep_seconds is not None:
+        pedido["data_recebimento"] = f"{day}T12:01:00"
+        pedido["data_envio"] = f"{day}T12:{1 + prep_seconds // 60:02d}:{prep_seconds % 60:02d}"
+    return pedido
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_parity_on_seeded_synthetic_history(seed):
+    assert_parity(synthetic_data(3000, seed))
+
+
+def test_parity_with_empty_history():
+    assert_parity({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": []})
+    assert_parity({"pedidos": []})
+
+
+def test_product_ranking_ties_keep_first_appearance_order():
+    pedidos = [
+        order("2025-06-02", [{"nome": "Cuscuz", "quantidade": 2}, {"nome": "Café", "quantidade": 4}]),
+        order("2025-06-03", [{"nome": "Bolo", "quantidade": 4}, {"nome": "Tapioca", "quantidade": 4}]),
+        order("2025-06-04", [{"nome": "Cuscuz", "quantidade": 2}, {"nome": "Suco", "quantidade": 1}]),
+    ]
+    data = {"restaurante": {"nome": "Empates"}, "pedidos": pedidos}
+    assert [product["name"] for product in reference_metrics(data)["top_products"]] == ["Cuscuz", "Café", "Bolo"]
+    assert_parity(data)
+
+
+def test_float_totals_are_summed_in_order_and_rounded_like_the_reference():
+    rng = random.Random(4)
+    # Centavos sem representação exata: com esta seed, somar em outra ordem (ex.: `np.sum`,
+    # que é pairwise) muda o total arredondado, então só a soma sequencial passa.
+    totals = [rng.choice([0.1, 0.2, 2.675, 1.005, 1e6 + 0.015]) for _ in range(500)]
+    assert round(math.fsum(totals), 2) != reference_metrics(
+        {"pedidos": [order("2025-06-02", [], total=total) for total in totals]}
+    )["grand_total_sold"]
+    pedidos = [
+        order(f"2025-0{1 + index % 5}-1{index % 9}", [{"nome": "Café", "quantidade": 1}], total=total)
+        for index, total in enumerate(totals)
+    ]
+    assert_parity({"restaurante": {"nome": "Arredondamento"}, "pedidos": pedidos})
+
+
+def test_malformed_items_are_skipped_like_the_reference():
+    pedidos = [
+        order("2025-06-02", [{"nome": "Café", "quantidade": 2}, {"quantidade": 5}, {"nome": "Bolo", "quantidade": 1}]),
+        order("2025-06-03", [{"nome": "Bolo", "quantidade": 3}, {"nome": "Suco"}]),
+        order("2025-06-04", ["Tapioca", {"nome": "Café", "quantidade": 1}]),
+        order("2025-06-05", [{"nome": "Suco", "quantidade": "2"}]),
+        order("2025-06-06", None),
+        order("2025-06-07", [{"nome": "Suco", "quantidade": 1}], prep_seconds=None),
+    ]
+    data = {"restaurante": {"nome": "Malformados"}, "pedidos": pedidos}
+    # Cada pedido conta os itens até o primeiro malformado.
+    assert reference_metrics(data)["top_products"] == [
+        {"name": "Bolo", "sold": 3},
+        {"name": "Café", "sold": 2},
+        {"name": "Suco", "sold": 1},
+    ]
+    assert_parity(data)
+
+
+def test_malformed_orders_mixed_into_synthetic_history():
+    data = synthetic_data(2000, 11)
+    pedidos = data["pedidos"]
+    pedidos[10]["data_pedido"] = "não é data"
+    pedidos[20]["dia_semana"] = "Feriado"
+    pedidos[30].pop("dia_semana")
+    pedidos[40]["data_envio"] = None
+    pedidos[50]["itens"].append({"nome": "Sem quantidade"})
+    pedidos[60]["data_recebimento"] = "2025-13-01T00:00:00"
+    assert_parity(data)
+
+
+def test_pandas_backend_matches_python_backend():
+    pedidos_json_str = json.dumps(synthetic_data(2000, 5), ensure_ascii=False)
+    python_metrics = MetricsPlugin(cache=DatasetCache(), backend="python").query_metrics(pedidos_json_str)
+    pandas_metrics = MetricsPlugin(cache=DatasetCache(), backend="pandas").query_metrics(pedidos_json_str)
+    assert dump(pandas_metrics) == dump(python_metrics)
@@ -0,0 +1,76 @@
+import json
+import os
+
+from utils.dataset_cache import DatasetCache
+
+
+def write(path, data: dict, mtime_ns: int) -> str:
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_read_text_hits_until_mtime_or_size_change(tmp_path):
+    cache = DatasetCache()
+    path = write(tmp_path / "pedidos.json", {"pedidos": [1]}, 1_000_000_000)
+
+    text = cache.read_text(path)
+    assert cache.read_text(path) is text
+
+    # Mesmo tamanho, conteúdo e mtime novos: a chave muda e o arquivo é relido.
+    write(tmp_path / "pedidos.json", {"pedidos": [2]}, 2_000_000_000)
+    assert os.path.getsize(path) == len(text)
+    assert cache.read_text(path) == '{"pedidos": [2]}'
+
+    # Tamanho diferente com o mesmo mtime também invalida.
+    write(tmp_path / "pedidos.json", {"pedidos": [2, 3]}, 2_000_000_000)
+    assert cache.read_text(path) == '{"pedidos": [2, 3]}'
+
+
+def test_read_text_key_is_path_mtime_and_size(tmp_path):
+    cache = DatasetCache()
+    path = write(tmp_path / "pedidos.json", {"pedidos": [1]}, 1_000_000_000)
+    other = write(tmp_path / "outro.json", {"pedidos": [1]}, 1_000_000_000)
+    assert cache.file_key(path) == (os.path.abspath(path), 1_000_000_000, len('{"pedidos": [1]}'))
+
+    text = cache.read_text(path)
+    # Outro caminho com o mesmo conteúdo não reaproveita a entrada.
+    assert cache.read_text(other) is not text
+    # Conteúdo trocado sem mudar mtime nem tamanho não é percebido: a chave não olha o conteúdo.
+    write(tmp_path / "pedidos.json", {"pedidos": [9]}, 1_000_000_000)
+    assert cache.read_text(path) is text
+
+
+def test_parse_is_shared_by_content():
+    cache = DatasetCache()
+    text = json.dumps({"pedidos": [{"id": 1}]})
+    parsed = cache.parse(text)
+
+    assert cache.parse(text) is parsed
+    # Uma string igual (outro objeto) também acerta o cache.
+    assert cache.parse("".join(list(text))) is parsed
+    assert cache.parse(json.dumps({"pedidos": []})) is not parsed
+
+
+def test_derive_builds_once_per_content_and_is_dropped_with_the_parse():
+    cache = DatasetCache(max_parsed=1)
+    calls = []
+
+    def factory(pedidos_data):
+        calls.append(pedidos_data)
+        return len(pedidos_data["pedidos"])
+
+    first = json.dumps({"pedidos": [1, 2]})
+    second = json.dumps({"pedidos": [1, 2, 3]})
+    assert cache.derive(first, "count", factory) == 2
+    assert cache.derive(first, "count", factory) == 2
+    assert len(calls) == 1
+
+    # Conteúdo novo: outra entrada; com max_parsed=1, a anterior (e o derivado) sai do cache.
+    assert cache.derive(second, "count", factory) == 3
+    assert cache.derive(first, "count", factory) == 2
+    assert len(calls) == 3
+
+    cache.clear()
+    assert cache.derive(first, "count", factory) == 2
+    assert len(calls) == 4
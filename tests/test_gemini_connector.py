@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from connectors import gemini_connector
+from connectors.chat_transport import FakeChatTransport, TransientChatError
+from connectors.gemini_connector import GeminiChatService
+
+
+@pytest.fixture(autouse=True)
+def backoff_attempts(monkeypatch):
+    # Sem o cache do processo (GEMINI_CACHE) e sem dormir no backoff, registrando cada tentativa.
+    monkeypatch.setattr(gemini_connector, "GEMINI_CACHE_ENABLED", False)
+    monkeypatch.setattr(gemini_connector, "_default_cache", None)
+    delays = []
+    monkeypatch.setattr(gemini_connector, "backoff_delay", lambda attempt: delays.append(attempt) or 0.0)
+    return delays
+
+
+def flaky_responder(failures: int, text: str = "ok"):
+    attempts = []
+
+    def respond(prompt):
+        attempts.append(prompt)
+        if len(attempts) <= failures:
+            raise TransientChatError("quota")
+        return text
+
+    return respond, attempts
+
+
+class FailingStreamTransport(FakeChatTransport):
+    """Stream que cai depois de `fail_after` pedaços nas primeiras `failures` tentativas."""
+
+    def __init__(self, text: str, fail_after: int, failures: int = 1) -> None:
+        super().__init__(responses=[text] * (failures + 1), chunk_size=2)
+        self._fail_after = fail_after
+        self._failures = failures
+        self.streams = 0
+
+    async def stream(self, prompt: str):
+        self.streams += 1
+        failing = self.streams <= self._failures
+        sent = 0
+        async for chunk in super().stream(prompt):
+            if failing and sent == self._fail_after:
+                raise TransientChatError("conexão caiu")
+            sent += 1
+            yield chunk
+        if failing:
+            raise TransientChatError("conexão caiu")
+
+
+async def collect(stream) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+def service(transport, **kwargs) -> GeminiChatService:
+    kwargs.setdefault("requests_per_minute", float("inf"))
+    kwargs.setdefault("rate_burst", 100)
+    return GeminiChatService(transport=transport, **kwargs)
+
+
+def test_rate_limit_spaces_out_calls_beyond_the_burst():
+    transport = FakeChatTransport()
+    chat = service(transport, requests_per_minute=1200, rate_burst=1)
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(*(chat.complete(f"prompt {index}") for index in range(5)))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+
+    # Burst de 1 e 20 chamadas/s: as 4 chamadas além do burst esperam ~50 ms cada.
+    assert len(transport.calls) == 5
+    assert elapsed >= 0.18
+
+
+def test_transient_errors_are_retried_with_backoff(backoff_attempts):
+    respond, attempts = flaky_responder(failures=2)
+    chat = service(FakeChatTransport(responder=respond), max_retries=3)
+
+    assert asyncio.run(chat.complete("oi")) == "ok"
+    assert len(attempts) == 3
+    assert backoff_attempts == [0, 1]
+
+
+def test_retries_stop_after_max_retries():
+    respond, attempts = flaky_responder(failures=10)
+    chat = service(FakeChatTransport(responder=respond), max_retries=2)
+
+    with pytest.raises(TransientChatError):
+        asyncio.run(chat.complete("oi"))
+    assert len(attempts) == 3
+
+
+def test_non_retryable_errors_are_not_retried():
+    attempts = []
+
+    def respond(prompt):
+        attempts.append(prompt)
+        raise ValueError("prompt inválido")
+
+    chat = service(FakeChatTransport(responder=respond))
+
+    with pytest.raises(ValueError):
+        asyncio.run(chat.complete("oi"))
+    assert len(attempts) == 1
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    transport = FakeChatTransport(delay=0.05)
+    chat = service(transport)
+
+    async def run():
+        return await asyncio.gather(*(chat.complete("mesmo prompt") for _ in range(5)), chat.complete("outro prompt"))
+
+    results = asyncio.run(run())
+
+    assert transport.calls == ["mesmo prompt", "outro prompt"]
+    assert len(set(results[:5])) == 1
+
+
+def test_stream_retries_when_it_fails_before_the_first_chunk():
+    transport = FailingStreamTransport("resposta completa", fail_after=0)
+    chat = service(transport)
+
+    chunks = asyncio.run(collect(chat.stream("oi")))
+
+    assert transport.streams == 2
+    assert "".join(chunks) == "resposta completa"
+
+
+def test_stream_does_not_retry_after_the_first_chunk():
+    transport = FailingStreamTransport("resposta completa", fail_after=2)
+    chat = service(transport)
+    received = []
+
+    async def run():
+        async for chunk in chat.stream("oi"):
+            received.append(chunk)
+
+    with pytest.raises(TransientChatError):
+        asyncio.run(run())
+    # Repetir depois de entregar pedaços duplicaria o texto já mostrado.
+    assert transport.streams == 1
+    assert "".join(received) == "resposta completa"[:4]
+
+
+def test_max_concurrency_is_shared_across_event_loops():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    async def respond(prompt):
+        with lock:
+            running.append(prompt)
+            peak.append(len(running))
+        await asyncio.sleep(0.02)
+        with lock:
+            running.remove(prompt)
+        return prompt
+
+    chat = service(FakeChatTransport(responder=respond), max_concurrency=3)
+
+    async def prompts(name):
+        await asyncio.gather(*(chat.complete(f"{name} {index}") for index in range(6)))
+
+    def session(name):
+        # Cada thread com o próprio event loop, como sessões paralelas do app.
+        asyncio.run(asyncio.wait_for(prompts(name), 5))
+
+    threads = [threading.Thread(target=session, args=(f"sessão {index}",)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(peak) == 18
+    assert max(peak) == 3
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    chat = service(FakeChatTransport(delay=0.02), max_concurrency=1)
+
+    async def run():
+        first = asyncio.ensure_future(chat.complete("primeiro"))
+        waiting = asyncio.ensure_future(chat.complete("cancelado"))
+        await asyncio.sleep(0.005)
+        waiting.cancel()
+        await first
+        return await asyncio.wait_for(chat.complete("depois"), 1)
+
+    assert asyncio.run(run()) == "[fake] depois"
+    assert chat._concurrency.active == 0
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import date
+
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+from semantic_kernel.contents import FunctionResultContent
+
+import config
+from connectors import kernel_chat
+from connectors.kernel_chat import TOOL_NAME_SEPARATOR, FakeKernelChatCompletion, GeminiKernelChatCompletion, tool_call
+from plugins.anomalie_plugin import AnomaliePlugin
+from plugins.kernel_orchestrator import KERNEL_TOOLS, KernelOrchestrator
+from plugins.metrics_plugin import MetricsPlugin
+from plugins.report_plugin import ReportPlugin
+from utils.order_sources import OrderStoreSource
+from utils.order_store import OrderStore
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders
+
+PERIOD = {"start_date": "2025-06-01", "end_date": "2025-06-07"}
+
+
+@pytest.fixture
+def order_source():
+    pedidos = list(generate_orders(500, seed=1, end_date=date(2025, 6, 30), days=90))
+    return OrderStoreSource(OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos}))
+
+
+def orchestrator(order_source, chat_completion) -> KernelOrchestrator:
+    return KernelOrchestrator(MetricsPlugin(order_source=order_source), AnomaliePlugin(), ReportPlugin(), chat_completion=chat_completion)
+
+
+def asks_for(*calls):
+    """Pede as ferramentas `calls` na primeira ida e volta e responde em texto na seguinte."""
+
+    def respond(chat_history, tools):
+        if chat_history.messages[-1].role.value == "user":
+            return list(calls)
+        return "resposta final"
+
+    return respond
+
+
+def tool_results(chat_history) -> dict:
+    return {
+        item.name: item.result
+        for message in chat_history
+        for item in message.items
+        if isinstance(item, FunctionResultContent)
+    }
+
+
+def test_question_answered_from_context_takes_one_model_call(order_source):
+    chat = FakeKernelChatCompletion(responses=["O prato mais vendido é o Cuscuz."])
+    kernel = orchestrator(order_source, chat)
+
+    answer = asyncio.run(kernel.answer("qual o prato mais vendido?"))
+
+    assert answer == "O prato mais vendido é o Cuscuz."
+    assert kernel.last_turn == {"model_calls": 1, "tool_calls": []}
+    # As métricas atuais já vão no prompt de sistema.
+    assert SYNTHETIC_RESTAURANT["nome"] in chat.calls[0]["messages"][0].content
+
+
+def test_only_kernel_tools_are_offered(order_source):
+    chat = FakeKernelChatCompletion(responses=["ok"])
+
+    asyncio.run(orchestrator(order_source, chat).answer("oi"))
+
+    assert sorted(chat.calls[0]["tools"]) == sorted(name.replace("-", TOOL_NAME_SEPARATOR) for name in KERNEL_TOOLS)
+
+
+def test_parallel_tool_calls_take_a_second_model_call(order_source):
+    chat = FakeKernelChatCompletion(responder=asks_for(
+        tool_call("MetricsPlugin-get_period_metrics", compare_previous=True, **PERIOD),
+        tool_call("MetricsPlugin-get_anomalies"),
+    ))
+    kernel = orchestrator(order_source, chat)
+
+    answer = asyncio.run(kernel.answer("como foi a primeira semana de junho?"))
+
+    assert answer == "resposta final"
+    assert kernel.last_turn["model_calls"] == 2
+    assert sorted(kernel.last_turn["tool_calls"]) == ["MetricsPlugin-get_anomalies", "MetricsPlugin-get_period_metrics"]
+    assert len(chat.calls) == 2
+    period = tool_results(chat.calls[1]["messages"])["MetricsPlugin-get_period_metrics"]
+    assert period["current"]["orders"] == order_source.summarize(date(2025, 6, 1), date(2025, 6, 8))["orders"]   # fim exclusivo
+    assert "previous" in period
+
+
+def test_calls_outside_kernel_tools_are_not_counted(order_source):
+    chat = FakeKernelChatCompletion(responder=asks_for(
+        tool_call("MetricsPlugin-query_metrics", pedidos_json_str="{}"),
+        tool_call("MetricsPlugin-get_metrics"),
+    ))
+    kernel = orchestrator(order_source, chat)
+
+    asyncio.run(kernel.answer("métricas?"))
+
+    assert kernel.last_turn == {"model_calls": 2, "tool_calls": ["MetricsPlugin-get_metrics"]}
+
+
+def test_history_keeps_only_the_last_messages(order_source):
+    chat = FakeKernelChatCompletion(responses=["ok"])
+    history = [{"role": "user" if index % 2 == 0 else "assistant", "content": f"mensagem {index}"} for index in range(10)]
+
+    asyncio.run(orchestrator(order_source, chat).answer("e agora?", history))
+
+    contents = [message.content for message in chat.calls[0]["messages"][1:]]
+    assert contents == [f"mensagem {index}" for index in range(4, 10)] + ["e agora?"]
+
+
+def test_without_gemini_key_the_answer_raises_runtime_error(order_source, monkeypatch):
+    # O agente e o app tratam RuntimeError mostrando o erro; o orquestrador é criado sem a chave.
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr(config, "_gemini_model", None)
+    kernel = orchestrator(order_source, GeminiKernelChatCompletion())
+
+    with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
+        asyncio.run(kernel.answer("qual o prato mais vendido?"))
+    assert kernel.last_turn is None
+
+
+def test_gemini_model_is_reused_per_system_prompt():
+    first = kernel_chat._system_model("Você é o assistente do restaurante A.")
+    assert kernel_chat._system_model("Você é o assistente do restaurante A.") is first
+    assert kernel_chat._system_model("Você é o assistente do restaurante B.") is not first
+    assert ResourceExhausted in kernel_chat.RETRYABLE_ERRORS
@@ -0,0 +1,119 @@
+import json
+import os
+from datetime import date
+
+from utils.order_log import OrderFeed, OrderLog, import_legacy
+from utils.order_store import OrderStore
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders, write_orders
+
+TODAY = date(2025, 6, 30)
+
+
+def dump(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def orders(count: int, seed: int) -> list:
+    return list(generate_orders(count, seed=seed, end_date=TODAY, days=60))
+
+
+def new_log(tmp_path, pedidos: list) -> OrderLog:
+    log = OrderLog(str(tmp_path / "pedidos.ndjson"))
+    log.create(SYNTHETIC_RESTAURANT)
+    log.append(pedidos)
+    return log
+
+
+def expected_metrics(pedidos: list) -> str:
+    return dump(OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos}).metrics(TODAY))
+
+
+def test_append_consumes_generator_in_batches(tmp_path):
+    log = new_log(tmp_path, [])
+    pedidos = orders(25, seed=1)
+
+    assert log.append(iter(pedidos), batch_size=4) == 25
+    assert log.append(iter([])) == 0
+    records = [record for batch, _ in log.batches() for record in batch]
+    assert records[1:] == pedidos
+
+
+def test_resume_from_checkpoint_plus_offset(tmp_path):
+    first, later = orders(300, seed=2), orders(40, seed=3)
+    log = new_log(tmp_path, first)
+    OrderFeed.open(log.path)
+    log.append(later)
+
+    feed = OrderFeed.open(log.path)
+    # Retomou do snapshot (300 pedidos) e leu só os 40 acrescentados depois do offset.
+    assert feed._checkpoint_orders == 300
+    assert len(feed.order_store) == 340
+    assert feed.offset == os.path.getsize(log.path)
+    assert dump(feed.order_store.metrics(TODAY)) == expected_metrics(first + later)
+    assert dump(feed.metrics_store.metrics(TODAY)) == expected_metrics(first + later)
+
+
+def test_truncated_last_line_waits_for_newline(tmp_path):
+    first = orders(20, seed=4)
+    extra = orders(1, seed=5)[0]
+    log = new_log(tmp_path, first)
+    feed = OrderFeed.open(log.path)
+    offset = feed.offset
+
+    line = (json.dumps(extra, ensure_ascii=False) + "\n").encode("utf-8")
+    with open(log.path, "ab") as f:
+        f.write(line[:30])
+    assert feed.poll() == 0
+    assert feed.offset == offset
+    # Um checkpoint no meio da escrita cobre só as linhas completas.
+    assert feed.checkpoint()["offset"] == offset
+
+    with open(log.path, "ab") as f:
+        f.write(line[30:])
+    assert feed.poll() == 1
+    assert len(feed.order_store) == 21
+    assert log.invalid_lines == 0
+    assert dump(OrderFeed.open(log.path).order_store.metrics(TODAY)) == expected_metrics(first + [extra])
+
+
+def test_rewritten_log_fails_tail_hash_and_reparses(tmp_path):
+    log = new_log(tmp_path, orders(200, seed=6))
+    feed = OrderFeed.open(log.path)
+    checkpoint_offset = feed.offset
+
+    # Reescreve no lugar (mesmo inode, tamanho maior que o offset), com outros pedidos.
+    rewritten = orders(220, seed=7)
+    source = write_orders(str(tmp_path / "outro.ndjson"), 0)
+    with open(source, "ab") as f:
+        f.write("".join(json.dumps(pedido, ensure_ascii=False) + "\n" for pedido in rewritten).encode("utf-8"))
+    inode = os.stat(log.path).st_ino
+    with open(source, "rb") as src, open(log.path, "r+b") as dst:
+        dst.write(src.read())
+        dst.truncate()
+    assert os.stat(log.path).st_ino == inode
+    assert os.path.getsize(log.path) >= checkpoint_offset
+
+    assert feed._read_checkpoint() is None
+    reopened = OrderFeed.open(log.path)
+    assert len(reopened.order_store) == 220
+    # Releu o log inteiro e gravou um checkpoint novo, que volta a conferir.
+    assert reopened._read_checkpoint()["orders"] == 220
+    assert dump(reopened.order_store.metrics(TODAY)) == expected_metrics(rewritten)
+
+
+def test_import_legacy_writes_header_and_replaces_log(tmp_path):
+    legacy = write_orders(str(tmp_path / "pedidos.json"), 150, seed=8, end_date=TODAY, days=60)
+    log_path = str(tmp_path / "pedidos.ndjson")
+    log = new_log(tmp_path, orders(10, seed=9))
+    feed = OrderFeed.open(log.path)
+
+    assert import_legacy(legacy, log_path) == 150
+    with open(log_path, "r", encoding="utf-8") as f:
+        assert json.loads(f.readline()) == {"restaurante": SYNTHETIC_RESTAURANT}
+    assert not os.path.exists(f"{log_path}.tmp{os.getpid()}")
+
+    # O log novo tem outro inode: o feed aberto no antigo remonta do zero.
+    assert feed.poll() == 150
+    expected = dump(OrderStore.from_path(legacy).metrics(TODAY))
+    assert dump(feed.order_store.metrics(TODAY)) == expected
+    assert dump(feed.metrics_store.metrics(TODAY)) == expected
@@ -0,0 +1,95 @@
+import json
+import os
+from datetime import date
+
+import pytest
+
+from utils.order_snapshot import (
+    build_snapshot,
+    is_snapshot_fresh,
+    load_snapshot,
+    read_header,
+    snapshot_path_for,
+    write_snapshot,
+)
+from utils.order_sources import JSONOrderSource
+from utils.order_store import OrderStore
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders, write_orders
+
+TODAY = date(2025, 6, 30)
+
+
+def dump(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def write_pedidos(path, count: int, seed: int) -> str:
+    # Alguns pedidos irregulares, que o snapshot guarda no cabeçalho.
+    pedidos = list(generate_orders(count, seed=seed, end_date=TODAY, days=60))
+    pedidos[3]["data_pedido"] = "não é data"
+    pedidos[7]["itens"].append({"nome": "Sem quantidade"})
+    path.write_text(json.dumps({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos}, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def no_json_parse(monkeypatch):
+    def fail(pedidos_path):
+        raise AssertionError("o JSON não deveria ser relido")
+    monkeypatch.setattr(OrderStore, "from_path", fail)
+
+
+def test_round_trip_reproduces_metrics(tmp_path, monkeypatch):
+    pedidos_path = write_pedidos(tmp_path / "pedidos.json", 400, seed=11)
+    expected = OrderStore.from_path(pedidos_path)
+    snapshot_path = write_snapshot(expected, str(tmp_path / "pedidos.snapshot"), source_path=pedidos_path)
+
+    loaded = load_snapshot(snapshot_path)
+    assert len(loaded) == len(expected) == read_header(snapshot_path)["orders"]
+    assert loaded.irregular == expected.irregular
+    assert dump(loaded.metrics(TODAY)) == dump(expected.metrics(TODAY))
+
+    # A fonte JSON mapeia o snapshot em dia, sem parsear o arquivo.
+    no_json_parse(monkeypatch)
+    assert is_snapshot_fresh(snapshot_path, pedidos_path)
+    assert dump(JSONOrderSource(pedidos_path).metrics(TODAY)) == dump(expected.metrics(TODAY))
+
+
+def test_stale_snapshot_is_ignored(tmp_path):
+    pedidos_path = str(tmp_path / "pedidos.json")
+    write_orders(pedidos_path, 300, seed=12, end_date=TODAY)
+    snapshot_path = build_snapshot(pedidos_path)
+    assert snapshot_path == snapshot_path_for(pedidos_path)
+
+    # O JSON mudou depois do snapshot: mtime e tamanho novos.
+    write_orders(pedidos_path, 320, seed=13, end_date=TODAY)
+    os.utime(pedidos_path, ns=(1, 1))
+    assert not is_snapshot_fresh(snapshot_path, pedidos_path)
+
+    source = JSONOrderSource(pedidos_path)
+    assert len(source.order_store) == 320
+    assert dump(source.metrics(TODAY)) == dump(OrderStore.from_path(pedidos_path).metrics(TODAY))
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: b"OUTRACOI" + data[8:],   # magic errado
+    lambda data: data[:10],                # cabeçalho cortado no tamanho
+    lambda data: data[:40],                # cabeçalho JSON pela metade
+    lambda data: data[:-100],              # colunas truncadas
+])
+def test_corrupt_snapshot_falls_back_to_json(tmp_path, corrupt):
+    pedidos_path = str(tmp_path / "pedidos.json")
+    write_orders(pedidos_path, 200, seed=14, end_date=TODAY)
+    stat = os.stat(pedidos_path)
+    snapshot_path = build_snapshot(pedidos_path)
+    with open(snapshot_path, "rb") as f:
+        data = f.read()
+    with open(snapshot_path, "wb") as f:
+        f.write(corrupt(data))
+    # Reescrever o snapshot não muda o JSON de origem.
+    assert os.stat(pedidos_path).st_mtime_ns == stat.st_mtime_ns
+
+    with pytest.raises(ValueError):
+        load_snapshot(snapshot_path)
+    source = JSONOrderSource(pedidos_path)
+    assert len(source.order_store) == 200
+    assert dump(source.metrics(TODAY)) == dump(OrderStore.from_path(pedidos_path).metrics(TODAY))
@@ -0,0 +1,86 @@
+import json
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from utils.metrics_aggregation import ClientsAggregator, MetricsAggregator
+from utils.order_store import OrderStore
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders
+
+TODAY = date(2025, 6, 30)
+
+
+def dump(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def baseline(pedidos: list) -> tuple:
+    """Laço de referência, pedido a pedido: métricas gerais e tabela de clientes."""
+    metrics = MetricsAggregator()
+    metrics.set_restaurant(SYNTHETIC_RESTAURANT)
+    metrics.add_many(pedidos)
+    clients = ClientsAggregator()
+    clients.add_many(pedidos)
+    return metrics.result(TODAY), clients.table()
+
+
+def with_irregular(pedidos: list) -> list:
+    # Pedidos fora do formato colunar, espalhados pelo histórico.
+    pedidos[5]["data_pedido"] = "não é data"
+    pedidos[15]["dia_semana"] = "Feriado"
+    pedidos[25].pop("dia_semana")
+    pedidos[35]["data_envio"] = None
+    pedidos[45]["itens"].append({"nome": "Sem quantidade"})
+    pedidos[55]["data_recebimento"] = "2025-13-01T00:00:00"
+    pedidos[65]["total"] = 12
+    pedidos[75]["itens"][0]["quantidade"] = 2.5
+    return pedidos
+
+
+@pytest.mark.parametrize("irregular", [False, True])
+@pytest.mark.parametrize("seed", [3, 21])
+def test_metrics_match_baseline_loop(seed, irregular):
+    pedidos = list(generate_orders(1500, seed=seed, end_date=TODAY, days=120))
+    if irregular:
+        pedidos = with_irregular(pedidos)
+    store = OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos})
+    assert bool(store.irregular) == irregular
+
+    expected_metrics, expected_clients = baseline(pedidos)
+    assert dump(store.metrics(TODAY)) == dump(expected_metrics)
+    table = store.client_table()
+    assert (table.ids, table.names, table.orders, table.spent) == (
+        expected_clients.ids, expected_clients.names, expected_clients.orders, expected_clients.spent
+    )
+
+
+def test_append_invalidates_cached_metrics():
+    pedidos = with_irregular(list(generate_orders(200, seed=5, end_date=TODAY, days=30)))
+    store = OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos[:100]})
+    assert dump(store.metrics(TODAY)) == dump(baseline(pedidos[:100])[0])
+
+    store.extend(pedidos[100:])
+    assert dump(store.metrics(TODAY)) == dump(baseline(pedidos)[0])
+    assert store.client_table().spent == baseline(pedidos)[1].spent
+
+
+def test_summarize_while_appending_from_another_thread():
+    pedidos = sorted(generate_orders(6000, seed=8, end_date=TODAY, days=60), key=lambda pedido: pedido["data_pedido"])
+    store = OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos[:500]})
+    start, end = TODAY - timedelta(days=60), TODAY + timedelta(days=1)
+
+    writer = threading.Thread(target=store.extend, args=(pedidos[500:],))
+    writer.start()
+    # Cada resumo vê um prefixo consistente dos pedidos: nunca uma linha pela metade.
+    seen = []
+    while writer.is_alive():
+        summary = store.summarize(start, end, product="Tapioca de Queijo Coalho")
+        seen.append(store.summarize(start, end)["orders"])
+        assert summary["orders"] <= seen[-1]
+    writer.join()
+
+    assert seen == sorted(seen)
+    full = OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos})
+    assert dump(store.summarize(start, end)) == dump(full.summarize(start, end))
+    assert len(store.rows_between(start, end)) == len(pedidos)
@@ -0,0 +1,104 @@
+import io
+import json
+from datetime import date
+
+import pytest
+
+from utils.order_stream import OrderStream, _ChunkReader, write_ndjson
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders, write_orders
+
+TODAY = date(2025, 6, 30)
+
+
+class CountingReader(io.StringIO):
+    """Arquivo em memória que registra quantos caracteres já foram lidos."""
+
+    def __init__(self, text: str) -> None:
+        super().__init__(text)
+        self.chars_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.chars_read += len(chunk)
+        return chunk
+
+
+def read_values(text: str, chunk_size: int = 16, max_value_chars: int = 1 << 20) -> tuple:
+    """Lê `{"pedidos": [...]}` com o parser incremental, como o `OrderStream` faz."""
+    f = CountingReader(text)
+    reader = _ChunkReader(f, chunk_size, max_value_chars)
+    values = []
+    try:
+        reader.expect("{")
+        assert reader.decode() == "pedidos"
+        reader.expect(":")
+        values.extend(OrderStream._iter_array(reader))
+    except json.JSONDecodeError as error:
+        return values, error, f.chars_read
+    return values, None, f.chars_read
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_stream_matches_json_load(tmp_path, chunk_size):
+    path = write_orders(str(tmp_path / "pedidos.json"), 300, seed=3, end_date=TODAY)
+    with open(path, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+
+    stream = OrderStream(path, chunk_size=chunk_size)
+    assert list(stream) == expected["pedidos"]
+    assert stream.restaurante == expected["restaurante"]
+
+
+def test_legacy_layouts_match_json_load(tmp_path):
+    pedidos = list(generate_orders(20, seed=4, end_date=TODAY))
+    layouts = {
+        "restaurante_depois.json": {"pedidos": pedidos, "extra": [1, {"a": None}], "restaurante": SYNTHETIC_RESTAURANT},
+        "vazio.json": {"restaurante": SYNTHETIC_RESTAURANT, "pedidos": []},
+        "sem_campos.json": {},
+    }
+    for name, data in layouts.items():
+        path = tmp_path / name
+        for indent in (None, 4):
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=indent), encoding="utf-8")
+            stream = OrderStream(str(path), chunk_size=5)
+            assert list(stream) == data.get("pedidos", [])
+            assert stream.restaurante == data.get("restaurante", {})
+
+
+def test_ndjson_conversion_round_trips(tmp_path):
+    source = write_orders(str(tmp_path / "pedidos.json"), 120, seed=5, end_date=TODAY)
+    target = str(tmp_path / "pedidos.ndjson")
+
+    assert write_ndjson(source, target) == 120
+    converted = OrderStream(target)
+    assert list(converted) == list(OrderStream(source))
+    assert converted.restaurante == SYNTHETIC_RESTAURANT
+
+
+def test_malformed_object_fails_without_buffering_the_rest():
+    tail = ", ".join(json.dumps({"id": index, "nome": "x" * 50}) for index in range(2000))
+    text = '{"pedidos": [{"id": 1, "total": 10.5}, {"id": 2,, "total": 3}, ' + tail + "]}"
+
+    values, error, chars_read = read_values(text, chunk_size=64)
+    assert values == [{"id": 1, "total": 10.5}]
+    assert error is not None
+    # Falhou perto do objeto malformado, não no fim do arquivo.
+    assert chars_read < 1000 < len(text)
+
+
+def test_unterminated_string_stops_at_the_size_bound():
+    text = '{"pedidos": [{"id": 1, "obs": "' + "a" * 100_000
+    values, error, chars_read = read_values(text, chunk_size=256, max_value_chars=4096)
+    assert values == []
+    assert "4096" in error.msg
+    assert chars_read < 10_000
+
+
+def test_truncated_input_raises_decode_error(tmp_path):
+    pedidos = list(generate_orders(3, seed=6, end_date=TODAY))
+    text = json.dumps({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos}, ensure_ascii=False)
+    path = tmp_path / "cortado.json"
+    for cut in range(1, len(text) - 1, 7):
+        path.write_text(text[:cut], encoding="utf-8")
+        with pytest.raises(json.JSONDecodeError):
+            list(OrderStream(str(path), chunk_size=16))
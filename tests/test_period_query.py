@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from utils.period_query import parse_period_query
+
+# Uma quarta-feira.
+TODAY = date(2025, 6, 18)
+
+
+def period(text: str, **kwargs) -> tuple:
+    query = parse_period_query(text, TODAY, **kwargs)
+    return query["start_date"], query["end_date"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("como foram as vendas ontem?", ("2025-06-17", "2025-06-17")),
+    ("e anteontem?", ("2025-06-16", "2025-06-16")),
+    ("resumo de hoje", ("2025-06-18", "2025-06-18")),
+    ("semana passada", ("2025-06-09", "2025-06-15")),
+    ("nesta semana", ("2025-06-16", "2025-06-18")),
+    ("mês passado", ("2025-05-01", "2025-05-31")),
+    ("MÊS PASSADO", ("2025-05-01", "2025-05-31")),
+    ("últimos 3 dias", ("2025-06-16", "2025-06-18")),
+    ("ultimas 2 semanas", ("2025-06-05", "2025-06-18")),
+    ("sexta passada", ("2025-06-13", "2025-06-13")),
+    ("qualquer coisa", ("2025-06-12", "2025-06-18")),
+])
+def test_relative_periods(text, expected):
+    assert period(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("como foi março?", ("2025-03-01", "2025-03-31")),
+    ("como foi marco?", ("2025-03-01", "2025-03-31")),
+    ("Março de 2024", ("2024-03-01", "2024-03-31")),
+    ("fevereiro de 2024", ("2024-02-01", "2024-02-29")),
+    # Mês ainda por vir neste ano: o do ano passado; o mês corrente vai até hoje.
+    ("vendas em dezembro", ("2024-12-01", "2024-12-31")),
+    ("junho", ("2025-06-01", "2025-06-18")),
+])
+def test_month_names_with_and_without_accents(text, expected):
+    assert period(text) == expected
+
+
+def test_explicit_dates_win_and_survive_normalization():
+    assert period("de 2025-06-01 a 2025-06-10") == ("2025-06-01", "2025-06-10")
+    assert period("de 01/06 a 05/06") == ("2025-06-01", "2025-06-05")
+    assert period("entre 10/05/25 e 02/06/2025 em março") == ("2025-05-10", "2025-06-02")
+    # Data inválida é ignorada.
+    assert period("31/02 até 03/03") == ("2025-03-03", "2025-03-03")
+
+
+def test_comparisons_and_filters():
+    query = parse_period_query(
+        "como foi a última sexta comparada com a anterior?",
+        TODAY,
+        product_names=["Suco de Caju", "Caju"],
+        client_names=["Ana Souza"],
+    )
+    assert (query["start_date"], query["end_date"], query["compare_previous"]) == ("2025-06-13", "2025-06-13", True)
+    assert query["weekday"] is None
+
+    query = parse_period_query("mês passado às sextas, suco de caju da ana souza vs antes", TODAY, ["Suco de Caju", "Caju"], ["Ana Souza"])
+    assert (query["start_date"], query["end_date"]) == ("2025-05-01", "2025-05-31")
+    assert query["weekday"] == "Sexta-feira"
+    assert query["product"] == "Suco de Caju"
+    assert query["client"] == "Ana Souza"
+    assert query["compare_previous"] is True
+
+    assert parse_period_query("semana passada", TODAY)["compare_previous"] is False
@@ -0,0 +1,154 @@
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from connectors import gemini_connector
+from connectors.chat_transport import FakeChatTransport
+from connectors.gemini_connector import GeminiChatService
+from plugins.anomalie_plugin import AnomaliePlugin
+from plugins.metrics_plugin import MetricsPlugin
+from plugins.report_plugin import ReportPlugin
+from utils.metrics_aggregation import WEEKDAYS
+from utils.order_sources import OrderStoreSource
+from utils.order_store import OrderStore
+from utils.pipeline import Pipeline
+from utils.report_pipeline import build_report_pipeline
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders
+
+REPORT = {"title": "Relatório de teste", "summary": "ok", "recommendations": ["Reforçar a cozinha no sábado"]}
+
+
+@pytest.fixture(autouse=True)
+def no_process_cache(monkeypatch):
+    monkeypatch.setattr(gemini_connector, "GEMINI_CACHE_ENABLED", False)
+    monkeypatch.setattr(gemini_connector, "_default_cache", None)
+
+
+def respond(prompt: str) -> str:
+    # O prompt do relatório pede "recommendations"; o das anomalias recebe linhas de alerta.
+    if "recommendations" in prompt:
+        return json.dumps(REPORT, ensure_ascii=False)
+    return "* Pico de pedidos no sábado, acima do padrão\n* Conferir o estoque"
+
+
+def order_source_with_spike() -> OrderStoreSource:
+    pedidos = list(generate_orders(2000, seed=2, end_date=date(2025, 6, 30), days=90))
+    spike = datetime(2025, 6, 28, 19, 0)
+    for index, pedido in enumerate(pedidos[:200]):
+        moment = spike + timedelta(seconds=index)
+        pedidos.append({
+            **pedido,
+            "data_pedido": moment.isoformat(),
+            "dia_semana": WEEKDAYS[moment.weekday()],
+            "data_recebimento": (moment + timedelta(seconds=60)).isoformat(),
+            "data_envio": (moment + timedelta(seconds=960)).isoformat(),
+        })
+    return OrderStoreSource(OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos}))
+
+
+def test_report_pipeline_graph_runs_with_fake_transport():
+    transport = FakeChatTransport(responder=respond)
+    chat = GeminiChatService(transport=transport, requests_per_minute=float("inf"), rate_burst=100)
+    order_source = order_source_with_spike()
+    chunks = []
+    pipeline = build_report_pipeline(
+        MetricsPlugin(order_source=order_source),
+        AnomaliePlugin(chat_service=chat),
+        ReportPlugin(chat_service=chat),
+        None,
+        on_anomaly_chunk=chunks.append,
+        order_source=order_source,
+    )
+
+    assert {name: stage.depends_on for name, stage in pipeline._stages.items()} == {
+        "metrics": (),
+        "top_clients": (),
+        "anomaly_scan": (),
+        "rule_alerts": ("metrics",),
+        "ai_anomalies": ("metrics", "anomaly_scan"),
+        "alerts": ("rule_alerts", "anomaly_scan", "ai_anomalies"),
+        "report": ("metrics", "alerts"),
+    }
+
+    result = asyncio.run(pipeline.run())
+
+    # Duas chamadas ao modelo: a explicação dos achados (em streaming) e o relatório.
+    assert len(transport.calls) == 2
+    assert "".join(chunks) == result["ai_anomalies"]
+    assert json.loads(result["report"]) == REPORT
+    assert any(finding["kind"] == "orders_spike" for finding in result["anomaly_scan"]["findings"])
+    assert "Conferir o estoque" in result["alerts"]
+    assert len(result["top_clients"]["clients"]) == 3
+
+    assert set(result.timings) == set(pipeline._stages)
+    for name, stage in pipeline._stages.items():
+        for dependency in stage.depends_on:
+            assert result.timings[name]["start_ms"] >= result.timings[dependency]["end_ms"]
+    assert result.critical_path_ms() == result.timings["report"]["end_ms"] <= result.total_ms
+
+
+def test_stages_run_after_dependencies_and_in_parallel():
+    order = []
+
+    async def stage(name: str, delay: float, value):
+        order.append(f"{name}:início")
+        await asyncio.sleep(delay)
+        order.append(f"{name}:fim")
+        return value
+
+    pipeline = (
+        Pipeline()
+        .add("a", lambda: stage("a", 0.05, 1))
+        .add("b", lambda: stage("b", 0.05, 2))
+        .add("soma", lambda a, b: a + b, depends_on=("a", "b"))
+        .add("dobro", lambda soma: soma * 2, depends_on=("soma",), blocking=True)
+    )
+    result = asyncio.run(pipeline.run())
+
+    assert (result["soma"], result["dobro"]) == (3, 6)
+    # a e b começam juntos, antes de qualquer um terminar.
+    assert order[:2] == ["a:início", "b:início"]
+    assert result.timings["dobro"]["start_ms"] >= result.timings["soma"]["end_ms"]
+    assert result.timings["b"]["start_ms"] < result.timings["a"]["end_ms"]
+    assert result.timings["a"]["duration_ms"] >= 45
+
+
+def test_failing_stage_cancels_dependents_and_siblings():
+    ran = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            ran.append("lento cancelado")
+            raise
+
+    def broken():
+        raise RuntimeError("falhou")
+
+    pipeline = (
+        Pipeline()
+        .add("quebrado", broken)
+        .add("lento", slow)
+        .add("dependente", lambda quebrado: ran.append("dependente"), depends_on=("quebrado",))
+    )
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(RuntimeError, match="falhou"):
+            await pipeline.run()
+        return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(run()) < 1
+    assert ran == ["lento cancelado"]
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="duplicado"):
+        Pipeline().add("a", lambda: 1).add("a", lambda: 2)
+    with pytest.raises(ValueError, match="não existe"):
+        asyncio.run(Pipeline().add("a", lambda b: b, depends_on=("b",)).run())
+    with pytest.raises(ValueError, match="Ciclo"):
+        asyncio.run(Pipeline().add("a", lambda b: b, depends_on=("b",)).add("b", lambda a: a, depends_on=("a",)).run())
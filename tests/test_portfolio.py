@@ -0,0 +1,53 @@
+import json
+from datetime import date
+
+from utils.metrics_aggregation import MetricsAggregator
+from utils.portfolio import aggregate_portfolio
+from utils.synthetic_orders import generate_orders
+
+TODAY = date(2025, 6, 30)
+
+
+def write_shard(path, pedidos: list, restaurante: dict | None = None) -> str:
+    data = {"pedidos": pedidos}
+    if restaurante is not None:
+        data["restaurante"] = restaurante
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def orders(count: int, seed: int) -> list:
+    return list(generate_orders(count, seed=seed, end_date=TODAY, days=60))
+
+
+def test_restaurants_with_the_same_name_stay_separate(tmp_path):
+    centro = {"id": 1, "nome": "Sabor Caseiro"}
+    bairro = {"id": 2, "nome": "Sabor Caseiro"}
+    paths = [
+        write_shard(tmp_path / "centro-2024.json", orders(200, 1), centro),
+        write_shard(tmp_path / "bairro.json", orders(300, 2), bairro),
+        write_shard(tmp_path / "centro-2025.json", orders(100, 3), centro),
+    ]
+
+    result = aggregate_portfolio(paths, max_workers=1, today=TODAY)
+
+    assert [(entry["key"], entry["name"]) for entry in result["restaurants"]] == [(1, "Sabor Caseiro"), (2, "Sabor Caseiro")]
+    by_key = {entry["key"]: entry["metrics"] for entry in result["restaurants"]}
+    expected = MetricsAggregator()
+    expected.add_many(orders(200, 1) + orders(100, 3))
+    assert by_key[1]["grand_total_sold"] == expected.result(TODAY)["grand_total_sold"]
+    assert result["portfolio"]["restaurant_name"] == "Portfólio (2 restaurante(s))"
+
+
+def test_shards_without_restaurant_are_kept_per_file(tmp_path):
+    paths = [
+        write_shard(tmp_path / "a.json", orders(50, 4)),
+        write_shard(tmp_path / "b.json", orders(80, 5)),
+    ]
+
+    result = aggregate_portfolio(paths, max_workers=1, today=TODAY)
+
+    assert [entry["key"] for entry in result["restaurants"]] == paths
+    everything = MetricsAggregator()
+    everything.add_many(orders(50, 4) + orders(80, 5))
+    assert result["portfolio"]["grand_total_sold"] == everything.result(TODAY)["grand_total_sold"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from utils.quantile_sketch import RELATIVE_ACCURACY, LogHistogram, merged
+
+
+def sketch_of(values) -> LogHistogram:
+    sketch = LogHistogram()
+    for value in values:
+        sketch.add(float(value))
+    return sketch
+
+
+def prep_sample(seed: int, count: int = 20000):
+    # Tempos de preparo sintéticos: cauda longa, de segundos a horas.
+    rng = np.random.default_rng(seed)
+    return rng.lognormal(mean=7.0, sigma=1.2, size=count)
+
+
+@pytest.mark.parametrize("seed", [1, 42])
+def test_quantiles_within_relative_accuracy(seed):
+    values = prep_sample(seed)
+    sketch = sketch_of(values)
+
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0):
+        # O sketch devolve a amostra de posição floor(q * (n - 1)), como o método "lower".
+        exact = np.percentile(values, q * 100, method="lower")
+        assert abs(sketch.quantile(q) - exact) <= RELATIVE_ACCURACY * exact * (1 + 1e-9)
+
+
+def test_merge_matches_single_sketch():
+    values = prep_sample(7, 9000)
+    parts = [sketch_of(chunk) for chunk in np.array_split(values, 3)]
+    whole = sketch_of(values)
+
+    combined = merged(parts)
+    assert combined.counts == whole.counts
+    assert len(combined) == len(values)
+    assert combined.percentiles() == whole.percentiles()
+
+    # `merge` acumula no próprio sketch, sem alterar o outro.
+    first = sketch_of(values[:10])
+    other = sketch_of(values[10:20])
+    first.merge(other)
+    assert len(first) == 20 and len(other) == 10
+
+
+def test_empty_sketch_reports_zero():
+    sketch = LogHistogram()
+    assert len(sketch) == 0
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.percentiles() == {"p50": 0, "p90": 0, "p99": 0}
+    assert len(merged([])) == 0
+
+
+def test_zero_and_negative_values_fall_in_zero_bucket():
+    # Preparo negativo aparece quando as datas de envio e recebimento vêm trocadas.
+    sketch = sketch_of([0.0, -30.0, 0.0005])
+    assert sketch.quantile(0.0) == 0.0
+    assert sketch.quantile(1.0) == 0.0
+    assert sketch.percentiles() == {"p50": 0, "p90": 0, "p99": 0}
+
+    sketch.add(600.0)
+    assert sketch.quantile(0.5) == 0.0
+    assert abs(sketch.quantile(1.0) - 600.0) <= RELATIVE_ACCURACY * 600.0
+
+
+def test_single_value_answers_every_percentile():
+    sketch = sketch_of([1800.0])
+    for q in (0.0, 0.5, 0.99, 1.0):
+        assert abs(sketch.quantile(q) - 1800.0) <= RELATIVE_ACCURACY * 1800.0
+    percentiles = sketch.percentiles()
+    assert percentiles["p50"] == percentiles["p90"] == percentiles["p99"]
+    assert abs(percentiles["p50"] - 1800) <= 18
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import date
+
+import pytest
+
+from connectors import gemini_connector
+from connectors.chat_transport import FakeChatTransport
+from connectors.gemini_connector import GeminiChatService
+from plugins.anomalie_plugin import AnomaliePlugin
+from plugins.metrics_plugin import MetricsPlugin
+from plugins.report_plugin import ReportPlugin
+from utils import report_scheduler
+from utils.order_sources import OrderStoreSource
+from utils.order_store import OrderStore
+from utils.report_scheduler import ReportIndex, ReportScheduler, metrics_digest
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders
+
+GENERATED_AT = "2025-06-30T12:00:00"
+
+
+@pytest.fixture(autouse=True)
+def no_process_cache(monkeypatch):
+    monkeypatch.setattr(gemini_connector, "GEMINI_CACHE_ENABLED", False)
+    monkeypatch.setattr(gemini_connector, "_default_cache", None)
+
+
+def respond(prompt: str) -> str:
+    if "recommendations" in prompt:
+        return json.dumps({"title": "Relatório", "summary": "ok", "recommendations": []})
+    return "* Sem anomalias relevantes"
+
+
+def legacy_digest(metrics: dict) -> str:
+    # Digest como era gravado antes do marcador de versão.
+    canonical = json.dumps(metrics, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def make_scheduler(tmp_path, transport: FakeChatTransport) -> ReportScheduler:
+    pedidos = list(generate_orders(300, seed=7, end_date=date(2025, 6, 30), days=60))
+    order_source = OrderStoreSource(OrderStore.from_pedidos_data({"restaurante": SYNTHETIC_RESTAURANT, "pedidos": pedidos}))
+    chat = GeminiChatService(transport=transport, requests_per_minute=float("inf"), rate_burst=100)
+    return ReportScheduler(
+        None,
+        MetricsPlugin(order_source=order_source),
+        AnomaliePlugin(chat_service=chat),
+        ReportPlugin(chat_service=chat),
+        None,
+        index=ReportIndex(str(tmp_path / "reports")),
+        order_source=order_source,
+    )
+
+
+def test_digest_changes_with_the_version_marker(monkeypatch):
+    metrics = {"total_pedidos": 10, "restaurant_name": "Teste"}
+    digest = metrics_digest(metrics)
+
+    assert metrics_digest(dict(reversed(metrics.items()))) == digest
+    assert digest != legacy_digest(metrics)
+    monkeypatch.setattr(report_scheduler, "METRICS_DIGEST_VERSION", report_scheduler.METRICS_DIGEST_VERSION + 1)
+    assert metrics_digest(metrics) != digest
+
+
+def test_digest_from_a_previous_version_is_not_reused(tmp_path):
+    transport = FakeChatTransport(responder=respond)
+    scheduler = make_scheduler(tmp_path, transport)
+    metrics = scheduler._order_source.metrics()
+    # Índice gravado por uma versão anterior, com os mesmos dados e o digest sem versão.
+    scheduler.index.add(
+        {"generated_at": GENERATED_AT, "digest": legacy_digest(metrics), "source_version": scheduler.current_version()},
+        "relatório antigo",
+        "anomalias antigas",
+    )
+    scheduler._latest = scheduler.index.latest()
+
+    result = asyncio.run(scheduler.refresh())
+    assert result["digest"] == metrics_digest(metrics)
+    assert result["report_markdown"] != "relatório antigo"
+    calls = len(transport.calls)
+    assert calls > 0
+
+    # Com o digest atual, a próxima verificação reaproveita o resultado sem chamar a IA.
+    assert asyncio.run(scheduler.refresh())["report_file"] == result["report_file"]
+    assert len(transport.calls) == calls
+
+
+def test_add_in_the_same_second_gets_a_suffix(tmp_path):
+    index = ReportIndex(str(tmp_path / "reports"))
+    files = [index.add({"generated_at": GENERATED_AT}, f"relatório {n}", f"anomalias {n}")["report_file"] for n in range(3)]
+
+    assert files == [
+        "report_2025-06-30_12-00-00.md",
+        "report_2025-06-30_12-00-00_2.md",
+        "report_2025-06-30_12-00-00_3.md",
+    ]
+    assert [index.read(entry) for entry in index.entries()] == ["relatório 0", "relatório 1", "relatório 2"]
+    assert index.latest()["anomalies_markdown"] == "anomalias 2"
+
+
+def test_index_is_swapped_atomically(tmp_path, monkeypatch):
+    index = ReportIndex(str(tmp_path / "reports"))
+    index.add({"generated_at": GENERATED_AT}, "relatório 0", "anomalias 0")
+    with open(index.index_path, "r", encoding="utf-8") as f:
+        before = f.read()
+    seen = []
+    real_replace = os.replace
+
+    def checking_replace(src, dst):
+        # No momento da troca, o índice antigo está intacto e o temporário já está completo.
+        with open(dst, "r", encoding="utf-8") as f:
+            seen.append(f.read() == before)
+        with open(src, "r", encoding="utf-8") as f:
+            seen.append(len(json.load(f)["reports"]) == 2)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(report_scheduler.os, "replace", checking_replace)
+    index.add({"generated_at": GENERATED_AT}, "relatório 1", "anomalias 1")
+    assert seen == [True, True]
+    assert len(index.entries()) == 2
+
+    def failing_replace(src, dst):
+        raise OSError("disco cheio")
+
+    # Se a troca falha, quem lê continua vendo o índice anterior inteiro.
+    monkeypatch.setattr(report_scheduler.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        index.add({"generated_at": GENERATED_AT}, "relatório 2", "anomalias 2")
+    assert [entry["report_file"] for entry in index.entries()] == [
+        "report_2025-06-30_12-00-00.md",
+        "report_2025-06-30_12-00-00_2.md",
+    ]
@@ -0,0 +1,41 @@
+import sqlite3
+
+from connectors import response_cache
+from connectors.response_cache import ResponseCache
+
+
+def stored_keys(db_path) -> set:
+    with sqlite3.connect(db_path) as db:
+        return {row[0] for row in db.execute("SELECT key FROM responses")}
+
+
+def test_sqlite_tier_keeps_only_the_newest_max_entries(tmp_path, monkeypatch):
+    clock = iter(range(100, 200))
+    monkeypatch.setattr(response_cache.time, "time", lambda: float(next(clock)))
+    db_path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(max_entries=3, ttl_seconds=0, db_path=str(db_path))
+
+    for index in range(6):
+        cache.set(f"k{index}", f"resposta {index}")
+
+    assert stored_keys(db_path) == {"k3", "k4", "k5"}
+
+
+def test_sqlite_tier_drops_expired_rows(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    db_path = tmp_path / "cache.sqlite"
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, db_path=str(db_path))
+    cache.set("antiga", "a")
+    now[0] += 30
+    cache.set("recente", "b")
+
+    now[0] += 45
+    cache.set("nova", "c")
+
+    assert stored_keys(db_path) == {"recente", "nova"}
+    # Reabrir (ex.: reinício do Streamlit) também limpa o que expirou enquanto estava fechado.
+    now[0] += 1000
+    reopened = ResponseCache(max_entries=10, ttl_seconds=60, db_path=str(db_path))
+    assert stored_keys(db_path) == set()
+    assert reopened.get("nova") is None
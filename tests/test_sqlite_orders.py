@@ -0,0 +1,95 @@
+import json
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from utils.metrics_aggregation import WEEKDAYS
+from utils.order_sources import OrderStoreSource
+from utils.order_store import OrderStore
+from utils.sqlite_orders import SQLiteOrderSource
+from utils.synthetic_orders import SYNTHETIC_RESTAURANT, generate_orders
+
+TODAY = date(2025, 6, 30)
+
+
+def dump(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def sources(tmp_path, pedidos: list, restaurante: dict = SYNTHETIC_RESTAURANT) -> tuple:
+    sqlite_source = SQLiteOrderSource(str(tmp_path / "pedidos.db"), create=True)
+    sqlite_source.add_orders(pedidos, batch_size=700)
+    sqlite_source.set_restaurant(restaurante)
+    store_source = OrderStoreSource(OrderStore.from_pedidos_data({"restaurante": restaurante, "pedidos": pedidos}))
+    return sqlite_source, store_source
+
+
+def walk_pages(source, sort_by: str, limit: int) -> list:
+    pages = [source.clients_page(sort_by, limit)]
+    while pages[-1]["next_cursor"]:
+        pages.append(source.clients_page(sort_by, limit, pages[-1]["next_cursor"]))
+    return pages
+
+
+def assert_parity(sqlite_source, store_source, today: date, periods: list) -> None:
+    assert dump(sqlite_source.metrics(today)) == dump(store_source.metrics(today))
+    for sort_by in ("valor_total_gasto", "numero_de_pedidos"):
+        assert walk_pages(sqlite_source, sort_by, 7) == walk_pages(store_source, sort_by, 7)
+        assert sqlite_source.top_clients(5, sort_by) == store_source.top_clients(5, sort_by)
+    for start, end, filters in periods:
+        assert dump(sqlite_source.summarize(start, end, **filters)) == dump(store_source.summarize(start, end, **filters))
+
+
+def cents_orders(dates: list, seed: int) -> list:
+    """Pedidos com totais sem representação exata, em que a ordem da soma muda o arredondamento."""
+    rng = random.Random(seed)
+    pedidos = []
+    for index, moment in enumerate(dates):
+        received = moment + timedelta(seconds=rng.randint(10, 90))
+        pedidos.append({
+            "cliente": {"id": index % 6, "nome": f"Cliente {index % 6}"},
+            "data_pedido": moment.isoformat(),
+            "dia_semana": WEEKDAYS[moment.weekday()],
+            "data_recebimento": received.isoformat(),
+            "data_envio": (received + timedelta(seconds=rng.randint(300, 1500), microseconds=rng.randrange(10 ** 6))).isoformat(),
+            "itens": [{"nome": rng.choice(["Café", "Bolo", "Suco"]), "quantidade": rng.randint(1, 3)}],
+            "total": rng.choice([0.1, 0.2, 2.675, 1.005, 1e6 + 0.015]),
+        })
+    return pedidos
+
+
+@pytest.mark.parametrize("seed", [3, 17])
+def test_sqlite_matches_order_store_on_synthetic_history(tmp_path, seed):
+    pedidos = list(generate_orders(3000, seed=seed, end_date=TODAY, days=120, clients=60))
+    periods = [
+        (date(2025, 6, 1), date(2025, 7, 1), {}),
+        (date(2025, 5, 1), date(2025, 6, 1), {"weekday": 4}),
+        (date(2025, 3, 1), date(2025, 7, 1), {"product": "Café Preto"}),
+        (date(2025, 3, 1), date(2025, 7, 1), {"client": 210}),
+    ]
+    assert_parity(*sources(tmp_path, pedidos), TODAY, periods)
+
+
+def test_sqlite_matches_order_store_with_irregular_orders(tmp_path):
+    pedidos = list(generate_orders(800, seed=5, end_date=TODAY, days=60))
+    pedidos[3]["data_pedido"] = "não é data"
+    pedidos[8].pop("dia_semana")
+    pedidos[13]["itens"].append({"nome": "Sem quantidade"})
+    pedidos[21]["cliente"] = {"nome": "Sem id"}
+    assert_parity(*sources(tmp_path, pedidos), TODAY, [(date(2025, 5, 1), date(2025, 7, 1), {})])
+
+
+def test_float_sums_match_the_sequential_reference(tmp_path):
+    start = datetime(2025, 5, 20, 8)
+    dates = [start + timedelta(hours=7 * index) for index in range(400)]
+    assert_parity(*sources(tmp_path, cents_orders(dates, 4)), TODAY, [(date(2025, 5, 1), date(2025, 7, 1), {})])
+
+
+def test_days_before_1970_are_bucketed_like_the_order_store(tmp_path):
+    # Antes da época, `ordered_at_us / DAY_US` em SQL truncaria para zero e mudaria o dia.
+    start = datetime(1969, 12, 1, 5)
+    dates = [start + timedelta(hours=11 * index) for index in range(150)]
+    today = date(1970, 1, 1)
+    periods = [(date(1969, 12, 20), date(1970, 1, 2), {}), (date(1969, 12, 31), date(1970, 1, 1), {})]
+    assert_parity(*sources(tmp_path, cents_orders(dates, 9)), today, periods)
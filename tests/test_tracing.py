@@ -0,0 +1,61 @@
+import json
+import urllib.request
+
+from utils import tracing
+from utils.tracing import Tracer
+
+
+def test_jsonl_export_keeps_one_handle_and_switches_files(tmp_path):
+    first, second = tmp_path / "a.jsonl", tmp_path / "b.jsonl"
+    tracer = Tracer(enabled=True, jsonl_path=str(first))
+    for index in range(3):
+        with tracer.span("load", rows=index):
+            pass
+    handle = tracer._jsonl_file
+    with tracer.span("load", rows=3):
+        pass
+    assert tracer._jsonl_file is handle
+
+    # Buffer de linha: os spans já estão no arquivo antes de fechá-lo.
+    assert [json.loads(line)["attrs"]["rows"] for line in first.read_text(encoding="utf-8").splitlines()] == [0, 1, 2, 3]
+
+    tracer.configure(jsonl_path=str(second))
+    assert handle.closed
+    with tracer.span("parse"):
+        pass
+    tracer.close()
+    assert [json.loads(line)["name"] for line in second.read_text(encoding="utf-8").splitlines()] == ["parse"]
+
+
+def test_prometheus_counts_flags_apart_from_numeric_attributes():
+    tracer = Tracer(enabled=True)
+    for hit in (True, False, True):
+        with tracer.span("llm.complete", cache_hit=hit, prompt_chars=100):
+            pass
+
+    text = tracer.render_prometheus()
+    assert 'agent_span_attribute_total{span="llm.complete",attribute="prompt_chars"} 300' in text
+    assert 'agent_span_flag_total{span="llm.complete",attribute="cache_hit"} 2' in text
+    assert 'attribute_total{span="llm.complete",attribute="cache_hit"}' not in text
+    assert 'agent_span_count_total{span="llm.complete"} 3' in text
+
+
+def test_metrics_server_starts_only_when_requested(monkeypatch):
+    fresh = Tracer(enabled=True)
+    monkeypatch.setattr(tracing, "tracer", fresh)
+    monkeypatch.setenv("AGENT_METRICS_PORT", "0")
+    assert fresh._server is None
+
+    tracing.serve_metrics_from_env()
+    server = fresh._server
+    try:
+        tracing.serve_metrics_from_env()
+        assert fresh._server is server
+        with fresh.span("load"):
+            pass
+        host, port = server.server_address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            assert 'agent_span_count_total{span="load"} 1' in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,228 @@
+import warnings
+from datetime import date
+
+import numpy as np
+
+from utils.columnar_metrics import _column
+from utils.metrics_aggregation import WEEKDAYS
+from utils.order_store import DAY_US, EPOCH_ORDINAL, MISSING, OrderStore
+
+EVALUATE_DAYS = 7            # dias completos avaliados (terminando no último dia com pedidos, no máximo ontem)
+BASELINE_WEEKS = 8           # mesmos dias da semana usados como referência sazonal
+MIN_BASELINE_SAMPLES = 4
+PRODUCT_BASELINE_WINDOWS = 4 # janelas anteriores de EVALUATE_DAYS para a demanda por produto
+MIN_PRODUCT_UNITS = 10       # média mínima por janela para um produto ser avaliado
+MIN_PRODUCT_DROP = 0.4       # queda relativa mínima (40%)
+EWMA_ALPHA = 0.3
+MIN_EWMA_DAYS = 7
+MIN_PREP_ORDERS = 3          # pedidos mínimos no dia para avaliar o preparo médio
+Z_THRESHOLD = 3.0
+SEVERITY_LEVELS = (("high", 5.0), ("medium", 4.0), ("low", 0.0))
+
+
+def _severity(z_score: float) -> str:
+    return next(level for level, minimum in SEVERITY_LEVELS if abs(z_score) >= minimum)
+
+
+def _day(day_number: int) -> date:
+    return date.fromordinal(EPOCH_ORDINAL + int(day_number))
+
+
+def _finding(kind: str, metric: str, start: date, end: date, value, expected, z_score: float, message: str, **extra) -> dict:
+    return {
+        "kind": kind,
+        "severity": _severity(z_score),
+        "metric": metric,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "value": value,
+        "expected": expected,
+        "z_score": round(float(z_score), 2),
+        "message": message,
+        **extra,
+    }
+
+
+def _seasonal_scores(series: np.ndarray, positions: np.ndarray, weeks: int) -> tuple:
+    """
+    Média, desvio e z-score de cada posição contra os mesmos dias da semana das `weeks`
+    semanas anteriores (só as que já têm histórico). Sem amostras suficientes, NaN.
+    """
+    lags = positions[None, :] - 7 * np.arange(1, weeks + 1)[:, None]
+    valid = lags >= 0
+    baseline = np.where(valid, series[np.clip(lags, 0, None)], np.nan)
+    samples = valid.sum(axis=0)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        # Colunas sem amostras suficientes viram NaN (nanmean/nanstd avisam; é esperado).
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(np.where(samples >= MIN_BASELINE_SAMPLES, baseline, np.nan), axis=0)
+        std = np.nanstd(baseline, axis=0, ddof=1)
+        # Piso no desvio: séries quase constantes não transformam qualquer oscilação em anomalia.
+        std = np.maximum(std, np.maximum(0.1 * mean, 1e-9))
+        scores = (series[positions] - mean) / std
+    return mean, scores
+
+
+def scan_order_history(
+    order_store: OrderStore,
+    today: date | None = None,
+    evaluate_days: int = EVALUATE_DAYS,
+    z_threshold: float = Z_THRESHOLD,
+) -> dict:
+    """
+    Varre o histórico colunar em busca de anomalias, sem chamar a IA:
+
+    - vendas e pedidos por dia contra a linha de base sazonal (mesmo dia da semana nas
+      semanas anteriores), em z-score;
+    - preparo médio diário contra a média/variância exponencial (EWMA) dos dias anteriores;
+    - queda de demanda por produto na janela avaliada contra as janelas anteriores.
+
+    A janela avaliada são os `evaluate_days` dias completos até ontem (ou até o último dia
+    com pedidos, se o histórico parou antes). Devolve a janela e os achados, do mais grave
+    para o menos grave.
+    """
+    today = today or date.today()
+    with order_store.reading():
+        return _scan(order_store, today, evaluate_days, z_threshold)
+
+
+def _scan(order_store: OrderStore, today: date, evaluate_days: int, z_threshold: float) -> dict:
+    ordered_at_us = _column(order_store.ordered_at_us, np.int64)
+    valid = ordered_at_us != MISSING
+    result = {"last_order_date": None, "start_date": None, "end_date": None, "findings": []}
+    if not valid.any():
+        return result
+
+    day_numbers = ordered_at_us // DAY_US
+    first_day = int(day_numbers[valid].min())
+    last_day = int(day_numbers[valid].max())
+    end = min(today.toordinal() - EPOCH_ORDINAL, last_day + 1)   # exclusivo
+    start = end - evaluate_days
+    result.update(
+        last_order_date=_day(last_day).isoformat(),
+        start_date=_day(start).isoformat(),
+        end_date=_day(end - 1).isoformat(),
+    )
+    if start <= first_day:
+        return result
+
+    # Séries diárias densas de `first_day` até o fim da janela, montadas com bincount.
+    length = end - first_day
+    in_range = valid & (day_numbers < end)
+    positions = (day_numbers[in_range] - first_day).astype(np.int64)
+    totals = _column(order_store.totals, np.float64)[in_range]
+    orders = np.bincount(positions, minlength=length).astype(np.float64)
+    sales = np.bincount(positions, weights=totals, minlength=length)
+
+    received = _column(order_store.received_at_us, np.int64)[in_range]
+    dispatched = _column(order_store.dispatched_at_us, np.int64)[in_range]
+    has_prep = received != MISSING
+    prep_seconds = (dispatched[has_prep] - received[has_prep]) / 1_000_000
+    prep_sum = np.bincount(positions[has_prep], weights=prep_seconds, minlength=length)
+    prep_count = np.bincount(positions[has_prep], minlength=length)
+
+    findings = []
+    window = np.arange(start - first_day, end - first_day)
+
+    for metric, series, label, unit in (
+        ("sales", sales, "Vendas", "R$ {:.2f}"),
+        ("orders", orders, "Pedidos", "{:.0f} pedido(s)"),
+    ):
+        mean, scores = _seasonal_scores(series, window, BASELINE_WEEKS)
+        for position, expected, z_score in zip(window, mean, scores):
+            if np.isnan(z_score) or abs(z_score) < z_threshold:
+                continue
+            day = _day(first_day + position)
+            direction = "acima" if z_score > 0 else "abaixo"
+            findings.append(_finding(
+                f"{metric}_{'spike' if z_score > 0 else 'drop'}",
+                metric,
+                day,
+                day,
+                round(float(series[position]), 2),
+                round(float(expected), 2),
+                z_score,
+                f"{label} de {day.strftime('%d/%m/%Y')} ({WEEKDAYS[day.weekday()]}): {unit.format(series[position])}, "
+                f"{direction} do esperado para o dia da semana ({unit.format(expected)}; z={z_score:+.1f}).",
+            ))
+
+    # EWMA do preparo médio diário: cada dia é comparado à tendência dos dias anteriores.
+    ewma_mean = ewma_var = None
+    seen_days = 0
+    for position in np.flatnonzero(prep_count):
+        average = prep_sum[position] / prep_count[position]
+        if ewma_mean is None:
+            ewma_mean, ewma_var = average, 0.0
+            seen_days = 1
+            continue
+        if position >= window[0] and seen_days >= MIN_EWMA_DAYS and prep_count[position] >= MIN_PREP_ORDERS:
+            std = max(ewma_var ** 0.5, 0.1 * ewma_mean, 1e-9)
+            z_score = (average - ewma_mean) / std
+            if z_score >= z_threshold:
+                day = _day(first_day + position)
+                findings.append(_finding(
+                    "prep_time_spike",
+                    "avg_prep_seconds",
+                    day,
+                    day,
+                    int(average),
+                    int(ewma_mean),
+                    z_score,
+                    f"Tempo médio de preparo em {day.strftime('%d/%m/%Y')}: {average / 60:.1f} min, "
+                    f"acima da tendência recente ({ewma_mean / 60:.1f} min; z={z_score:+.1f}).",
+                ))
+        diff = average - ewma_mean
+        increment = EWMA_ALPHA * diff
+        ewma_mean += increment
+        ewma_var = (1 - EWMA_ALPHA) * (ewma_var + diff * increment)
+        seen_days += 1
+
+    findings.extend(_product_drops(order_store, day_numbers, valid, first_day, start, end, evaluate_days, z_threshold))
+    findings.sort(key=lambda finding: -abs(finding["z_score"]))
+    result["findings"] = findings
+    return result
+
+
+def _product_drops(order_store, day_numbers, valid, first_day, start, end, evaluate_days, z_threshold) -> list:
+    """Produtos cuja demanda na janela caiu em relação à média das janelas anteriores (Poisson)."""
+    windows = min(PRODUCT_BASELINE_WINDOWS, (start - first_day) // evaluate_days)
+    if windows < 1 or not order_store.product_names:
+        return []
+    offsets = _column(order_store.item_offsets, np.int64)
+    products = _column(order_store.item_products, np.int32)
+    quantities = _column(order_store.item_quantities, np.int64)
+    item_days = np.repeat(np.where(valid, day_numbers, MISSING), np.diff(offsets))
+
+    product_count = len(order_store.product_names)
+    recent_items = (item_days >= start) & (item_days < end)
+    baseline_items = (item_days >= start - windows * evaluate_days) & (item_days < start)
+    recent = np.bincount(products[recent_items], weights=quantities[recent_items], minlength=product_count)
+    baseline = np.bincount(products[baseline_items], weights=quantities[baseline_items], minlength=product_count) / windows
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = (recent - baseline) / np.sqrt(baseline)
+        drops = 1 - recent / baseline
+    flagged = np.flatnonzero((baseline >= MIN_PRODUCT_UNITS) & (drops >= MIN_PRODUCT_DROP) & (scores <= -z_threshold))
+
+    findings = []
+    for code in flagged:
+        name = order_store.product_names[code]
+        findings.append(_finding(
+            "product_demand_drop",
+            "units_sold",
+            _day(start),
+            _day(end - 1),
+            int(recent[code]),
+            round(float(baseline[code]), 1),
+            scores[code],
+            f"Demanda de {name} caiu {drops[code]:.0%} nos últimos {evaluate_days} dias: {int(recent[code])} unidade(s) "
+            f"contra média de {baseline[code]:.1f} nas {windows} janela(s) anteriores (z={scores[code]:+.1f}).",
+            product=name,
+        ))
+    return findings
+
+
+def format_findings(findings: list) -> str:
+    """Achados em lista markdown, do mais grave para o menos grave."""
+    icons = {"high": "🔴", "medium": "🟠", "low": "🟡"}
+    return "\n".join(f"- {icons[finding['severity']]} {finding['message']}" for finding in findings)
@@ -0,0 +1,53 @@
+import asyncio
+import concurrent.futures
+import threading
+
+
+class BackgroundLoop:
+    """
+    Um event loop de vida longa numa thread daemon. Código síncrono (ex.: cada rerun do
+    Streamlit) submete corrotinas a ele em vez de criar um loop novo com `asyncio.run`,
+    então semáforos, chamadas em andamento e clientes do conector sobrevivem entre reruns.
+    """
+
+    def __init__(self, name: str = "agent-event-loop") -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        # O contexto (contextvars) do chamador segue para a tarefa, como no asyncio.run.
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout: float | None = None):
+        """Executa a corrotina no loop de fundo e bloqueia até o resultado."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, async_iterable):
+        """
+        Consome um iterador assíncrono a partir de código síncrono (ex.: `st.write_stream`),
+        entregando cada item assim que ele fica pronto no loop de fundo.
+        """
+        iterator = async_iterable.__aiter__()
+
+        async def next_item():
+            return await iterator.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield self.run(next_item())
+                except StopAsyncIteration:
+                    return
+        finally:
+            if hasattr(iterator, "aclose"):
+                self.run(iterator.aclose())
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
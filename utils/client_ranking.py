@@ -0,0 +1,130 @@
+import base64
+import bisect
+import heapq
+import json
+import re
+
+from utils.text_utils import normalize_text
+
+CLIENT_SORT_KEYS = ("valor_total_gasto", "numero_de_pedidos")
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 500
+
+
+_NEXT_PAGE_PATTERN = re.compile(r"\b(proxima|proximos|mais clientes|continua|continuar)\b")
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(sort_by: str, value, index: int, offset: int) -> str:
+    """Último cliente da página (valor, posição) e quantos já foram listados."""
+    raw = json.dumps([sort_by, value, index, offset]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple:
+    try:
+        cursor_sort_by, value, index, offset = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Cursor inválido.") from None
+    if not all(isinstance(field, (int, float)) for field in (value, index, offset)):
+        raise InvalidCursorError("Cursor inválido.")
+    if cursor_sort_by != sort_by:
+        raise InvalidCursorError("O cursor pertence a outra ordenação.")
+    return value, index, offset
+
+
+def clients_page_request(text: str, last_page: dict | None = None) -> dict:
+    """
+    Argumentos de `ClientTable.page` para um pedido como "/clients_metrics pedidos" ou
+    "próxima página": ordena por pedidos ou por valor gasto e, se for continuação, segue
+    do `next_cursor` de `last_page` (a página mostrada antes).
+    """
+    normalized = normalize_text(text)
+    sort_by = None
+    if re.search(r"\bpedidos?\b", normalized):
+        sort_by = "numero_de_pedidos"
+    elif re.search(r"\b(gasto|gastou|valor)\b", normalized):
+        sort_by = "valor_total_gasto"
+
+    if _NEXT_PAGE_PATTERN.search(normalized) and last_page and last_page.get("next_cursor"):
+        if sort_by in (None, last_page["sort_by"]):
+            return {"sort_by": last_page["sort_by"], "cursor": last_page["next_cursor"]}
+    return {"sort_by": sort_by or "valor_total_gasto", "cursor": None}
+
+
+class ClientTable:
+    """
+    Métricas por cliente (chave = `cliente.id`) em listas paralelas, na ordem em que cada
+    cliente apareceu. O top-K e a primeira página usam um heap (O(n log k)); as páginas
+    seguintes buscam o cursor por bisseção no ranking completo, ordenado uma vez por tabela.
+    """
+
+    def __init__(self, ids: list, names: list, orders: list, spent: list) -> None:
+        self.ids = ids
+        self.names = names
+        self.orders = orders
+        self.spent = spent
+        self._rankings = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, index: int) -> dict:
+        return {
+            "cliente_id": self.ids[index],
+            "nome": self.names[index],
+            "numero_de_pedidos": self.orders[index],
+            "valor_total_gasto": round(self.spent[index], 2),
+        }
+
+    def _values(self, sort_by: str) -> list:
+        if sort_by not in CLIENT_SORT_KEYS:
+            raise ValueError(f"Ordenação inválida: {sort_by!r}. Use uma de {CLIENT_SORT_KEYS}.")
+        return self.spent if sort_by == "valor_total_gasto" else self.orders
+
+    def _ranking(self, sort_by: str) -> list:
+        """Índices em ordem de ranking (valor decrescente, depois ordem de aparição), em cache."""
+        ranking = self._rankings.get(sort_by)
+        if ranking is None:
+            values = self._values(sort_by)
+            ranking = self._rankings[sort_by] = sorted(range(len(values)), key=lambda index: (-values[index], index))
+        return ranking
+
+    def top(self, k: int, sort_by: str = "valor_total_gasto") -> list:
+        values = self._values(sort_by)
+        # Desempate pela ordem de aparição, para o ranking ser estável entre páginas.
+        indexes = heapq.nlargest(k, range(len(values)), key=lambda index: (values[index], -index))
+        return [self.row(index) for index in indexes]
+
+    def page(self, sort_by: str = "valor_total_gasto", limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+        """
+        Uma página do ranking, a partir da posição `offset`. `next_cursor` (None na última
+        página) busca a seguinte: O(n log limit) na primeira página, O(log n + limit) depois.
+        """
+        values = self._values(sort_by)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        offset = 0
+        # Um a mais que o limite, só para saber se existe próxima página.
+        if cursor:
+            after_value, after_index, offset = decode_cursor(cursor, sort_by)
+            ranking = self._ranking(sort_by)
+            start = bisect.bisect_right(ranking, (-after_value, after_index), key=lambda index: (-values[index], index))
+            indexes = ranking[start:start + limit + 1]
+        else:
+            indexes = heapq.nlargest(limit + 1, range(len(values)), key=lambda index: (values[index], -index))
+        has_more = len(indexes) > limit
+        indexes = indexes[:limit]
+        next_cursor = None
+        if has_more:
+            last = indexes[-1]
+            next_cursor = encode_cursor(sort_by, values[last], last, offset + limit)
+        return {
+            "sort_by": sort_by,
+            "total_clients": len(values),
+            "offset": offset,
+            "clients": [self.row(index) for index in indexes],
+            "next_cursor": next_cursor,
+        }
@@ -0,0 +1,162 @@
+from collections import Counter
+from datetime import date
+
+import numpy as np
+
+from utils.metrics_aggregation import WEEKDAYS
+from utils.order_store import MISSING, OrderStore
+from utils.quantile_sketch import INV_LOG_GAMMA, MIN_VALUE, ZERO_KEY, LogHistogram, bucket_key
+
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+def _empty_result(restaurante: dict) -> dict:
+    """Métricas de um histórico vazio, com as chaves na ordem de `MetricsAggregator.result`."""
+    return {
+        "restaurant_name": restaurante.get("nome", "Nome não encontrado"),
+        "grand_total_sold": 0.0,
+        "avg_prep_today_seconds": 0,
+        "avg_prep_30d_seconds": 0,
+        "avg_prep_seconds": 0,
+        "avg_prep_time_by_day_seconds": {day: 0 for day in WEEKDAYS},
+        "prep_percentiles_seconds": {
+            "today": _percentiles(()),
+            "30d": _percentiles(()),
+            "overall": _percentiles(()),
+            "by_day": {day: _percentiles(()) for day in WEEKDAYS},
+        },
+        "sales_by_month": {},
+        "top_products": [],
+    }
+
+
+def _percentiles(keys) -> dict:
+    keys = np.asarray(keys, dtype="int64")
+    sketch = LogHistogram()
+    zero = keys == ZERO_KEY
+    if zero.any():
+        sketch.counts[ZERO_KEY] = int(zero.sum())
+        keys = keys[~zero]
+    if len(keys):
+        # Contagem por bucket com `bincount` (a faixa de buckets é pequena), sem um laço por valor.
+        first_key = int(keys.min())
+        counts = np.bincount(keys - first_key)
+        sketch.counts.update({first_key + offset: int(counts[offset]) for offset in np.flatnonzero(counts).tolist()})
+    return sketch.percentiles()
+
+
+def _sequential_sum(values: np.ndarray) -> float:
+    # Soma acumulada em ordem (não pairwise) para reproduzir exatamente o `+=` da referência.
+    return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
+
+def _column(values, dtype) -> np.ndarray:
+    """Coluna do `OrderStore` (array ou memoryview de snapshot) como ndarray, sem cópia."""
+    if not len(values):
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(values, dtype=dtype)
+
+
+def calculate_store_metrics(order_store: OrderStore, today: date | None = None) -> dict:
+    """
+    Backend colunar sobre as colunas do `OrderStore` (datas já em microssegundos, nomes
+    codificados): as mesmas métricas de `OrderStore.metrics`, com somas por grupo em numpy
+    (`bincount`, que soma na ordem dos pedidos) no lugar do laço por pedido. Com pedidos
+    irregulares, que só o caminho de referência sabe tratar, usa `OrderStore.metrics`.
+    """
+    if order_store.irregular:
+        return order_store.metrics(today)
+    today = today or date.today()
+    with order_store.reading():
+        return _store_metrics(order_store, today)
+
+
+def _store_metrics(order_store: OrderStore, today: date) -> dict:
+    result = _empty_result(order_store.restaurante)
+    totals = _column(order_store.totals, np.float64)
+    if not len(totals):
+        return result
+    ordered_at_us = _column(order_store.ordered_at_us, np.int64)
+    received_at_us = _column(order_store.received_at_us, np.int64)
+    dispatched_at_us = _column(order_store.dispatched_at_us, np.int64)
+    weekdays = _column(order_store.weekdays, np.int8).astype(np.intp)
+
+    result["grand_total_sold"] = round(_sequential_sum(totals), 2)
+
+    # Preparo: diferença exata em inteiros e uma única divisão, como `(envio - recebimento) / 1e6`.
+    has_prep = received_at_us != MISSING
+    prep_seconds = (dispatched_at_us[has_prep] - received_at_us[has_prep]) / 1_000_000
+    prep_weekdays = weekdays[has_prep]
+    day_numbers = ordered_at_us.astype("datetime64[us]").astype("datetime64[D]").astype(np.int64)
+    prep_days = day_numbers[has_prep]
+    prep_keys = _bucket_keys(prep_seconds)
+    percentiles = result["prep_percentiles_seconds"]
+
+    if len(prep_seconds):
+        result["avg_prep_seconds"] = int(_sequential_sum(prep_seconds) / len(prep_seconds))
+        percentiles["overall"] = _percentiles(prep_keys)
+        day_sums = np.bincount(prep_weekdays, weights=prep_seconds, minlength=len(WEEKDAYS))
+        day_counts = np.bincount(prep_weekdays, minlength=len(WEEKDAYS))
+        for code, day in enumerate(WEEKDAYS):
+            if day_counts[code] > 0:
+                result["avg_prep_time_by_day_seconds"][day] = int(day_sums[code] / day_counts[code])
+                percentiles["by_day"][day] = _percentiles(prep_keys[prep_weekdays == code])
+
+        # Janelas somadas dia a dia a partir dos totais diários, como `MetricsAggregator.window_prep`.
+        first_day = int(prep_days.min())
+        daily_sums = np.bincount(prep_days - first_day, weights=prep_seconds)
+        daily_counts = np.bincount(prep_days - first_day)
+        today_number = (today - _EPOCH_DATE).days
+        for key, start, end in (("today", today_number, today_number + 1), ("30d", today_number - 30, today_number)):
+            window = slice(max(start - first_day, 0), max(end - first_day, 0))
+            count = int(daily_counts[window].sum())
+            if count:
+                window_seconds = 0.0
+                for value in daily_sums[window].tolist():
+                    window_seconds += value
+                result[f"avg_prep_{key}_seconds"] = int(window_seconds / count)
+                percentiles[key] = _percentiles(prep_keys[(prep_days >= start) & (prep_days < end)])
+
+    # Meses e dias da semana na ordem em que aparecem pela primeira vez, como nos dicts da referência.
+    months = ordered_at_us.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64)
+    first_month = int(months.min())
+    month_offsets = months - first_month
+    month_totals = np.bincount(month_offsets, weights=totals)
+    month_pairs = month_offsets * len(WEEKDAYS) + weekdays
+    pair_counts = np.bincount(month_pairs)
+    first_rows = np.full(len(pair_counts), len(totals), dtype=np.int64)
+    np.minimum.at(first_rows, month_pairs, np.arange(len(totals), dtype=np.int64))
+    sales_by_month = result["sales_by_month"]
+    for pair in np.argsort(first_rows, kind="stable")[: int(np.count_nonzero(pair_counts))].tolist():
+        month_offset, weekday = divmod(pair, len(WEEKDAYS))
+        month = first_month + month_offset
+        label = f"{1970 + month // 12:04d}-{month % 12 + 1:02d}"
+        month_data = sales_by_month.get(label)
+        if month_data is None:
+            month_data = sales_by_month[label] = {"total_value_sold": round(float(month_totals[month_offset]), 2), "sales_by_day": Counter()}
+        month_data["sales_by_day"][WEEKDAYS[weekday]] = int(pair_counts[pair])
+
+    # Códigos de produto seguem a ordem da primeira aparição: o desempate estável é o do `most_common`.
+    item_products = _column(order_store.item_products, np.int32)
+    if len(item_products):
+        product_count = len(order_store.product_names)
+        quantities = np.zeros(product_count, dtype=np.int64)
+        np.add.at(quantities, item_products, _column(order_store.item_quantities, np.int64))
+        seen = np.flatnonzero(np.bincount(item_products, minlength=product_count))
+        top = seen[np.argsort(-quantities[seen], kind="stable")[:3]]
+        result["top_products"] = [{"name": order_store.product_names[code], "sold": int(quantities[code])} for code in top.tolist()]
+    return result
+
+
+def _bucket_keys(values: np.ndarray) -> np.ndarray:
+    """`bucket_key` vetorizado; valores a um triz da borda do bucket são refeitos com `math.log`."""
+    keys = np.full(len(values), ZERO_KEY, dtype=np.int64)
+    positive = values >= MIN_VALUE
+    scaled = np.log(values[positive]) * INV_LOG_GAMMA
+    keys[positive] = np.ceil(scaled).astype(np.int64)
+    # `np.log` e `math.log` podem diferir no último bit: só importa perto de um inteiro.
+    near_edge = np.flatnonzero(np.abs(scaled - np.round(scaled)) < 1e-9)
+    if len(near_edge):
+        positions = np.flatnonzero(positive)[near_edge]
+        keys[positions] = [bucket_key(value) for value in values[positions].tolist()]
+    return keys
@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from utils.tracing import tracer
+
+
+class DatasetCache:
+    """
+    Cache compartilhado dos pedidos: o arquivo só é relido e o JSON só é parseado
+    novamente quando o conteúdo muda (caminho + mtime + tamanho, ou hash do texto).
+    """
+
+    def __init__(self, max_parsed: int = 4) -> None:
+        self._lock = threading.Lock()
+        self._files = {}
+        self._parsed = OrderedDict()
+        self._max_parsed = max_parsed
+
+    @staticmethod
+    def file_key(path: str) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    def read_text(self, path: str) -> str:
+        """Retorna o conteúdo do arquivo, reaproveitando a mesma string enquanto ele não mudar."""
+        with tracer.span("dataset.read_text") as span:
+            key = self.file_key(path)
+            with self._lock:
+                cached = self._files.get(key[0])
+                if cached is not None and cached[0] == key:
+                    span.set(cache_hit=True)
+                    return cached[1]
+
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            span.set(cache_hit=False, chars=len(text))
+
+            with self._lock:
+                self._files[key[0]] = (key, text)
+            return text
+
+    def _entry(self, pedidos_json_str: str) -> tuple:
+        with tracer.span("dataset.parse") as span:
+            key = (len(pedidos_json_str), hash(pedidos_json_str))
+            with self._lock:
+                cached = self._parsed.get(key)
+                if cached is not None and (cached[0] is pedidos_json_str or cached[0] == pedidos_json_str):
+                    self._parsed.move_to_end(key)
+                    span.set(cache_hit=True)
+                    return cached
+
+            pedidos_data = json.loads(pedidos_json_str)
+            span.set(cache_hit=False, chars=len(pedidos_json_str))
+
+            entry = (pedidos_json_str, pedidos_data, {})
+            with self._lock:
+                self._parsed[key] = entry
+                self._parsed.move_to_end(key)
+                while len(self._parsed) > self._max_parsed:
+                    self._parsed.popitem(last=False)
+            return entry
+
+    def parse(self, pedidos_json_str: str) -> dict:
+        """
+        Faz o json.loads uma única vez por conteúdo. O dict retornado é compartilhado
+        entre as chamadas e não deve ser alterado.
+        """
+        return self._entry(pedidos_json_str)[1]
+
+    def derive(self, pedidos_json_str: str, name: str, factory):
+        """
+        Estrutura derivada dos pedidos parseados (ex.: o `OrderStore`), montada com
+        `factory(pedidos_data)` uma vez por conteúdo e descartada junto com o parse.
+        """
+        _, pedidos_data, derived = self._entry(pedidos_json_str)
+        with self._lock:
+            if name in derived:
+                return derived[name]
+        value = factory(pedidos_data)
+        with self._lock:
+            return derived.setdefault(name, value)
+
+    def load(self, path: str) -> dict:
+        return self.parse(self.read_text(path))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files.clear()
+            self._parsed.clear()
+
+
+dataset_cache = DatasetCache()
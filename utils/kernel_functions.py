@@ -0,0 +1,30 @@
+_PENDING_ATTR = "__pending_kernel_function__"
+
+
+def kernel_function(func=None, name: str | None = None, description: str | None = None):
+    """
+    Mesmo uso do `kernel_function` do Semantic Kernel, mas sem importá-lo (o import custa
+    segundos): só guarda nome e descrição na função. `register_kernel_functions` aplica o
+    decorator real quando o plugin for de fato registrado num Kernel.
+    """
+
+    def decorator(func):
+        setattr(func, _PENDING_ATTR, {"name": name, "description": description})
+        return func
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def register_kernel_functions(plugin):
+    """Aplica o `kernel_function` real nos métodos marcados do plugin (classe ou instância)."""
+    from semantic_kernel.functions import kernel_function as sk_kernel_function
+
+    cls = plugin if isinstance(plugin, type) else type(plugin)
+    for klass in cls.__mro__:
+        for value in vars(klass).values():
+            options = getattr(value, _PENDING_ATTR, None)
+            if options is not None and not getattr(value, "__kernel_function__", False):
+                sk_kernel_function(value, **options)
+    return plugin
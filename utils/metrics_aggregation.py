@@ -0,0 +1,229 @@
+from datetime import datetime, timedelta, date
+from collections import Counter
+
+from utils.client_ranking import ClientTable
+from utils.quantile_sketch import LogHistogram, merged
+
+WEEKDAYS = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo"]
+
+
+class MetricsAggregator:
+    """
+    Acumula as métricas gerais pedido a pedido, sem precisar da lista completa em memória.
+    """
+
+    def __init__(self) -> None:
+        self.restaurant_name = "Nome não encontrado"
+
+        self.overall_prep_seconds = 0.0
+        self.overall_orders_count = 0
+        # Buckets diários de preparo: as janelas "hoje" e "últimos 30 dias" saem deles
+        # na hora do resultado, então o estado não depende da data em que foi montado.
+        self.prep_by_date = {}
+        # Sketches de quantis do preparo (geral, por dia da semana e por data), no mesmo
+        # ponto em que as somas são atualizadas; as janelas combinam os sketches diários.
+        self.prep_sketch = LogHistogram()
+        self.prep_sketch_by_day = { day: LogHistogram() for day in WEEKDAYS }
+        self.prep_sketch_by_date = {}
+
+        self.prep_time_by_day = { day: {'total_seconds': 0.0, 'count': 0} for day in WEEKDAYS }
+        self.grand_total_sold = 0.0
+        self.sales_by_month = {}
+        self.product_counter = Counter()
+
+    def set_restaurant(self, restaurante: dict) -> None:
+        self.restaurant_name = restaurante.get("nome", "Nome não encontrado")
+
+    def add(self, pedido: dict) -> None:
+        self.grand_total_sold += pedido["total"]
+        try:
+            pedido_dt = datetime.fromisoformat(pedido["data_pedido"])
+            pedido_date = pedido_dt.date()
+
+            if pedido.get("data_recebimento") and pedido.get("data_envio"):
+                recebimento_dt = datetime.fromisoformat(pedido["data_recebimento"])
+                envio_dt = datetime.fromisoformat(pedido["data_envio"])
+                prep_time_seconds = (envio_dt - recebimento_dt).total_seconds()
+
+                self.overall_prep_seconds += prep_time_seconds
+                self.overall_orders_count += 1
+                self.prep_sketch.add(prep_time_seconds)
+
+                self.prep_time_by_day[pedido["dia_semana"]]['total_seconds'] += prep_time_seconds
+                self.prep_time_by_day[pedido["dia_semana"]]['count'] += 1
+                self.prep_sketch_by_day[pedido["dia_semana"]].add(prep_time_seconds)
+
+                bucket = self.prep_by_date.get(pedido_date)
+                if bucket is None:
+                    bucket = self.prep_by_date[pedido_date] = [0.0, 0]
+                bucket[0] += prep_time_seconds
+                bucket[1] += 1
+                sketch = self.prep_sketch_by_date.get(pedido_date)
+                if sketch is None:
+                    sketch = self.prep_sketch_by_date[pedido_date] = LogHistogram()
+                sketch.add(prep_time_seconds)
+
+            month_year = pedido_dt.strftime("%Y-%m")
+            if month_year not in self.sales_by_month:
+                self.sales_by_month[month_year] = {"total_value_sold": 0.0, "sales_by_day": Counter()}
+            self.sales_by_month[month_year]["total_value_sold"] += pedido["total"]
+            self.sales_by_month[month_year]["sales_by_day"][pedido["dia_semana"]] += 1
+            for item in pedido.get("itens", []):
+                self.product_counter[item["nome"]] += item["quantidade"]
+
+        except (ValueError, TypeError, KeyError):
+            pass
+
+    def add_many(self, pedidos) -> None:
+        for pedido in pedidos:
+            self.add(pedido)
+
+    def merge(self, other: "MetricsAggregator") -> None:
+        """Incorpora as somas de outro agregador (ex.: outro shard do mesmo restaurante)."""
+        self.grand_total_sold += other.grand_total_sold
+        self.overall_prep_seconds += other.overall_prep_seconds
+        self.overall_orders_count += other.overall_orders_count
+
+        for day, bucket in other.prep_by_date.items():
+            own = self.prep_by_date.get(day)
+            if own is None:
+                self.prep_by_date[day] = list(bucket)
+            else:
+                own[0] += bucket[0]
+                own[1] += bucket[1]
+
+        for day, data in other.prep_time_by_day.items():
+            self.prep_time_by_day[day]['total_seconds'] += data['total_seconds']
+            self.prep_time_by_day[day]['count'] += data['count']
+
+        self.prep_sketch.merge(other.prep_sketch)
+        for day, sketch in other.prep_sketch_by_day.items():
+            self.prep_sketch_by_day[day].merge(sketch)
+        for day, sketch in other.prep_sketch_by_date.items():
+            own = self.prep_sketch_by_date.get(day)
+            if own is None:
+                own = self.prep_sketch_by_date[day] = LogHistogram()
+            own.merge(sketch)
+
+        for month_year, month_data in other.sales_by_month.items():
+            if month_year not in self.sales_by_month:
+                self.sales_by_month[month_year] = {"total_value_sold": 0.0, "sales_by_day": Counter()}
+            self.sales_by_month[month_year]["total_value_sold"] += month_data["total_value_sold"]
+            self.sales_by_month[month_year]["sales_by_day"].update(month_data["sales_by_day"])
+
+        self.product_counter.update(other.product_counter)
+
+    def window_prep(self, start: date, end: date) -> tuple[float, int]:
+        """Soma e contagem de preparo dos dias em [start, end), direto dos buckets diários."""
+        total_seconds = 0.0
+        count = 0
+        day = start
+        while day < end:
+            bucket = self.prep_by_date.get(day)
+            if bucket is not None:
+                total_seconds += bucket[0]
+                count += bucket[1]
+            day += timedelta(days=1)
+        return total_seconds, count
+
+    def window_sketch(self, start: date, end: date) -> LogHistogram:
+        """Sketch de preparo dos dias em [start, end), combinando os sketches diários."""
+        sketches = []
+        day = start
+        while day < end:
+            sketch = self.prep_sketch_by_date.get(day)
+            if sketch is not None:
+                sketches.append(sketch)
+            day += timedelta(days=1)
+        return merged(sketches)
+
+    def prep_percentiles(self, today: date) -> dict:
+        return {
+            "today": self.window_sketch(today, today + timedelta(days=1)).percentiles(),
+            "30d": self.window_sketch(today - timedelta(days=30), today).percentiles(),
+            "overall": self.prep_sketch.percentiles(),
+            "by_day": { day: sketch.percentiles() for day, sketch in self.prep_sketch_by_day.items() },
+        }
+
+    def result(self, today: date | None = None) -> dict:
+        today = today or date.today()
+        today_prep_seconds, today_orders_count = self.window_prep(today, today + timedelta(days=1))
+        last_30d_prep_seconds, last_30d_orders_count = self.window_prep(today - timedelta(days=30), today)
+
+        avg_prep_today_seconds = int(today_prep_seconds / today_orders_count) if today_orders_count > 0 else 0
+        avg_prep_last_30d_seconds = int(last_30d_prep_seconds / last_30d_orders_count) if last_30d_orders_count > 0 else 0
+        avg_prep_overall_seconds = int(self.overall_prep_seconds / self.overall_orders_count) if self.overall_orders_count > 0 else 0
+
+        avg_prep_time_by_day_seconds = { day: int(data['total_seconds'] / data['count']) if data['count'] > 0 else 0 for day, data in self.prep_time_by_day.items() }
+        sales_by_month = {
+            month: {"total_value_sold": round(month_data["total_value_sold"], 2), "sales_by_day": Counter(month_data["sales_by_day"])}
+            for month, month_data in self.sales_by_month.items()
+        }
+        top_products = [ {"name": name, "sold": count} for name, count in self.product_counter.most_common(3) ]
+
+        return {
+            "restaurant_name": self.restaurant_name,
+            "grand_total_sold": round(self.grand_total_sold, 2),
+            "avg_prep_today_seconds": avg_prep_today_seconds,
+            "avg_prep_30d_seconds": avg_prep_last_30d_seconds,
+            "avg_prep_seconds": avg_prep_overall_seconds,
+            "avg_prep_time_by_day_seconds": avg_prep_time_by_day_seconds,
+            "prep_percentiles_seconds": self.prep_percentiles(today),
+            "sales_by_month": sales_by_month,
+            "top_products": top_products,
+        }
+
+
+class ClientsAggregator:
+    """
+    Acumula número de pedidos e total gasto por cliente, pedido a pedido. A chave é o
+    `cliente.id` (o nome só quando não há id), então homônimos não se misturam; o total
+    é arredondado apenas na saída.
+    """
+
+    def __init__(self) -> None:
+        self._index = {}
+        self.ids = []
+        self.names = []
+        self.orders = []
+        self.spent = []
+        self._table = None
+
+    @classmethod
+    def from_table(cls, table: ClientTable) -> "ClientsAggregator":
+        aggregator = cls()
+        aggregator.ids = list(table.ids)
+        aggregator.names = list(table.names)
+        aggregator.orders = list(table.orders)
+        aggregator.spent = list(table.spent)
+        aggregator._index = {client_id: index for index, client_id in enumerate(aggregator.ids)}
+        return aggregator
+
+    def add(self, pedido: dict) -> None:
+        cliente = pedido["cliente"]
+        client_name = cliente["nome"]
+        order_total = pedido["total"]
+        client_id = cliente.get("id")
+        if client_id is None:
+            client_id = client_name
+
+        index = self._index.get(client_id)
+        if index is None:
+            index = self._index[client_id] = len(self.ids)
+            self.ids.append(client_id)
+            self.names.append(client_name)
+            self.orders.append(0)
+            self.spent.append(0.0)
+        self.orders[index] += 1
+        self.spent[index] += order_total
+        self._table = None
+
+    def add_many(self, pedidos) -> None:
+        for pedido in pedidos:
+            self.add(pedido)
+
+    def table(self) -> ClientTable:
+        """Visão do estado atual (compartilha as listas), em cache até o próximo pedido."""
+        if self._table is None:
+            self._table = ClientTable(self.ids, self.names, self.orders, self.spent)
+        return self._table
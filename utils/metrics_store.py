@@ -0,0 +1,86 @@
+import threading
+from datetime import date
+
+from utils.client_ranking import DEFAULT_PAGE_SIZE
+from utils.metrics_aggregation import ClientsAggregator, MetricsAggregator
+
+
+class IncrementalMetricsStore:
+    """
+    Estado vivo das métricas: novos pedidos atualizam as somas em O(1) (por item) e
+    `metrics()`/`clients_page()` respondem do estado, sem recalcular o histórico.
+
+    As métricas gerais ficam em cache até chegar um novo pedido ou virar o dia; o dict
+    retornado é compartilhado e não deve ser alterado.
+    """
+
+    def __init__(self, restaurante: dict | None = None) -> None:
+        self._lock = threading.Lock()
+        self._metrics = MetricsAggregator()
+        self._clients = ClientsAggregator()
+        if restaurante:
+            self._metrics.set_restaurant(restaurante)
+        self._version = 0
+        self._metrics_cache = None
+
+    @classmethod
+    def from_pedidos_data(cls, pedidos_data: dict) -> "IncrementalMetricsStore":
+        store = cls(pedidos_data.get("restaurante", {}))
+        store.add_orders(pedidos_data.get("pedidos", []))
+        return store
+
+    @classmethod
+    def from_order_store(cls, order_store) -> "IncrementalMetricsStore":
+        """Parte das somas já calculadas de um `OrderStore`, sem reprocessar os pedidos."""
+        store = cls(order_store.restaurante)
+        store._metrics.merge(order_store.metrics_aggregator())
+        store._clients = ClientsAggregator.from_table(order_store.client_table())
+        store._version = len(order_store)
+        return store
+
+    @property
+    def version(self) -> int:
+        """Número de pedidos já incorporados ao estado."""
+        return self._version
+
+    def set_restaurant(self, restaurante: dict) -> None:
+        with self._lock:
+            self._metrics.set_restaurant(restaurante)
+            self._metrics_cache = None
+
+    def add_order(self, pedido: dict) -> None:
+        with self._lock:
+            self._add(pedido)
+
+    def add_orders(self, pedidos) -> int:
+        added = 0
+        with self._lock:
+            for pedido in pedidos:
+                self._add(pedido)
+                added += 1
+        return added
+
+    def _add(self, pedido: dict) -> None:
+        self._metrics.add(pedido)
+        self._clients.add(pedido)
+        self._version += 1
+        self._metrics_cache = None
+
+    def metrics(self, today: date | None = None) -> dict:
+        today = today or date.today()
+        cached = self._metrics_cache
+        if cached is not None and cached[0] == today:
+            return cached[1]
+        with self._lock:
+            result = self._metrics.result(today)
+            self._metrics_cache = (today, result)
+        return result
+
+    def clients_page(self, sort_by: str = "valor_total_gasto", limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+        """Uma página do ranking de clientes (ver `ClientTable.page`)."""
+        with self._lock:
+            return self._clients.table().page(sort_by, limit, cursor)
+
+    def top_clients(self, k: int, sort_by: str = "valor_total_gasto") -> list:
+        with self._lock:
+            return self._clients.table().top(k, sort_by)
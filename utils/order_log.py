@@ -0,0 +1,292 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+from datetime import datetime
+
+from utils.metrics_store import IncrementalMetricsStore
+from utils.order_snapshot import load_snapshot, read_header, write_snapshot
+from utils.order_store import OrderStore
+from utils.order_stream import OrderStream, is_restaurant_header, write_ndjson
+from utils.tracing import tracer
+
+CHECKPOINT_SUFFIX = ".offset"
+SNAPSHOT_SUFFIX = ".snapshot"
+READ_CHUNK_SIZE = 1 << 20
+# Pedidos serializados por escrita no `append`: a entrada é consumida em lotes, sem ir toda para a memória.
+APPEND_BATCH_SIZE = 10_000
+# Pedidos lidos do log desde o último checkpoint que disparam um novo (snapshot + offset).
+CHECKPOINT_EVERY = 50_000
+# Bytes finais antes do offset conferidos ao retomar: detectam um log reescrito no lugar.
+TAIL_HASH_BYTES = 4096
+
+
+class OrderLog:
+    """
+    Log append-only dos pedidos em NDJSON: uma linha `{"restaurante": {...}}` de cabeçalho e
+    um pedido por linha, o mesmo formato que o `OrderStream` lê. Pedidos só são acrescentados
+    no fim, então quem já leu até um offset (em bytes) só precisa ler o que veio depois.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.invalid_lines = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def version(self) -> list | None:
+        """[caminho, inode, tamanho]: muda a cada append e quando o arquivo é substituído."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return [os.path.abspath(self.path), stat.st_ino, stat.st_size]
+
+    def create(self, restaurante: dict) -> None:
+        """Cria o log só com o cabeçalho do restaurante (se ainda não existir)."""
+        with self._lock:
+            if not self.exists():
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.write(json.dumps({"restaurante": restaurante}, ensure_ascii=False) + "\n")
+
+    def append(self, pedidos, batch_size: int = APPEND_BATCH_SIZE) -> int:
+        """
+        Acrescenta os pedidos no fim do log, em lotes de linhas inteiras, com um único fsync
+        no fim. `pedidos` pode ser um gerador (ex.: `OrderStream`). Retorna quantos foram gravados.
+        """
+        pedidos = iter(pedidos)
+        total = 0
+        with self._lock, open(self.path, "ab") as f:
+            while True:
+                lines = [json.dumps(pedido, ensure_ascii=False) + "\n" for pedido in itertools.islice(pedidos, batch_size)]
+                if not lines:
+                    break
+                f.write("".join(lines).encode("utf-8"))
+                total += len(lines)
+            if total:
+                f.flush()
+                os.fsync(f.fileno())
+        return total
+
+    def batches(self, offset: int = 0, chunk_size: int = READ_CHUNK_SIZE):
+        """
+        Registros a partir de `offset`, em lotes: (registros, offset logo após o último).
+        Uma última linha ainda sem `\\n` (escrita em andamento) fica para a próxima leitura;
+        linhas inválidas são puladas e contadas em `invalid_lines`.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            pending = b""
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                data = pending + chunk
+                end = data.rfind(b"\n") + 1
+                pending = data[end:]
+                if not end:
+                    continue
+                records = []
+                for line in data[:end].splitlines():
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        self.invalid_lines += 1
+                offset += end
+                yield records, offset
+
+    def tail_hash(self, offset: int) -> str:
+        start = max(0, offset - TAIL_HASH_BYTES)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+class OrderFeed:
+    """
+    `OrderStore` e `IncrementalMetricsStore` alimentados pelo log: `poll()` lê só os bytes
+    acrescentados desde o último offset e entrega só os pedidos novos às métricas, então o
+    custo de atualizar cresce com os pedidos novos, não com o histórico.
+
+    Ao abrir, retoma do checkpoint (`<log>.snapshot` mapeado em memória + `<log>.offset`)
+    quando ele confere com o log; senão lê o log inteiro e grava um checkpoint novo.
+    """
+
+    def __init__(self, log: OrderLog, checkpoint_every: int = CHECKPOINT_EVERY) -> None:
+        self.log = log
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_path = log.path + CHECKPOINT_SUFFIX
+        self.snapshot_path = log.path + SNAPSHOT_SUFFIX
+        self._lock = threading.Lock()
+        self.order_store = None
+        self.metrics_store = None
+        self.offset = 0
+        self._inode = None
+        self._checkpoint_orders = 0
+
+    @classmethod
+    def open(cls, log_path: str, checkpoint_every: int = CHECKPOINT_EVERY) -> "OrderFeed":
+        feed = cls(OrderLog(log_path), checkpoint_every)
+        feed.load()
+        return feed
+
+    def version(self) -> list:
+        """[inode, offset] do que já foi incorporado."""
+        return [self._inode, self.offset]
+
+    def _read_checkpoint(self) -> dict | None:
+        """O checkpoint, se ele ainda descreve um prefixo do log atual (e o snapshot confere)."""
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            stat = os.stat(self.log.path)
+            if checkpoint["inode"] != stat.st_ino or checkpoint["offset"] > stat.st_size:
+                return None
+            if checkpoint["tail_hash"] != self.log.tail_hash(checkpoint["offset"]):
+                return None
+            if read_header(self.snapshot_path)["orders"] != checkpoint["orders"]:
+                return None
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        return checkpoint
+
+    def load(self) -> None:
+        """(Re)monta o estado: do checkpoint, se válido, mais o que veio depois dele no log."""
+        with self._lock, tracer.span("order_log.load") as span:
+            checkpoint = self._read_checkpoint()
+            if checkpoint is not None:
+                order_store = load_snapshot(self.snapshot_path)
+                offset = checkpoint["offset"]
+            else:
+                order_store = OrderStore()
+                offset = 0
+            inode = os.stat(self.log.path).st_ino
+            checkpoint_orders = len(order_store)
+            # Na carga, as métricas saem de uma vez das colunas (mais rápido que pedido a pedido).
+            added, offset = self._tail(order_store, None, offset)
+            metrics_store = IncrementalMetricsStore.from_order_store(order_store)
+            # Tudo montado antes de publicar: quem lê sem o lock vê o estado antigo ou o novo, inteiros.
+            self.order_store, self.metrics_store, self.offset, self._inode, self._checkpoint_orders = (
+                order_store, metrics_store, offset, inode, checkpoint_orders
+            )
+            span.set(from_checkpoint=checkpoint is not None, orders=len(order_store), tailed=added)
+            if checkpoint is None or added >= self.checkpoint_every:
+                self._write_checkpoint()
+
+    def _tail(self, order_store: OrderStore, metrics_store: IncrementalMetricsStore | None, offset: int) -> tuple[int, int]:
+        """Acrescenta aos stores o que há no log a partir de `offset`; retorna (pedidos, novo offset)."""
+        added = 0
+        for records, end_offset in self.log.batches(offset):
+            pedidos = []
+            for record in records:
+                if is_restaurant_header(record):
+                    restaurante = record["restaurante"] or {}
+                    order_store.restaurante = restaurante
+                    if metrics_store is not None:
+                        metrics_store.set_restaurant(restaurante)
+                else:
+                    pedidos.append(record)
+            order_store.extend(pedidos)
+            if metrics_store is not None:
+                metrics_store.add_orders(pedidos)
+            offset = end_offset
+            added += len(pedidos)
+        return added, offset
+
+    def poll(self) -> int:
+        """
+        Incorpora os pedidos acrescentados ao log desde a última leitura e retorna quantos
+        foram. Se o log foi substituído ou truncado, remonta o estado do zero.
+        """
+        try:
+            stat = os.stat(self.log.path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != self._inode or stat.st_size < self.offset:
+            self.load()
+            return len(self.order_store)
+        if stat.st_size == self.offset:
+            return 0
+        with self._lock, tracer.span("order_log.poll") as span:
+            added, self.offset = self._tail(self.order_store, self.metrics_store, self.offset)
+            span.set(orders=added, offset=self.offset)
+            if len(self.order_store) - self._checkpoint_orders >= self.checkpoint_every:
+                self._write_checkpoint()
+        return added
+
+    def checkpoint(self) -> dict:
+        with self._lock:
+            return self._write_checkpoint()
+
+    def _write_checkpoint(self) -> dict:
+        """Snapshot do store e, depois dele, o offset que ele cobre (os dois com troca atômica)."""
+        with tracer.span("order_log.checkpoint", orders=len(self.order_store)):
+            write_snapshot(self.order_store, self.snapshot_path)
+            checkpoint = {
+                "log": os.path.abspath(self.log.path),
+                "inode": self._inode,
+                "offset": self.offset,
+                "orders": len(self.order_store),
+                "tail_hash": self.log.tail_hash(self.offset),
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            tmp_path = f"{self.checkpoint_path}.tmp{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_path, self.checkpoint_path)
+            self._checkpoint_orders = len(self.order_store)
+            return checkpoint
+
+
+def import_legacy(json_path: str, log_path: str) -> int:
+    """Cria o log a partir do `pedidos.json` legado (ou de outro NDJSON). Retorna o número de pedidos."""
+    tmp_path = f"{log_path}.tmp{os.getpid()}"
+    count = write_ndjson(json_path, tmp_path)
+    # Troca atômica: um novo inode, então quem acompanha o log remonta o estado do zero.
+    os.replace(tmp_path, log_path)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    from config import ORDER_LOG_PATH
+
+    parser = argparse.ArgumentParser(description="Log append-only de pedidos (NDJSON) com checkpoint de offset.")
+    parser.add_argument("--log", default=ORDER_LOG_PATH, help=f"caminho do log (padrão: {ORDER_LOG_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="cria o log a partir do JSON legado")
+    import_parser.add_argument("source", help="pedidos.json legado (ou NDJSON)")
+    import_parser.add_argument("--force", action="store_true", help="substitui um log existente")
+    append_parser = commands.add_parser("append", help="acrescenta pedidos de outro arquivo ao log")
+    append_parser.add_argument("source", help="arquivo com os pedidos novos (JSON legado ou NDJSON)")
+    commands.add_parser("checkpoint", help="grava snapshot + offset para retomar o log sem relê-lo")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "import":
+        if os.path.exists(args.log) and not args.force:
+            print(f"{args.log} já existe; use --force para substituí-lo.")
+            sys.exit(1)
+        total = import_legacy(args.source, args.log)
+        OrderFeed.open(args.log, checkpoint_every=1)
+        print(f"{total} pedido(s) importados para {args.log}")
+    elif args.command == "append":
+        log = OrderLog(args.log)
+        if not log.exists():
+            # Sem log ainda: a conversão em streaming já grava o cabeçalho do restaurante.
+            total = import_legacy(args.source, args.log)
+        else:
+            total = log.append(OrderStream(args.source))
+        print(f"{total} pedido(s) acrescentados a {args.log}")
+    else:
+        checkpoint = OrderFeed.open(args.log).checkpoint()
+        print(f"Checkpoint: {checkpoint['orders']} pedido(s) até o byte {checkpoint['offset']} de {args.log}")
+    print(f"({time.perf_counter() - started:.1f}s)")
@@ -0,0 +1,156 @@
+import json
+import mmap
+import os
+import struct
+import sys
+
+from utils.order_store import COLUMNS, OrderStore
+
+MAGIC = b"PEDSNAP\x02"
+SNAPSHOT_SUFFIX = ".snapshot"
+_HEADER_SIZE = struct.Struct("<Q")
+_ALIGNMENT = 8
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def snapshot_path_for(pedidos_path: str) -> str:
+    """`data/pedidos.json` -> `data/pedidos.snapshot`."""
+    return os.path.splitext(pedidos_path)[0] + SNAPSHOT_SUFFIX
+
+
+def write_snapshot(order_store: OrderStore, snapshot_path: str, source_path: str | None = None) -> str:
+    """
+    Grava o store num arquivo binário colunar: cabeçalho JSON (restaurante, dicionários de
+    clientes e produtos, pedidos irregulares, posição de cada coluna) seguido das colunas de largura fixa,
+    alinhadas em 8 bytes. A troca do arquivo é atômica, então leitores nunca veem um snapshot
+    pela metade.
+    """
+    columns = order_store.columns()
+    layout = {}
+    offset = 0
+    for name, typecode in COLUMNS.items():
+        column = columns[name]
+        layout[name] = {"typecode": typecode, "offset": offset, "count": len(column)}
+        offset = _aligned(offset + len(column) * column.itemsize)
+
+    source = None
+    if source_path is not None:
+        stat = os.stat(source_path)
+        source = {"path": os.path.abspath(source_path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    header = json.dumps({
+        "byteorder": sys.byteorder,
+        "orders": len(order_store),
+        "restaurante": order_store.restaurante,
+        "client_ids": order_store.client_ids,
+        "client_names": order_store.client_names,
+        "product_names": order_store.product_names,
+        "irregular": [[row, pedido] for row, pedido in order_store.irregular.items()],
+        "columns": layout,
+        "source": source,
+    }, ensure_ascii=False).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + _HEADER_SIZE.size + len(header))
+
+    tmp_path = f"{snapshot_path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_SIZE.pack(len(header)))
+        f.write(header)
+        for name in COLUMNS:
+            f.write(b"\0" * (data_start + layout[name]["offset"] - f.tell()))
+            f.write(columns[name])
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def read_header(snapshot_path: str) -> dict:
+    with open(snapshot_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{snapshot_path} não é um snapshot de pedidos.")
+        raw_size = f.read(_HEADER_SIZE.size)
+        if len(raw_size) != _HEADER_SIZE.size:
+            raise ValueError(f"{snapshot_path} está truncado.")
+        (header_size,) = _HEADER_SIZE.unpack(raw_size)
+        raw_header = f.read(header_size)
+        if len(raw_header) != header_size:
+            raise ValueError(f"{snapshot_path} está truncado.")
+        header = json.loads(raw_header)
+    header["data_start"] = _aligned(len(MAGIC) + _HEADER_SIZE.size + header_size)
+    return header
+
+
+def load_snapshot(snapshot_path: str) -> OrderStore:
+    """
+    Mapeia o snapshot em memória (somente leitura) e devolve um `OrderStore` cujas colunas
+    são memoryviews sobre o mapeamento: nada é copiado nem parseado, e processos diferentes
+    lendo o mesmo arquivo compartilham o page cache do sistema.
+    """
+    header = read_header(snapshot_path)
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"Snapshot gravado em {header['byteorder']} endian; gere-o novamente nesta máquina.")
+
+    with open(snapshot_path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapping)
+    columns = {}
+    for name, spec in header["columns"].items():
+        start = header["data_start"] + spec["offset"]
+        itemsize = struct.calcsize(spec["typecode"])
+        if start + spec["count"] * itemsize > len(mapping):
+            raise ValueError(f"{snapshot_path} está truncado (coluna {name}).")
+        columns[name] = view[start:start + spec["count"] * itemsize].cast(spec["typecode"])
+
+    store = OrderStore.from_columns(
+        header["restaurante"],
+        columns,
+        header["client_ids"],
+        header["client_names"],
+        header["product_names"],
+        {row: pedido for row, pedido in header["irregular"]},
+    )
+    # As memoryviews dependem do mapeamento; ele vive enquanto o store viver.
+    store.mapping = mapping
+    return store
+
+
+def is_snapshot_fresh(snapshot_path: str, source_path: str) -> bool:
+    """O snapshot existe e foi gerado a partir da versão atual de `source_path`."""
+    if not os.path.exists(snapshot_path):
+        return False
+    try:
+        source = read_header(snapshot_path).get("source")
+    except (ValueError, OSError):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    if not source:
+        return False
+    stat = os.stat(source_path)
+    return source["mtime_ns"] == stat.st_mtime_ns and source["size"] == stat.st_size
+
+
+def build_snapshot(pedidos_path: str, snapshot_path: str | None = None) -> str:
+    """Converte o histórico (JSON legado ou NDJSON, lido em streaming) em snapshot."""
+    snapshot_path = snapshot_path or snapshot_path_for(pedidos_path)
+    return write_snapshot(OrderStore.from_path(pedidos_path), snapshot_path, source_path=pedidos_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Converte o histórico de pedidos em snapshot binário colunar.")
+    parser.add_argument("path", help="arquivo de pedidos (.json ou .ndjson)")
+    parser.add_argument("--output", default=None, help="destino (padrão: mesmo nome com extensão .snapshot)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    output = build_snapshot(args.path, args.output)
+    header = read_header(output)
+    print(
+        f"{header['orders']} pedido(s) gravados em {output} "
+        f"({os.path.getsize(output) / 1e6:.1f} MB, {time.perf_counter() - started:.1f}s)"
+    )
@@ -0,0 +1,191 @@
+import os
+import threading
+from datetime import date
+
+from config import ORDER_LOG_PATH, ORDER_SOURCE
+from utils.client_ranking import DEFAULT_PAGE_SIZE
+from utils.metrics_store import IncrementalMetricsStore
+from utils.order_snapshot import is_snapshot_fresh, load_snapshot, snapshot_path_for
+from utils.order_store import OrderStore
+from utils.order_stream import NDJSON_SUFFIXES
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+class OrderSource:
+    """
+    Interface mínima de uma fonte de pedidos usada pelo app, pelo CLI e pelo /report.
+    Todas devolvem os mesmos dicts de `MetricsPlugin` (métricas, páginas de clientes,
+    resumos de período), qualquer que seja o armazenamento por trás.
+    """
+
+    restaurante: dict = {}
+
+    def refresh(self) -> int:
+        """Incorpora o que mudou na origem; retorna quantos pedidos novos (ou recarregados) entraram."""
+        return 0
+
+    def version(self) -> list | None:
+        """Identifica o estado atual da origem (muda quando chegam pedidos)."""
+        raise NotImplementedError
+
+    def metrics(self, today: date | None = None) -> dict:
+        raise NotImplementedError
+
+    def clients_page(self, sort_by: str = "valor_total_gasto", limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+        raise NotImplementedError
+
+    def top_clients(self, k: int, sort_by: str = "valor_total_gasto") -> list:
+        raise NotImplementedError
+
+    def summarize(self, start: date, end: date, weekday: int | None = None, client: str | None = None, product: str | None = None) -> dict:
+        """Mesmo contrato de `OrderStore.summarize` (usado por `MetricsPlugin.range_query`)."""
+        raise NotImplementedError
+
+    @property
+    def product_names(self) -> list:
+        raise NotImplementedError
+
+    @property
+    def client_names(self) -> list:
+        raise NotImplementedError
+
+    def anomaly_store(self, today: date | None = None) -> OrderStore:
+        """`OrderStore` com o histórico que a varredura de anomalias precisa."""
+        raise NotImplementedError
+
+
+class OrderStoreSource(OrderSource):
+    """Fonte em memória: um `OrderStore` mais o estado incremental das métricas."""
+
+    def __init__(self, order_store: OrderStore, metrics_store: IncrementalMetricsStore | None = None) -> None:
+        self.order_store = order_store
+        self.metrics_store = metrics_store or IncrementalMetricsStore.from_order_store(order_store)
+
+    @property
+    def restaurante(self) -> dict:
+        return self.order_store.restaurante
+
+    def version(self) -> list | None:
+        return [self.metrics_store.version]
+
+    def metrics(self, today: date | None = None) -> dict:
+        return self.metrics_store.metrics(today)
+
+    def clients_page(self, sort_by: str = "valor_total_gasto", limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+        return self.metrics_store.clients_page(sort_by, limit, cursor)
+
+    def top_clients(self, k: int, sort_by: str = "valor_total_gasto") -> list:
+        return self.metrics_store.top_clients(k, sort_by)
+
+    def summarize(self, start: date, end: date, weekday: int | None = None, client: str | None = None, product: str | None = None) -> dict:
+        return self.order_store.summarize(start, end, weekday, client, product)
+
+    @property
+    def product_names(self) -> list:
+        return self.order_store.product_names
+
+    @property
+    def client_names(self) -> list:
+        return self.order_store.client_names
+
+    def anomaly_store(self, today: date | None = None) -> OrderStore:
+        return self.order_store
+
+
+class JSONOrderSource(OrderStoreSource):
+    """
+    `pedidos.json` legado: mapeia o snapshot binário quando ele está em dia, senão lê o
+    arquivo em streaming; `refresh()` só relê quando o arquivo muda (mtime/tamanho).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        """Monta o store e as métricas antes de publicá-los, numa única atribuição (com `_lock`)."""
+        file_key = _file_key(self.path)
+        snapshot_path = snapshot_path_for(self.path)
+        order_store = None
+        if is_snapshot_fresh(snapshot_path, self.path):
+            try:
+                order_store = load_snapshot(snapshot_path)
+            except (ValueError, KeyError, OSError):
+                order_store = None   # snapshot corrompido: relê o JSON
+        if order_store is None:
+            order_store = OrderStore.from_path(self.path)
+        metrics_store = IncrementalMetricsStore.from_order_store(order_store)
+        self.order_store, self.metrics_store, self._file_key = order_store, metrics_store, file_key
+
+    def version(self) -> list | None:
+        try:
+            return list(_file_key(self.path))
+        except FileNotFoundError:
+            return None
+
+    def refresh(self) -> int:
+        try:
+            changed = _file_key(self.path) != self._file_key
+        except FileNotFoundError:
+            return 0
+        if not changed:
+            return 0
+        with self._lock:
+            if _file_key(self.path) == self._file_key:
+                return 0   # outra thread já recarregou
+            self._load()
+            return len(self.order_store)
+
+
+class NDJSONOrderSource(OrderStoreSource):
+    """Log append-only (`utils/order_log.py`): `refresh()` lê só os pedidos acrescentados."""
+
+    def __init__(self, path: str) -> None:
+        from utils.order_log import OrderFeed
+
+        self.path = path
+        self.feed = OrderFeed.open(path)
+
+    @property
+    def order_store(self) -> OrderStore:
+        return self.feed.order_store
+
+    @property
+    def metrics_store(self) -> IncrementalMetricsStore:
+        return self.feed.metrics_store
+
+    def version(self) -> list | None:
+        return self.feed.log.version()
+
+    def refresh(self) -> int:
+        return self.feed.poll()
+
+
+def _file_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def default_source_path(pedidos_path: str) -> str:
+    """`ORDER_SOURCE`, se definido; senão o log append-only, se existir; senão o JSON legado."""
+    if ORDER_SOURCE:
+        return ORDER_SOURCE
+    if os.path.exists(ORDER_LOG_PATH):
+        return ORDER_LOG_PATH
+    return pedidos_path
+
+
+def open_order_source(path: str) -> OrderSource:
+    """Escolhe a implementação pela extensão: .json, .ndjson/.jsonl ou .db/.sqlite/.sqlite3."""
+    if path.endswith(SQLITE_SUFFIXES):
+        from utils.sqlite_orders import SQLiteOrderSource
+
+        return SQLiteOrderSource(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if path.endswith(NDJSON_SUFFIXES):
+        return NDJSONOrderSource(path)
+    return JSONOrderSource(path)
@@ -0,0 +1,512 @@
+import bisect
+import math
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+from utils.client_ranking import ClientTable
+from utils.metrics_aggregation import WEEKDAYS, MetricsAggregator
+from utils.quantile_sketch import INV_LOG_GAMMA, MIN_VALUE, ZERO_KEY, LogHistogram
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_ORDINAL = _EPOCH.toordinal()
+_MICROSECOND = timedelta(microseconds=1)
+DAY_US = 86_400_000_000
+MISSING = -(1 << 63)
+WEEKDAY_CODES = {day: code for code, day in enumerate(WEEKDAYS)}
+
+# Colunas numéricas e seus typecodes de `array` (todos de largura fixa em qualquer plataforma).
+COLUMNS = {
+    "totals": "d",
+    "ordered_at_us": "q",
+    "received_at_us": "q",
+    "dispatched_at_us": "q",
+    "weekdays": "b",
+    "client_codes": "i",
+    "item_offsets": "q",
+    "item_products": "i",
+    "item_quantities": "q",
+}
+
+
+def _local_us(dt: datetime) -> int:
+    """Horário de parede (ignora o fuso) em microssegundos desde 1970-01-01."""
+    return (dt.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+
+
+def _instant_us(dt: datetime) -> int:
+    """Instante absoluto em microssegundos; datas sem fuso são tratadas como UTC."""
+    if dt.tzinfo is None:
+        return (dt - _EPOCH) // _MICROSECOND
+    return (dt - _EPOCH_UTC) // _MICROSECOND
+
+
+def client_key(pedido: dict):
+    """(id, nome) do cliente, com o nome fazendo as vezes de id quando ele falta; ou None."""
+    try:
+        cliente = pedido["cliente"]
+        client_name = cliente["nome"]
+        client_id = cliente.get("id")
+        if client_id is None:
+            client_id = client_name
+        hash(client_id)
+        return client_id, client_name
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+
+class OrderStore:
+    """
+    Pedidos em colunas compactas (`array`): datas já convertidas para microssegundos,
+    dia da semana como código pequeno e clientes (por `cliente.id`) e produtos
+    codificados por dicionário.
+    Ocupa uma fração dos dicts do JSON e as agregações não re-parseiam datas.
+
+    Pedidos fora do formato esperado (datas inválidas, campos faltando, dia da semana
+    desconhecido...) ficam guardados como dict e passam pelo caminho de referência do
+    `MetricsAggregator`, na mesma ordem, para que o resultado seja idêntico.
+    """
+
+    def __init__(self, restaurante: dict | None = None) -> None:
+        self.restaurante = restaurante or {}
+        self._lock = threading.Lock()
+
+        self.totals = array("d")
+        self.ordered_at_us = array("q")     # data_pedido, horário de parede
+        self.received_at_us = array("q")    # data_recebimento (MISSING se ausente)
+        self.dispatched_at_us = array("q")  # data_envio (MISSING se ausente)
+        self.weekdays = array("b")
+        self.client_codes = array("i")
+
+        self.item_offsets = array("q", [0])
+        self.item_products = array("i")
+        self.item_quantities = array("q")
+
+        self.client_ids = []
+        self.client_names = []              # nome de exibição de cada id (o primeiro visto)
+        self._client_index = {}
+        self.product_names = []
+        self._product_index = {}
+
+        self.irregular = {}
+        self._aggregated = None
+        self._date_index = None
+        self._client_table = None
+        # Mapeamento de memória do snapshot de origem, se houver (ver utils/order_snapshot.py).
+        self.mapping = None
+
+    @classmethod
+    def from_pedidos_data(cls, pedidos_data: dict) -> "OrderStore":
+        store = cls(pedidos_data.get("restaurante", {}))
+        store.extend(pedidos_data.get("pedidos", []))
+        return store
+
+    @classmethod
+    def from_path(cls, pedidos_path: str) -> "OrderStore":
+        """Monta o store lendo o arquivo em streaming (JSON legado ou NDJSON)."""
+        from utils.order_stream import OrderStream
+
+        stream = OrderStream(pedidos_path)
+        store = cls()
+        store.extend(stream)
+        store.restaurante = stream.restaurante
+        return store
+
+    @classmethod
+    def from_columns(
+        cls, restaurante: dict, columns: dict, client_ids: list, client_names: list, product_names: list, irregular: dict
+    ) -> "OrderStore":
+        """
+        Store sobre colunas já prontas (ex.: memoryviews de um snapshot mapeado em memória),
+        sem cópia. O primeiro `append` copia as colunas para `array`.
+        """
+        store = cls(restaurante)
+        for name in COLUMNS:
+            setattr(store, name, columns[name])
+        store.client_ids = list(client_ids)
+        store.client_names = list(client_names)
+        store._client_index = {client_id: code for code, client_id in enumerate(store.client_ids)}
+        store.product_names = list(product_names)
+        store._product_index = {name: code for code, name in enumerate(store.product_names)}
+        store.irregular = dict(irregular)
+        return store
+
+    def columns(self) -> dict:
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def _ensure_writable(self) -> None:
+        for name, typecode in COLUMNS.items():
+            column = getattr(self, name)
+            if not isinstance(column, array):
+                setattr(self, name, array(typecode, column))
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+    def _intern(self, names: list, index: dict, name) -> int:
+        code = index.get(name)
+        if code is None:
+            code = index[name] = len(names)
+            names.append(name)
+        return code
+
+    def _intern_client(self, client_id, client_name) -> int:
+        code = self._client_index.get(client_id)
+        if code is None:
+            code = self._client_index[client_id] = len(self.client_ids)
+            self.client_ids.append(client_id)
+            self.client_names.append(client_name)
+        return code
+
+    def _compact(self, pedido: dict):
+        """Converte o pedido para a forma colunar, ou None se ele for irregular."""
+        try:
+            total = pedido["total"]
+            client_name = pedido["cliente"]["nome"]
+            client_id = pedido["cliente"].get("id")
+            if client_id is None:
+                client_id = client_name
+            if not isinstance(total, (int, float)) or not isinstance(client_name, str) or not isinstance(client_id, (int, str)):
+                return None
+            weekday = WEEKDAY_CODES.get(pedido.get("dia_semana"))
+            if weekday is None:
+                return None
+
+            ordered_at = datetime.fromisoformat(pedido["data_pedido"])
+            received_at = dispatched_at = MISSING
+            if pedido.get("data_recebimento") and pedido.get("data_envio"):
+                received_dt = datetime.fromisoformat(pedido["data_recebimento"])
+                dispatched_dt = datetime.fromisoformat(pedido["data_envio"])
+                if (received_dt.tzinfo is None) != (dispatched_dt.tzinfo is None):
+                    return None
+                received_at = _instant_us(received_dt)
+                dispatched_at = _instant_us(dispatched_dt)
+
+            items = []
+            for item in pedido.get("itens", []):
+                quantity = item["quantidade"]
+                if not isinstance(item["nome"], str) or type(quantity) is not int:
+                    return None
+                items.append((item["nome"], quantity))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+        return float(total), _local_us(ordered_at), received_at, dispatched_at, weekday, (client_id, client_name), items
+
+    def append(self, pedido: dict) -> None:
+        compact = self._compact(pedido)
+        with self._lock:
+            self._ensure_writable()
+            self._aggregated = None
+            self._client_table = None
+            if compact is None:
+                self.irregular[len(self.totals)] = pedido
+                compact = (0.0, MISSING, MISSING, MISSING, -1, client_key(pedido), ())
+            total, ordered_at, received_at, dispatched_at, weekday, client, items = compact
+            # Pedidos que chegam em ordem cronológica (o caso do log) mantêm as próprias
+            # colunas como índice de datas, sem reordenar o histórico.
+            keeps_order = (
+                self._date_index is not None
+                and isinstance(self._date_index[1], range)
+                and (not self.ordered_at_us or self.ordered_at_us[-1] <= ordered_at)
+            )
+
+            self.totals.append(total)
+            self.ordered_at_us.append(ordered_at)
+            self.received_at_us.append(received_at)
+            self.dispatched_at_us.append(dispatched_at)
+            self.weekdays.append(weekday)
+            self.client_codes.append(-1 if client is None else self._intern_client(*client))
+            for name, quantity in items:
+                self.item_products.append(self._intern(self.product_names, self._product_index, name))
+                self.item_quantities.append(quantity)
+            self.item_offsets.append(len(self.item_products))
+            self._date_index = (self.ordered_at_us, range(len(self.ordered_at_us))) if keeps_order else None
+
+    def extend(self, pedidos) -> int:
+        added = 0
+        for pedido in pedidos:
+            self.append(pedido)
+            added += 1
+        return added
+
+    @contextmanager
+    def reading(self):
+        """
+        Segura os `append` enquanto as colunas são lidas sem cópia (ex.: `numpy.frombuffer`):
+        um `array` não pode crescer enquanto houver um buffer exportado sobre ele.
+        """
+        with self._lock:
+            yield self
+
+    def nbytes(self) -> int:
+        """Bytes ocupados pelas colunas (sem os nomes e os pedidos irregulares)."""
+        return sum(column.itemsize * len(column) for column in self.columns().values())
+
+    def metrics_aggregator(self) -> MetricsAggregator:
+        """
+        `MetricsAggregator` com o estado de todos os pedidos, montado direto das colunas.
+        Fica em cache até o próximo `append`; não deve ser alterado.
+        """
+        with self._lock:
+            if self._aggregated is not None:
+                return self._aggregated
+            aggregator = self._aggregate()
+            self._aggregated = aggregator
+            return aggregator
+
+    def metrics(self, today: date | None = None) -> dict:
+        return self.metrics_aggregator().result(today)
+
+    def _aggregate(self) -> MetricsAggregator:
+        aggregator = MetricsAggregator()
+        aggregator.set_restaurant(self.restaurante)
+
+        weekday_seconds = [0.0] * len(WEEKDAYS)
+        weekday_counts = [0] * len(WEEKDAYS)
+        prep_by_date = aggregator.prep_by_date
+        prep_by_ordinal = {}
+        # Bucket do sketch de quantis de cada pedido, com dia e dia da semana; as contagens
+        # vão para os sketches do agregador de uma vez, no fim (pedidos irregulares somam neles
+        # direto, e a ordem não altera contagens).
+        sketch_entries = []
+        log = math.log
+        ceil = math.ceil
+        month_by_ordinal = {}
+        sales_by_month = aggregator.sales_by_month
+        product_totals = [0] * len(self.product_names)
+        products = self.product_names
+        irregular = self.irregular
+
+        totals = self.totals
+        ordered_at_us = self.ordered_at_us
+        received_at_us = self.received_at_us
+        dispatched_at_us = self.dispatched_at_us
+        weekdays = self.weekdays
+        item_offsets = self.item_offsets
+        item_products = self.item_products
+        item_quantities = self.item_quantities
+
+        grand_total_sold = 0.0
+        overall_prep_seconds = 0.0
+        overall_orders_count = 0
+        for row in range(len(totals)):
+            if irregular and row in irregular:
+                # Passa as somas locais para o agregador, roda o caminho de referência e
+                # retoma delas: a ordem das somas de ponto flutuante é a mesma do original.
+                self._flush(aggregator, grand_total_sold, overall_prep_seconds, overall_orders_count, weekday_seconds, weekday_counts)
+                aggregator.add(irregular[row])
+                for name, quantity in aggregator.product_counter.items():
+                    code = self._intern(products, self._product_index, name)
+                    if code == len(product_totals):
+                        product_totals.append(0)
+                    product_totals[code] += quantity
+                aggregator.product_counter.clear()
+                grand_total_sold = aggregator.grand_total_sold
+                overall_prep_seconds = aggregator.overall_prep_seconds
+                overall_orders_count = aggregator.overall_orders_count
+                for code, day in enumerate(WEEKDAYS):
+                    weekday_seconds[code] = aggregator.prep_time_by_day[day]["total_seconds"]
+                    weekday_counts[code] = aggregator.prep_time_by_day[day]["count"]
+                continue
+
+            total = totals[row]
+            grand_total_sold += total
+            weekday = weekdays[row]
+            ordinal = EPOCH_ORDINAL + ordered_at_us[row] // DAY_US
+
+            received_at = received_at_us[row]
+            if received_at != MISSING:
+                prep_seconds = (dispatched_at_us[row] - received_at) / 1_000_000
+                overall_prep_seconds += prep_seconds
+                overall_orders_count += 1
+                weekday_seconds[weekday] += prep_seconds
+                weekday_counts[weekday] += 1
+                bucket = prep_by_ordinal.get(ordinal)
+                if bucket is None:
+                    # O mesmo bucket do agregador, para pedidos irregulares somarem nele em ordem.
+                    bucket = prep_by_date.setdefault(date.fromordinal(ordinal), [0.0, 0])
+                    prep_by_ordinal[ordinal] = bucket
+                bucket[0] += prep_seconds
+                bucket[1] += 1
+
+                sketch_entries.append(
+                    (ordinal, weekday, ZERO_KEY if prep_seconds < MIN_VALUE else ceil(log(prep_seconds) * INV_LOG_GAMMA))
+                )
+
+            month_year = month_by_ordinal.get(ordinal)
+            if month_year is None:
+                day = date.fromordinal(ordinal)
+                month_year = month_by_ordinal[ordinal] = f"{day.year:04d}-{day.month:02d}"
+            month_data = sales_by_month.get(month_year)
+            if month_data is None:
+                month_data = sales_by_month[month_year] = {"total_value_sold": 0.0, "sales_by_day": Counter()}
+            month_data["total_value_sold"] += total
+            month_data["sales_by_day"][WEEKDAYS[weekday]] += 1
+
+            for position in range(item_offsets[row], item_offsets[row + 1]):
+                product_totals[item_products[position]] += item_quantities[position]
+
+        self._flush(aggregator, grand_total_sold, overall_prep_seconds, overall_orders_count, weekday_seconds, weekday_counts)
+        self._fill_sketches(aggregator, sketch_entries)
+        # Ordem de inserção = primeira aparição, como no Counter do agregador (desempate do most_common).
+        aggregator.product_counter.update(
+            {name: quantity for name, quantity in zip(products, product_totals) if quantity}
+        )
+        return aggregator
+
+    @staticmethod
+    def _fill_sketches(aggregator: MetricsAggregator, sketch_entries: list) -> None:
+        overall = aggregator.prep_sketch.counts
+        by_day = [aggregator.prep_sketch_by_day[day].counts for day in WEEKDAYS]
+        by_date = aggregator.prep_sketch_by_date
+        for (ordinal, weekday, key), count in Counter(sketch_entries).items():
+            overall[key] += count
+            by_day[weekday][key] += count
+            day = date.fromordinal(ordinal)
+            sketch = by_date.get(day)
+            if sketch is None:
+                sketch = by_date[day] = LogHistogram()
+            sketch.counts[key] += count
+
+    @staticmethod
+    def _flush(aggregator, grand_total_sold, overall_prep_seconds, overall_orders_count, weekday_seconds, weekday_counts) -> None:
+        aggregator.grand_total_sold = grand_total_sold
+        aggregator.overall_prep_seconds = overall_prep_seconds
+        aggregator.overall_orders_count = overall_orders_count
+        for code, day in enumerate(WEEKDAYS):
+            aggregator.prep_time_by_day[day]["total_seconds"] = weekday_seconds[code]
+            aggregator.prep_time_by_day[day]["count"] = weekday_counts[code]
+
+    def date_index(self) -> tuple:
+        """
+        (chaves, linhas): `data_pedido` em ordem crescente e a linha de cada uma. Quando os
+        pedidos já chegam em ordem cronológica, as próprias colunas servem de índice.
+        """
+        with self._lock:
+            return self._ensure_date_index()
+
+    def _ensure_date_index(self) -> tuple:
+        if self._date_index is None:
+            ordered_at_us = self.ordered_at_us
+            if all(ordered_at_us[row] <= ordered_at_us[row + 1] for row in range(len(ordered_at_us) - 1)):
+                self._date_index = (ordered_at_us, range(len(ordered_at_us)))
+            else:
+                rows = array("i", sorted(range(len(ordered_at_us)), key=ordered_at_us.__getitem__))
+                self._date_index = (array("q", (ordered_at_us[row] for row in rows)), rows)
+        return self._date_index
+
+    def rows_between(self, start: date, end: date):
+        """Linhas com `data_pedido` em [start, end), via busca binária no índice: O(log n + k)."""
+        with self._lock:
+            return self._rows_between(start, end)
+
+    def _rows_between(self, start: date, end: date):
+        keys, rows = self._ensure_date_index()
+        low = bisect.bisect_left(keys, (start.toordinal() - EPOCH_ORDINAL) * DAY_US)
+        high = bisect.bisect_left(keys, (end.toordinal() - EPOCH_ORDINAL) * DAY_US, low)
+        return rows[low:high]
+
+    def summarize(self, start: date, end: date, weekday: int | None = None, client: str | None = None, product: str | None = None) -> dict:
+        """
+        Resumo dos pedidos com `data_pedido` em [start, end), opcionalmente filtrados por dia
+        da semana (código de WEEKDAYS), cliente (id ou nome) ou produto. Pedidos irregulares
+        ficam de fora.
+        Com filtro de produto, `units_sold` conta só as unidades daquele produto.
+        """
+        # Sob o lock: um `poll` do log pode estar acrescentando pedidos em outra thread.
+        with self._lock:
+            return self._summarize(start, end, weekday, client, product)
+
+    def _summarize(self, start: date, end: date, weekday: int | None, client: str | None, product: str | None) -> dict:
+        client_codes_wanted = None
+        if client is not None:
+            client_codes_wanted = {
+                code for code, (client_id, client_name) in enumerate(zip(self.client_ids, self.client_names))
+                if client_id == client or client_name == client
+            }
+        product_code = self._product_index.get(product, -2) if product is not None else None
+
+        totals = self.totals
+        received_at_us = self.received_at_us
+        dispatched_at_us = self.dispatched_at_us
+        weekdays = self.weekdays
+        client_codes = self.client_codes
+        item_offsets = self.item_offsets
+        item_products = self.item_products
+        item_quantities = self.item_quantities
+
+        orders = 0
+        total_sold = 0.0
+        prep_seconds = 0.0
+        prep_count = 0
+        units_sold = 0
+        orders_by_weekday = [0] * len(WEEKDAYS)
+        product_totals = Counter()
+        for row in self._rows_between(start, end):
+            if weekday is not None and weekdays[row] != weekday:
+                continue
+            if client_codes_wanted is not None and client_codes[row] not in client_codes_wanted:
+                continue
+            items = range(item_offsets[row], item_offsets[row + 1])
+            if product_code is not None:
+                product_units = sum(item_quantities[position] for position in items if item_products[position] == product_code)
+                if not product_units:
+                    continue
+                units_sold += product_units
+            else:
+                units_sold += sum(item_quantities[position] for position in items)
+
+            orders += 1
+            total_sold += totals[row]
+            orders_by_weekday[weekdays[row]] += 1
+            received_at = received_at_us[row]
+            if received_at != MISSING:
+                prep_seconds += (dispatched_at_us[row] - received_at) / 1_000_000
+                prep_count += 1
+            for position in items:
+                product_totals[item_products[position]] += item_quantities[position]
+
+        return {
+            "orders": orders,
+            "total_sold": round(total_sold, 2),
+            "avg_ticket": round(total_sold / orders, 2) if orders else 0.0,
+            "avg_prep_seconds": int(prep_seconds / prep_count) if prep_count else 0,
+            "units_sold": units_sold,
+            "orders_by_weekday": {day: count for day, count in zip(WEEKDAYS, orders_by_weekday) if count},
+            "top_products": [
+                {"name": self.product_names[code], "sold": sold} for code, sold in product_totals.most_common(3)
+            ],
+        }
+
+    def client_table(self) -> ClientTable:
+        """
+        Pedidos e total gasto por cliente, na ordem de primeira aparição (a mesma do
+        `ClientsAggregator`). Fica em cache até o próximo `append`; não deve ser alterada.
+        """
+        with self._lock:
+            if self._client_table is not None:
+                return self._client_table
+            counts = [0] * len(self.client_ids)
+            spent = [0.0] * len(self.client_ids)
+            client_codes = self.client_codes
+            totals = self.totals
+            irregular = self.irregular
+            for row in range(len(totals)):
+                code = client_codes[row]
+                if irregular and row in irregular:
+                    # Mesmos acessos do ClientsAggregator: cliente ou total ausentes levantam KeyError.
+                    pedido = irregular[row]
+                    pedido["cliente"]["nome"]
+                    if code < 0:
+                        raise TypeError(f"Cliente inválido no pedido {pedido.get('id')!r}: {pedido['cliente']!r}")
+                    counts[code] += 1
+                    spent[code] += pedido["total"]
+                    continue
+                counts[code] += 1
+                spent[code] += totals[row]
+
+            self._client_table = ClientTable(list(self.client_ids), list(self.client_names), counts, spent)
+            return self._client_table
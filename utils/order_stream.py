@@ -0,0 +1,181 @@
+import json
+import os
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+CHUNK_SIZE = 1 << 16
+# Tamanho máximo de um valor (um pedido, o restaurante...) no buffer antes de desistir dele.
+MAX_VALUE_CHARS = 1 << 24
+# Um erro de decodificação com pelo menos isso de texto depois dele não é só falta de dados
+# (o maior token incompleto fora de strings é `-Infinity`).
+_TOKEN_LOOKAHEAD = 64
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def is_restaurant_header(record: dict) -> bool:
+    """Linha `{"restaurante": {...}}` do NDJSON (e não um pedido)."""
+    return "restaurante" in record and "cliente" not in record
+
+
+class OrderStream:
+    """
+    Percorre os pedidos de um arquivo sem carregá-lo inteiro em memória.
+
+    Aceita o formato legado (`{"restaurante": {...}, "pedidos": [...]}`), lido com um
+    parser incremental, e a variante NDJSON (um pedido por linha, com uma linha opcional
+    `{"restaurante": {...}}` de cabeçalho). `restaurante` é preenchido assim que aparece
+    no arquivo; no formato legado ele pode vir depois dos pedidos.
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.restaurante = {}
+
+    def __iter__(self):
+        if self.path.endswith(NDJSON_SUFFIXES):
+            return self._iter_ndjson()
+        return self._iter_json()
+
+    def _iter_ndjson(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if is_restaurant_header(record):
+                    self.restaurante = record["restaurante"] or {}
+                    continue
+                yield record
+
+    def _iter_json(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            reader = _ChunkReader(f, self.chunk_size)
+            reader.expect("{")
+            if reader.peek() == "}":
+                return
+            while True:
+                key = reader.decode()
+                reader.expect(":")
+                if key == "pedidos":
+                    yield from self._iter_array(reader)
+                else:
+                    value = reader.decode()
+                    if key == "restaurante":
+                        self.restaurante = value or {}
+                if reader.next_char() == "}":
+                    return
+
+    @staticmethod
+    def _iter_array(reader):
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.next_char()
+            return
+        while True:
+            yield reader.decode()
+            if reader.next_char() == "]":
+                return
+
+
+class _ChunkReader:
+    """Buffer de leitura que decodifica um valor JSON por vez com `raw_decode`."""
+
+    def __init__(self, f, chunk_size: int, max_value_chars: int = MAX_VALUE_CHARS) -> None:
+        self._f = f
+        self._chunk_size = chunk_size
+        self._max_value_chars = max_value_chars
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def peek(self) -> str:
+        self._skip_whitespace()
+        if self._pos >= len(self._buf):
+            raise json.JSONDecodeError("Fim inesperado do arquivo", self._buf, self._pos)
+        return self._buf[self._pos]
+
+    def next_char(self) -> str:
+        char = self.peek()
+        self._pos += 1
+        if char not in ",]}":
+            raise json.JSONDecodeError(f"Caractere inesperado {char!r}", self._buf, self._pos - 1)
+        return char
+
+    def expect(self, expected: str) -> None:
+        char = self.peek()
+        if char != expected:
+            raise json.JSONDecodeError(f"Esperado {expected!r}", self._buf, self._pos)
+        self._pos += 1
+
+    def decode(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as error:
+                if len(self._buf) - self._pos > self._max_value_chars:
+                    raise json.JSONDecodeError(
+                        f"Valor com mais de {self._max_value_chars} caracteres", self._buf, self._pos
+                    ) from error
+                # Só vale ler mais quando o erro está no fim do buffer (valor truncado) ou numa
+                # string ainda aberta; um objeto malformado falha logo, sem bufferizar o resto do arquivo.
+                malformed = not error.msg.startswith("Unterminated string") and error.pos + _TOKEN_LOOKAHEAD < len(self._buf)
+                if not malformed and self._fill():
+                    continue
+                raise
+            # Um número no fim do buffer pode estar truncado; garante o próximo caractere.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def write_ndjson(src_path: str, dst_path: str) -> int:
+    """Converte o arquivo de pedidos para NDJSON em streaming. Retorna o número de pedidos."""
+    stream = OrderStream(src_path)
+    count = 0
+    tmp_path = dst_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for pedido in stream:
+            out.write(json.dumps(pedido, ensure_ascii=False))
+            out.write("\n")
+            count += 1
+    # O cabeçalho vai no início, mas o restaurante só é conhecido ao final da leitura.
+    with open(dst_path, "w", encoding="utf-8") as out, open(tmp_path, "r", encoding="utf-8") as body:
+        out.write(json.dumps({"restaurante": stream.restaurante}, ensure_ascii=False))
+        out.write("\n")
+        for line in body:
+            out.write(line)
+    os.remove(tmp_path)
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Uso: python -m utils.order_stream <pedidos.json> <pedidos.ndjson>")
+        sys.exit(1)
+    total = write_ndjson(sys.argv[1], sys.argv[2])
+    print(f"{total} pedido(s) gravados em {sys.argv[2]}")
@@ -0,0 +1,114 @@
+import re
+from datetime import date, timedelta
+
+from utils.metrics_aggregation import WEEKDAYS
+from utils.text_utils import normalize_text
+
+# Formas normalizadas (sem acento) de cada dia, na ordem de WEEKDAYS.
+_WEEKDAY_WORDS = ["segunda", "terca", "quarta", "quinta", "sexta", "sabado", "domingo"]
+# Datas no texto normalizado, em que o "-" do ISO (2025-08-01) vira espaço.
+_DATE_PATTERN = re.compile(r"\b(\d{4}) (\d{1,2}) (\d{1,2})\b|\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+_MONTH_WORDS = ["janeiro", "fevereiro", "marco", "abril", "maio", "junho", "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
+_MONTH_PATTERN = re.compile(rf"\b({'|'.join(_MONTH_WORDS)})(?: de (\d{{4}}))?\b")
+_LAST_N_PATTERN = re.compile(r"\bultim[oa]s (\d+) (dia|dias|semana|semanas)\b")
+_COMPARE_WORDS = ("compar", "anterior", "antes", " vs ", "versus", "em relacao")
+DEFAULT_DAYS = 7
+
+
+def _parse_dates(text: str, today: date) -> list:
+    dates = []
+    for match in _DATE_PATTERN.finditer(text):
+        try:
+            if match.group(1):
+                dates.append(date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+            else:
+                year = int(match.group(6)) if match.group(6) else today.year
+                dates.append(date(year + 2000 if year < 100 else year, int(match.group(5)), int(match.group(4))))
+        except ValueError:
+            continue
+    return dates
+
+
+def _month_range(match: re.Match, today: date) -> tuple:
+    """Mês citado pelo nome: o do ano informado ou, sem ano, a ocorrência mais recente."""
+    month = _MONTH_WORDS.index(match.group(1)) + 1
+    year = int(match.group(2)) if match.group(2) else today.year - (month > today.month)
+    start = date(year, month, 1)
+    end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+    if start <= today:
+        # O mês corrente vai só até hoje.
+        end = min(end, today)
+    return start, end
+
+
+def _last_weekday(weekday: int, today: date) -> date:
+    """Último `weekday` antes de hoje (sexta passada, em qualquer dia da semana atual)."""
+    return today - timedelta(days=(today.weekday() - weekday - 1) % 7 + 1)
+
+
+def _match_name(normalized: str, names) -> str | None:
+    """O nome mais longo (normalizado) contido no texto, para 'Suco de Caju' vencer 'Caju'."""
+    best = None
+    for name in names:
+        if not isinstance(name, str):
+            continue
+        candidate = normalize_text(name)
+        if candidate and re.search(rf"\b{re.escape(candidate)}\b", normalized):
+            if best is None or len(candidate) > len(normalize_text(best)):
+                best = name
+    return best
+
+
+def parse_period_query(text: str, today: date | None = None, product_names=(), client_names=()) -> dict:
+    """
+    Interpreta perguntas como "como foi a última sexta comparada com a anterior?" e devolve
+    os argumentos de `MetricsPlugin.query_range`: período (datas inclusivas, ISO), dia da
+    semana, cliente, produto e se deve comparar com o período anterior. Sem período
+    reconhecível, usa os últimos 7 dias.
+    """
+    today = today or date.today()
+    normalized = f" {normalize_text(text)} "
+    weekday = next((code for code, word in enumerate(_WEEKDAY_WORDS) if re.search(rf"\b{word}s?\b", normalized)), None)
+
+    start = end = None
+    dates = _parse_dates(normalized, today)
+    last_n = _LAST_N_PATTERN.search(normalized)
+    month = _MONTH_PATTERN.search(normalized)
+    if dates:
+        start, end = min(dates), max(dates)
+    elif month:
+        start, end = _month_range(month, today)
+    elif last_n:
+        days = int(last_n.group(1)) * (7 if last_n.group(2).startswith("semana") else 1)
+        start, end = today - timedelta(days=days - 1), today
+    elif " anteontem " in normalized:
+        start = end = today - timedelta(days=2)
+    elif " ontem " in normalized:
+        start = end = today - timedelta(days=1)
+    elif " hoje " in normalized:
+        start = end = today
+    elif "semana passada" in normalized:
+        start = today - timedelta(days=today.weekday() + 7)
+        end = start + timedelta(days=6)
+    elif re.search(r"\b(esta|essa|nesta|nessa) semana\b", normalized):
+        start, end = today - timedelta(days=today.weekday()), today
+    elif "mes passado" in normalized:
+        end = today.replace(day=1) - timedelta(days=1)
+        start = end.replace(day=1)
+    elif re.search(r"\b(este|esse|neste|nesse) mes\b", normalized):
+        start, end = today.replace(day=1), today
+    elif weekday is not None:
+        # "sexta passada", "última sexta", "como foi sexta": o dia em si, não um filtro.
+        start = end = _last_weekday(weekday, today)
+        weekday = None
+    else:
+        start, end = today - timedelta(days=DEFAULT_DAYS - 1), today
+
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "weekday": WEEKDAYS[weekday] if weekday is not None else None,
+        "client": _match_name(normalized, client_names),
+        "product": _match_name(normalized, product_names),
+        "compare_previous": any(word in normalized for word in _COMPARE_WORDS),
+    }
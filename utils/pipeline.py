@@ -0,0 +1,107 @@
+import asyncio
+import inspect
+import time
+
+
+class PipelineStage:
+    def __init__(self, name: str, func, depends_on: tuple = (), blocking: bool = False) -> None:
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.blocking = blocking
+
+
+class PipelineResult:
+    def __init__(self, results: dict, timings: dict, total_ms: float) -> None:
+        self.results = results
+        self.timings = timings
+        self.total_ms = total_ms
+
+    def __getitem__(self, name: str):
+        return self.results[name]
+
+    def critical_path_ms(self) -> float:
+        return max((timing["end_ms"] for timing in self.timings.values()), default=0.0)
+
+
+class Pipeline:
+    """
+    Executor de um grafo de dependências de chamadas de plugins, num único event loop.
+
+    Cada estágio recebe como argumentos nomeados os resultados dos estágios de que
+    depende e começa assim que eles terminam, então estágios independentes rodam em
+    paralelo. Funções síncronas pesadas podem ser marcadas com `blocking=True` para
+    rodar numa thread sem travar o loop. `run()` devolve resultados e tempos por estágio.
+    """
+
+    def __init__(self) -> None:
+        self._stages = {}
+
+    def add(self, name: str, func, depends_on: tuple = (), blocking: bool = False) -> "Pipeline":
+        if name in self._stages:
+            raise ValueError(f"Estágio duplicado: {name}")
+        self._stages[name] = PipelineStage(name, func, depends_on, blocking)
+        return self
+
+    def _validate(self) -> None:
+        for stage in self._stages.values():
+            for dependency in stage.depends_on:
+                if dependency not in self._stages:
+                    raise ValueError(f"Estágio '{stage.name}' depende de '{dependency}', que não existe.")
+
+        visiting, done = set(), set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Ciclo de dependências envolvendo '{name}'.")
+            visiting.add(name)
+            for dependency in self._stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._stages:
+            visit(name)
+
+    async def run(self) -> PipelineResult:
+        self._validate()
+        started = time.perf_counter()
+        timings = {}
+        tasks = {}
+
+        async def run_stage(stage: PipelineStage):
+            kwargs = {}
+            for dependency in stage.depends_on:
+                kwargs[dependency] = await tasks[dependency]
+
+            stage_started = time.perf_counter()
+            if stage.blocking:
+                result = await asyncio.to_thread(stage.func, **kwargs)
+            else:
+                result = stage.func(**kwargs)
+                if inspect.isawaitable(result):
+                    result = await result
+            stage_finished = time.perf_counter()
+
+            timings[stage.name] = {
+                "start_ms": round((stage_started - started) * 1000, 3),
+                "end_ms": round((stage_finished - started) * 1000, 3),
+                "duration_ms": round((stage_finished - stage_started) * 1000, 3),
+            }
+            return result
+
+        for stage in self._stages.values():
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        results = { name: task.result() for name, task in tasks.items() }
+        total_ms = round((time.perf_counter() - started) * 1000, 3)
+        return PipelineResult(results, timings, total_ms)
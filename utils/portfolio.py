@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from utils.metrics_aggregation import MetricsAggregator
+from utils.order_stream import OrderStream
+
+
+def aggregate_shard(path: str) -> tuple[dict, MetricsAggregator]:
+    """Lê um arquivo de pedidos em streaming e devolve o restaurante e o agregador parcial."""
+    stream = OrderStream(path)
+    aggregator = MetricsAggregator()
+    aggregator.add_many(stream)
+    aggregator.set_restaurant(stream.restaurante)
+    return stream.restaurante, aggregator
+
+
+def _restaurant_key(restaurante: dict, path: str):
+    if restaurante.get("id") is not None:
+        return restaurante["id"]
+    return restaurante.get("nome") or path
+
+
+def aggregate_portfolio(paths: list[str], max_workers: int | None = None, today: date | None = None) -> dict:
+    """
+    Agrega vários arquivos/shards de pedidos em paralelo (um processo por shard) e
+    consolida os parciais por restaurante e no total do portfólio.
+
+    Shards do mesmo restaurante (mesmo `restaurante.id`; sem id, mesmo nome; sem nenhum dos
+    dois, o próprio arquivo) são somados. Retorna `{"restaurants": [{"key", "name", "metrics"}],
+    "portfolio": métricas}`, com as métricas no mesmo formato de `MetricsPlugin.query_metrics`;
+    a lista mantém separados restaurantes homônimos.
+    """
+    max_workers = max_workers or min(len(paths), os.cpu_count() or 1)
+    if max_workers <= 1 or len(paths) <= 1:
+        partials = [aggregate_shard(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            partials = list(pool.map(aggregate_shard, paths))
+
+    by_restaurant = {}
+    for path, (restaurante, partial) in zip(paths, partials):
+        key = _restaurant_key(restaurante, path)
+        if key not in by_restaurant:
+            by_restaurant[key] = partial
+        else:
+            by_restaurant[key].merge(partial)
+
+    portfolio = MetricsAggregator()
+    portfolio.restaurant_name = f"Portfólio ({len(by_restaurant)} restaurante(s))"
+    restaurants = []
+    for key, aggregator in by_restaurant.items():
+        portfolio.merge(aggregator)
+        restaurants.append({"key": key, "name": aggregator.restaurant_name, "metrics": aggregator.result(today)})
+
+    return {"restaurants": restaurants, "portfolio": portfolio.result(today)}
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Uso: python -m utils.portfolio <pedidos1.json> [pedidos2.json ...]")
+        sys.exit(1)
+    print(json.dumps(aggregate_portfolio(sys.argv[1:]), indent=2, ensure_ascii=False))
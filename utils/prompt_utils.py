@@ -1,3 +1,12 @@
+import json
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from config import PROMPT_TOKEN_BUDGET
+from utils.tracing import tracer
+
 FORMAT_REPORT_PROMPT = """
 Você é um analista de restaurantes. Gere um relatório curto e acionável para o restaurante {{restaurant_name}}.
 
@@ -25,12 +34,41 @@ Você é um analista de dados sênior especializado em operações de restaurant
 Sua tarefa é encontrar anomalias, padrões interessantes ou pontos de risco nos dados de métricas a seguir.
 
 Seja direto e aponte os achados em formato de lista (bullet points).
+Considere correlações entre os dados, como tempo de preparo em dias específicos, vendas de produtos em certos meses, etc.
 Se nada parecer fora do comum, apenas responda "Nenhuma anomalia significativa foi detectada.".
 
-Aqui estão os dados das métricas em formato JSON:
+Aqui estão os dados das métricas em formato JSON (meses antigos podem vir resumidos em "meses_anteriores"):
+{{metrics_data}}
+"""
+
+FORMAT_EXPLAIN_ANOMALIES_PROMPT = """
+Você é um analista de dados sênior especializado em operações de restaurantes.
+O monitoramento estatístico do histórico de pedidos sinalizou os achados abaixo (z-score contra a linha de base).
+Para cada achado, explique em uma lista (bullet points) o que ele significa, causas prováveis e uma ação recomendada.
+Não invente achados além dos listados.
+
+Achados sinalizados:
+{{findings}}
+
+Contexto das métricas em formato JSON (meses antigos podem vir resumidos em "meses_anteriores"):
+{{metrics_data}}
+"""
+
+FORMAT_KERNEL_SYSTEM_PROMPT = """
+Você é o assistente de análise do restaurante {{restaurant_name}}. Hoje é {{today}}.
+Responda em português, de forma curta e direta, citando os números.
+
+Sempre que possível, responda só com as métricas atuais abaixo, sem chamar ferramentas.
+Use as ferramentas apenas para o que não está nelas: períodos específicos (datas AAAA-MM-DD),
+filtros por cliente ou produto, ranking de clientes, anomalias ou um relatório completo.
+Se precisar de mais de uma ferramenta, chame todas de uma vez, na mesma resposta.
+
+Métricas atuais em formato JSON (meses antigos podem vir resumidos em "meses_anteriores"):
 {{metrics_data}}
 """
 
+NO_ANOMALIES_MESSAGE = "Nenhuma anomalia significativa foi detectada."
+
 FORMAT_ROUTER_PROMPT = """
 Você é um assistente de IA especializado em rotear a entrada de um usuário para a função correta.
 Analise a entrada e determine qual função de qual plugin deve ser chamada.
@@ -38,6 +76,7 @@ Analise a entrada e determine qual função de qual plugin deve ser chamada.
 As funções disponíveis são:
 - Plugin 'MetricsPlugin', função 'query_metrics': Para obter métricas gerais (vendas, tempo de preparo, produtos mais vendidos).
 - Plugin 'MetricsPlugin', função 'query_clients_metrics': Para obter dados sobre os clientes (quem mais comprou, total gasto).
+- Plugin 'MetricsPlugin', função 'query_range': Para métricas de um período específico (ontem, semana passada, uma data, um dia da semana), de um produto ou cliente, ou para comparar com o período anterior.
 - Plugin 'AnomaliePlugin', função 'detect_anomalies_with_ai': Para encontrar anomalias e padrões incomuns nos dados.
 - Plugin 'ReportPlugin', função 'generate_report': Para criar um relatório completo e estruturado.
 
@@ -63,6 +102,13 @@ Resposta:
   "function": "query_clients_metrics"
 }
 
+Entrada do usuário: "como foi a última sexta comparada com a anterior?"
+Resposta:
+{
+  "plugin": "MetricsPlugin",
+  "function": "query_range"
+}
+
 Entrada do usuário: "veja se tem algo de errado nos números"
 Resposta:
 {
@@ -84,10 +130,144 @@ Entrada do usuário: "{{user_input}}"
 Resposta:
 """
 
+_PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+# Estimativa de tokens: ~4 caracteres por token, a média do Gemini para texto em português/JSON.
+CHARS_PER_TOKEN = 4
+
+
+class PromptTemplate:
+    """Template quebrado uma vez em trechos fixos e `{{nome}}`; placeholders sem valor ficam como estão."""
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self._parts = _PLACEHOLDER.split(template)
+        self.fields = tuple(self._parts[1::2])
+
+    def render(self, values: dict) -> str:
+        parts = self._parts[:]
+        for position in range(1, len(parts), 2):
+            key = parts[position]
+            parts[position] = str(values[key]) if key in values else "{{" + key + "}}"
+        return "".join(parts)
+
+
+@lru_cache(maxsize=32)
+def compile_template(template: str) -> PromptTemplate:
+    return PromptTemplate(template)
+
+
 def render_prompt(template: str, values: dict) -> str:
-    rendered = template
-    for key, value in values.items():
-        rendered = rendered.replace("{{" + key + "}}", str(value))
-    return rendered
+    with tracer.span("render_prompt") as span:
+        rendered = compile_template(template).render(values)
+        span.set(template_chars=len(template), rendered_chars=len(rendered))
+        return rendered
+
+
+def compact_json(data) -> str:
+    """JSON sem indentação nem espaços entre separadores (acentos preservados)."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _drop_low_signal(metrics: dict) -> dict:
+    """Remove campos sem informação para a análise: médias e percentis zerados e contagens vazias."""
+    compacted = {}
+    for key, value in metrics.items():
+        if key == "avg_prep_time_by_day_seconds" and isinstance(value, dict):
+            value = {day: seconds for day, seconds in value.items() if seconds}
+        if key == "prep_percentiles_seconds" and isinstance(value, dict):
+            value = {
+                window: {day: values for day, values in percentiles.items() if any(values.values())}
+                if window == "by_day" else percentiles
+                for window, percentiles in value.items()
+                if window == "by_day" or any(percentiles.values())
+            }
+        if value in ({}, []):
+            continue
+        compacted[key] = value
+    return compacted
+
+
+def _summarize_months(sales_by_month: dict, keep_months: int, keep_days: bool) -> dict:
+    """Mantém os `keep_months` meses mais recentes e junta os anteriores em "meses_anteriores"."""
+    months = sorted(sales_by_month)
+    keep_months = min(keep_months, len(months))
+    older, recent = months[:len(months) - keep_months], months[len(months) - keep_months:]
+    summarized = {}
+    if older:
+        sales_by_day = Counter()
+        for month in older:
+            sales_by_day.update(sales_by_month[month].get("sales_by_day", {}))
+        summarized["meses_anteriores"] = {
+            "meses": len(older),
+            "de": older[0],
+            "ate": older[-1],
+            "total_value_sold": round(sum(sales_by_month[month].get("total_value_sold", 0.0) for month in older), 2),
+            "sales_by_day": dict(sales_by_day),
+        }
+    for month in recent:
+        month_data = sales_by_month[month]
+        summarized[month] = month_data if keep_days else {"total_value_sold": month_data.get("total_value_sold", 0.0)}
+    return summarized
+
+
+def fit_metrics_to_budget(metrics: dict, max_tokens: int) -> tuple[str, dict]:
+    """JSON compacto das métricas em até `max_tokens`, resumindo meses antigos; devolve o JSON e a economia."""
+    compacted = _drop_low_signal(metrics)
+    serialized = compact_json(compacted)
+    steps = []
+
+    sales_by_month = compacted.get("sales_by_month")
+    if estimate_tokens(serialized) > max_tokens and isinstance(sales_by_month, dict):
+        keep_months = len(sales_by_month)
+        candidates = [(months, True) for months in (12, 6, 3, 1) if months < keep_months]
+        candidates += [(min(keep_months, 1), False), (0, False)]
+        for months, keep_days in candidates:
+            compacted["sales_by_month"] = _summarize_months(sales_by_month, months, keep_days)
+            serialized = compact_json(compacted)
+            steps.append(f"{months}m{'' if keep_days else '-totais'}")
+            if estimate_tokens(serialized) <= max_tokens:
+                break
+
+    original = json.dumps(metrics, indent=2, ensure_ascii=False)
+    original_bytes = len(original.encode("utf-8"))
+    original_tokens = estimate_tokens(original)
+    serialized_bytes = len(serialized.encode("utf-8"))
+    tokens = estimate_tokens(serialized)
+    stats = {
+        "original_bytes": original_bytes,
+        "bytes": serialized_bytes,
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "saved_bytes": original_bytes - serialized_bytes,
+        "saved_tokens": original_tokens - tokens,
+        "budget_tokens": max_tokens,
+        "over_budget": tokens > max_tokens,
+        "steps": steps,
+    }
+    return serialized, stats
 
 
+def build_metrics_prompt(
+    template: str, metrics: dict, max_tokens: int | None = None, field: str = "metrics_data", values: dict | None = None
+) -> tuple[str, dict]:
+    """Renderiza `template` com as métricas em `{{field}}` dentro do orçamento; devolve prompt e estatísticas."""
+    values = dict(values or {})
+    max_tokens = PROMPT_TOKEN_BUDGET if max_tokens is None else max_tokens
+    with tracer.span("build_prompt") as span:
+        compiled = compile_template(template)
+        # O orçamento vale para o prompt inteiro; o texto fixo do template já consome parte dele.
+        fixed_tokens = estimate_tokens(compiled.render({**values, field: ""}))
+        metrics_json, stats = fit_metrics_to_budget(metrics, max(max_tokens - fixed_tokens, 0))
+        prompt = compiled.render({**values, field: metrics_json})
+        stats["prompt_tokens"] = estimate_tokens(prompt)
+        span.set(
+            prompt_tokens=stats["prompt_tokens"],
+            saved_tokens=stats["saved_tokens"],
+            saved_bytes=stats["saved_bytes"],
+            over_budget=stats["over_budget"],
+        )
+        return prompt, stats
@@ -0,0 +1,73 @@
+import math
+from collections import Counter
+
+# Erro relativo máximo de cada percentil (1%): buckets logarítmicos de razão GAMMA.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+INV_LOG_GAMMA = 1 / math.log(GAMMA)
+# Valores abaixo disso (inclusive negativos, de datas trocadas) caem num bucket "zero".
+MIN_VALUE = 1e-3
+ZERO_KEY = -(1 << 31)
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+def bucket_key(value: float) -> int:
+    if value < MIN_VALUE:
+        return ZERO_KEY
+    return math.ceil(math.log(value) * INV_LOG_GAMMA)
+
+
+def bucket_value(key: int) -> float:
+    """Ponto do bucket com erro relativo de no máximo RELATIVE_ACCURACY para qualquer valor dele."""
+    if key == ZERO_KEY:
+        return 0.0
+    return 2 * GAMMA ** key / (GAMMA + 1)
+
+
+class LogHistogram:
+    """
+    Sketch de quantis em buckets logarítmicos (no estilo do DDSketch): memória limitada pela
+    faixa de valores, não pelo número de amostras (de 1 s a 1 dia são ~570 buckets), e
+    `merge` exato entre sketches, então shards e janelas se combinam somando contagens.
+    """
+
+    __slots__ = ("counts",)
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+
+    def add(self, value: float) -> None:
+        self.counts[bucket_key(value)] += 1
+
+    def add_keys(self, keys) -> None:
+        """Soma buckets já calculados com `bucket_key` (caminhos colunares)."""
+        self.counts.update(keys)
+
+    def merge(self, other: "LogHistogram") -> None:
+        self.counts.update(other.counts)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> float:
+        total = len(self)
+        if not total:
+            return 0.0
+        rank = q * (total - 1)
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen > rank:
+                return bucket_value(key)
+        return bucket_value(max(self.counts))
+
+    def percentiles(self) -> dict:
+        """p50/p90/p99 em segundos inteiros (0 sem amostras, como as médias)."""
+        return {name: int(self.quantile(q)) for name, q in PERCENTILES}
+
+
+def merged(sketches) -> LogHistogram:
+    result = LogHistogram()
+    for sketch in sketches:
+        result.merge(sketch)
+    return result
@@ -0,0 +1,102 @@
+import json
+
+from utils.anomaly_engine import format_findings
+from utils.pipeline import Pipeline
+
+
+def parse_alert_lines(alerts_text: str) -> list:
+    return [line.strip("* ") for line in alerts_text.split('\n') if line.strip()]
+
+
+def format_report_markdown(report_json_str: str, top_clients: dict) -> tuple[str, str]:
+    """(título, markdown) do relatório a partir do JSON da IA e dos principais clientes."""
+    try:
+        report_data = json.loads(report_json_str)
+    except json.JSONDecodeError:
+        return "Relatório de Performance", f"**Ocorreu um erro ao formatar o relatório. Resposta da IA:**\n\n{report_json_str}"
+    title = report_data.get('title', 'Relatório de Performance')
+    lines = [f"### 📄 {title}\n", f"**Resumo:** {report_data.get('summary', 'N/A')}\n", "**Recomendações da IA:**"]
+    lines += [f"- {rec}" for rec in report_data.get('recommendations', [])]
+    if top_clients.get("clients"):
+        lines.append("\n**Principais Clientes:**")
+        lines += [
+            f"- {client['nome']}: {client['numero_de_pedidos']} pedido(s), R$ {client['valor_total_gasto']:.2f}"
+            for client in top_clients["clients"]
+        ]
+    return title, "\n".join(lines) + "\n"
+
+
+def format_anomalies_markdown(anomaly_scan: dict, explanation: str) -> str:
+    """Achados do monitoramento local e a explicação da IA (ou o aviso de que não houve achados)."""
+    findings = anomaly_scan.get("findings", [])
+    if not findings:
+        if not anomaly_scan.get("start_date"):
+            return "Sem histórico suficiente para detectar anomalias."
+        return f"Nenhuma anomalia significativa foi detectada entre {anomaly_scan['start_date']} e {anomaly_scan['end_date']}."
+    return (
+        f"### 🔎 Anomalias ({anomaly_scan['start_date']} a {anomaly_scan['end_date']})\n\n"
+        f"{format_findings(findings)}\n\n{explanation}"
+    )
+
+
+def build_report_pipeline(
+    metrics_plugin, anomalie_plugin, report_plugin, pedidos_json_str: str | None, on_anomaly_chunk=None, order_source=None
+) -> Pipeline:
+    """
+    Monta o /report como grafo: métricas gerais, principais clientes e o monitoramento
+    estatístico local em paralelo; depois as regras locais e a explicação da IA (só dos
+    achados sinalizados; sem achados, a IA não é chamada); por fim o relatório consolidado.
+    `on_anomaly_chunk`, se informado, recebe a análise da IA em pedaços (streaming).
+    Com `order_source` (ver `utils/order_sources.py`), os dados vêm da fonte de pedidos já
+    atualizada (log, SQLite...), em vez do JSON.
+    """
+
+    async def ai_anomalies(metrics: dict, anomaly_scan: dict) -> str:
+        findings = anomaly_scan.get("findings", [])
+        if on_anomaly_chunk is None:
+            return await anomalie_plugin.detect_anomalies_with_ai(metrics=metrics, findings=findings)
+        chunks = []
+        async for chunk in anomalie_plugin.stream_anomalies_with_ai(metrics=metrics, findings=findings):
+            chunks.append(chunk)
+            on_anomaly_chunk(chunk)
+        return "".join(chunks)
+
+    def alerts(rule_alerts: list, anomaly_scan: dict, ai_anomalies: str) -> list:
+        combined = list(rule_alerts)
+        for finding in anomaly_scan.get("findings", []):
+            if finding["message"] not in combined:
+                combined.append(finding["message"])
+        for line in parse_alert_lines(ai_anomalies):
+            if line not in combined:
+                combined.append(line)
+        return combined
+
+    async def report(metrics: dict, alerts: list) -> str:
+        return await report_plugin.generate_report(
+            restaurant_name=metrics.get("restaurant_name", "N/A"),
+            top_products=metrics.get("top_products", []),
+            avg_prep_seconds=metrics.get("avg_prep_seconds", 0),
+            avg_prep_today_seconds=metrics.get("avg_prep_today_seconds", 0),
+            avg_prep_30d_seconds=metrics.get("avg_prep_30d_seconds", 0),
+            alerts=alerts,
+        )
+
+    if order_source is None:
+        metrics = lambda: metrics_plugin.query_metrics(pedidos_json_str)
+        top_clients = lambda: metrics_plugin.query_top_clients(pedidos_json_str, k=3)
+        anomaly_scan = lambda: metrics_plugin.query_anomalies(pedidos_json_str)
+    else:
+        metrics = lambda: order_source.metrics()
+        top_clients = lambda: {"sort_by": "valor_total_gasto", "clients": order_source.top_clients(3)}
+        anomaly_scan = lambda: metrics_plugin.scan_anomalies(order_source.anomaly_store())
+
+    return (
+        Pipeline()
+        .add("metrics", metrics, blocking=True)
+        .add("top_clients", top_clients, blocking=True)
+        .add("anomaly_scan", anomaly_scan, blocking=True)
+        .add("rule_alerts", lambda metrics: [] if "error" in metrics else metrics_plugin.detect_anomalies(metrics), depends_on=("metrics",))
+        .add("ai_anomalies", ai_anomalies, depends_on=("metrics", "anomaly_scan"))
+        .add("alerts", alerts, depends_on=("rule_alerts", "anomaly_scan", "ai_anomalies"))
+        .add("report", report, depends_on=("metrics", "alerts"))
+    )
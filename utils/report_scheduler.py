@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from utils.dataset_cache import dataset_cache
+from utils.report_pipeline import build_report_pipeline, format_anomalies_markdown, format_report_markdown
+from utils.tracing import traced
+
+INDEX_FILE = "index.json"
+# Entra no digest: ao mudar o formato das métricas ou dos relatórios, suba a versão para que
+# digests salvos no index.json por versões anteriores não sejam reaproveitados.
+METRICS_DIGEST_VERSION = 2
+
+
+def metrics_digest(metrics: dict) -> str:
+    """Resumo (sha256) das métricas: dois resultados com o mesmo digest descrevem os mesmos dados."""
+    canonical = json.dumps(
+        {"version": METRICS_DIGEST_VERSION, "metrics": metrics},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def format_age(seconds: float) -> str:
+    if seconds < 60:
+        return "agora há pouco"
+    if seconds < 3600:
+        return f"há {int(seconds // 60)} min"
+    if seconds < 86400:
+        return f"há {int(seconds // 3600)} h"
+    return f"há {int(seconds // 86400)} dia(s)"
+
+
+class ReportIndex:
+    """
+    Relatórios materializados em `reports/`: um markdown para o relatório e outro para a
+    análise de anomalias, mais o `index.json` com os metadados de cada geração, para
+    listar e reabrir relatórios sem varrer o diretório.
+    """
+
+    def __init__(self, reports_dir: str = "reports") -> None:
+        self.reports_dir = reports_dir
+        self.index_path = os.path.join(reports_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+
+    def entries(self) -> list:
+        """Metadados dos relatórios, do mais antigo para o mais recente."""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("reports", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def add(self, entry: dict, report_markdown: str, anomalies_markdown: str) -> dict:
+        os.makedirs(self.reports_dir, exist_ok=True)
+        with self._lock:
+            entries = self.entries()
+            # Duas gerações no mesmo segundo (agendada e manual) não se sobrescrevem.
+            base = timestamp = datetime.fromisoformat(entry["generated_at"]).strftime("%Y-%m-%d_%H-%M-%S")
+            taken = {existing.get("report_file") for existing in entries}
+            suffix = 1
+            while f"report_{timestamp}.md" in taken:
+                suffix += 1
+                timestamp = f"{base}_{suffix}"
+            entry = {**entry, "report_file": f"report_{timestamp}.md", "anomalies_file": f"anomalies_{timestamp}.md"}
+            for name, content in ((entry["report_file"], report_markdown), (entry["anomalies_file"], anomalies_markdown)):
+                with open(os.path.join(self.reports_dir, name), "w", encoding="utf-8") as f:
+                    f.write(content)
+            entries.append(entry)
+            # Troca atômica: quem lê o índice nunca vê um arquivo pela metade.
+            tmp_path = f"{self.index_path}.tmp{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"reports": entries}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.index_path)
+        return entry
+
+    def read(self, entry: dict, kind: str = "report") -> str | None:
+        try:
+            with open(os.path.join(self.reports_dir, entry[f"{kind}_file"]), "r", encoding="utf-8") as f:
+                return f.read()
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def latest(self) -> dict | None:
+        """Última geração com o conteúdo dos dois markdowns, ou None."""
+        entries = self.entries()
+        if not entries:
+            return None
+        entry = entries[-1]
+        report_markdown = self.read(entry, "report")
+        anomalies_markdown = self.read(entry, "anomalies")
+        if report_markdown is None or anomalies_markdown is None:
+            return None
+        return {**entry, "report_markdown": report_markdown, "anomalies_markdown": anomalies_markdown}
+
+
+class ReportScheduler:
+    """
+    Mantém o /report e a análise de anomalias pré-calculados: no loop de fundo, refaz o
+    pipeline do relatório a cada `interval_seconds` ou quando `source_version()` muda
+    (por padrão, mtime/tamanho do arquivo de pedidos, ou a versão de `order_source`). Se o
+    digest das métricas não mudou, a IA não é chamada de novo. `latest()` devolve o último resultado na hora.
+    """
+
+    def __init__(
+        self,
+        loop,
+        metrics_plugin,
+        anomalie_plugin,
+        report_plugin,
+        pedidos_path: str,
+        index: ReportIndex | None = None,
+        interval_seconds: float = 3600,
+        poll_seconds: float = 5,
+        retry_seconds: float = 300,
+        source_version=None,
+        order_source=None,
+    ) -> None:
+        self._loop = loop
+        self._metrics_plugin = metrics_plugin
+        self._anomalie_plugin = anomalie_plugin
+        self._report_plugin = report_plugin
+        self._pedidos_path = pedidos_path
+        self.index = index or ReportIndex()
+        self.interval_seconds = interval_seconds
+        self.poll_seconds = poll_seconds
+        self.retry_seconds = retry_seconds
+        self._order_source = order_source
+        if source_version is None:
+            source_version = order_source.version if order_source is not None else lambda: dataset_cache.file_key(pedidos_path)
+        self._source_version = source_version
+
+        self._latest = self.index.latest()
+        self._refresh_lock = None
+        self._wake = None
+        self._future = None
+        self._stopped = False
+        self._failed_at = None
+        self.last_error = None
+        self.last_pipeline_result = None
+
+    def current_version(self):
+        try:
+            version = self._source_version()
+        except FileNotFoundError:
+            return None
+        return None if version is None else list(version)
+
+    def latest(self) -> dict | None:
+        return self._latest
+
+    def is_stale(self, result: dict | None = None) -> bool:
+        """Os pedidos mudaram depois que `result` (padrão: o último) foi gerado."""
+        result = result or self._latest
+        return result is None or result.get("source_version") != self.current_version()
+
+    def freshness(self, result: dict | None = None) -> str:
+        result = result or self._latest
+        if result is None:
+            return "Nenhum relatório pré-calculado ainda."
+        age = time.time() - datetime.fromisoformat(result["generated_at"]).timestamp()
+        text = f"Gerado {format_age(age)} ({result['generated_at'][:16].replace('T', ' ')}, métricas `{result['digest']}`)"
+        if self.is_stale(result):
+            text += " — os pedidos mudaram desde então; uma nova versão está sendo preparada"
+        return text
+
+    def start(self) -> None:
+        if self._future is None:
+            self._future = self._loop.submit(self._run())
+
+    def stop(self) -> None:
+        self._stopped = True
+        self.request_refresh()
+
+    def request_refresh(self) -> None:
+        """Acorda o agendador para verificar (e, se preciso, refazer) agora."""
+        if self._wake is not None:
+            self._loop.loop.call_soon_threadsafe(self._wake.set)
+
+    def _due(self) -> bool:
+        if self._failed_at is not None and time.time() - self._failed_at < self.retry_seconds:
+            return False
+        if self._latest is None or self.is_stale():
+            return True
+        checked_at = self._latest.get("checked_at", self._latest["generated_at"])
+        age = time.time() - datetime.fromisoformat(checked_at).timestamp()
+        return self.interval_seconds > 0 and age >= self.interval_seconds
+
+    async def _run(self) -> None:
+        self._wake = asyncio.Event()
+        while not self._stopped:
+            if self._due():
+                try:
+                    await self.refresh(trigger="agendado")
+                    self._failed_at = self.last_error = None
+                except Exception as exc:
+                    # Sem chave da API, rede fora etc.: o último resultado continua valendo
+                    # e a próxima tentativa espera `retry_seconds`.
+                    self._failed_at = time.time()
+                    self.last_error = f"{type(exc).__name__}: {exc}"
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    @traced("ReportScheduler.refresh")
+    async def refresh(self, force: bool = False, trigger: str = "manual", on_anomaly_chunk=None) -> dict:
+        """
+        Gera e materializa relatório e anomalias. Sem `force`, se as métricas têm o mesmo
+        digest do último resultado, só marca a verificação e o devolve (sem chamar a IA).
+        """
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            pedidos_json_str = None
+            if self._order_source is not None:
+                # A fonte só incorpora o que mudou (pedidos novos do log, revisão do SQLite...).
+                await asyncio.to_thread(self._order_source.refresh)
+                source_version = self.current_version()
+                metrics = await asyncio.to_thread(self._order_source.metrics)
+            else:
+                source_version = self.current_version()
+                pedidos_json_str = await asyncio.to_thread(dataset_cache.read_text, self._pedidos_path)
+                metrics = await asyncio.to_thread(self._metrics_plugin.query_metrics, pedidos_json_str)
+            digest = metrics_digest(metrics)
+            if not force and self._latest is not None and self._latest["digest"] == digest:
+                self._latest = {**self._latest, "source_version": source_version, "checked_at": datetime.now().isoformat(timespec="seconds")}
+                return self._latest
+
+            pipeline_result = await build_report_pipeline(
+                self._metrics_plugin,
+                self._anomalie_plugin,
+                self._report_plugin,
+                pedidos_json_str,
+                on_anomaly_chunk=on_anomaly_chunk,
+                order_source=self._order_source,
+            ).run()
+            title, report_markdown = format_report_markdown(pipeline_result["report"], pipeline_result["top_clients"])
+            anomalies_markdown = format_anomalies_markdown(pipeline_result["anomaly_scan"], pipeline_result["ai_anomalies"])
+            generated_at = datetime.now().isoformat(timespec="seconds")
+            entry = self.index.add(
+                {
+                    "generated_at": generated_at,
+                    "checked_at": generated_at,
+                    "digest": digest,
+                    "source_version": source_version,
+                    "trigger": trigger,
+                    "title": title,
+                    "restaurant_name": metrics.get("restaurant_name"),
+                    "findings": len(pipeline_result["anomaly_scan"].get("findings", [])),
+                    "pipeline_ms": round(pipeline_result.total_ms, 1),
+                },
+                report_markdown,
+                anomalies_markdown,
+            )
+            self._latest = {**entry, "report_markdown": report_markdown, "anomalies_markdown": anomalies_markdown}
+            self.last_pipeline_result = pipeline_result
+            return self._latest
@@ -0,0 +1,477 @@
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from datetime import date, timedelta
+
+from utils.client_ranking import CLIENT_SORT_KEYS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
+from utils.metrics_aggregation import WEEKDAYS, MetricsAggregator
+from utils.order_sources import OrderSource
+from utils.order_store import DAY_US, EPOCH_ORDINAL, MISSING, OrderStore, client_key
+from utils.quantile_sketch import LogHistogram, bucket_key
+from utils.tracing import tracer
+
+IMPORT_BATCH_SIZE = 50_000
+# Dias até o último pedido carregados para a varredura de anomalias: 8 semanas de linha de
+# base sazonal + a semana avaliada, com folga para o aquecimento do EWMA.
+ANOMALY_HISTORY_DAYS = 7 * 12
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clientes (
+    seq INTEGER PRIMARY KEY,            -- ordem de primeira aparição
+    client_key TEXT NOT NULL UNIQUE,    -- cliente.id em JSON (o nome quando não há id)
+    nome TEXT,
+    orders INTEGER NOT NULL DEFAULT 0,
+    spent REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS pedidos (
+    row INTEGER PRIMARY KEY,            -- ordem de chegada
+    ordered_at_us INTEGER,              -- data_pedido (horário de parede), NULL se irregular
+    month TEXT,
+    weekday INTEGER,
+    total REAL,
+    received_at_us INTEGER,
+    dispatched_at_us INTEGER,
+    prep_key INTEGER,                   -- bucket do sketch de quantis do preparo
+    client_key TEXT,
+    irregular TEXT                      -- pedido original (JSON) fora do formato esperado
+);
+CREATE TABLE IF NOT EXISTS itens (
+    pedido_row INTEGER NOT NULL,
+    product TEXT NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pedidos_ordered_at ON pedidos (ordered_at_us);
+CREATE INDEX IF NOT EXISTS pedidos_client ON pedidos (client_key);
+CREATE INDEX IF NOT EXISTS itens_product ON itens (product, quantity);
+CREATE INDEX IF NOT EXISTS itens_pedido ON itens (pedido_row);
+CREATE INDEX IF NOT EXISTS clientes_spent ON clientes (spent DESC, seq);
+CREATE INDEX IF NOT EXISTS clientes_orders ON clientes (orders DESC, seq);
+"""
+
+# Preparo em segundos, com a mesma divisão do caminho em Python.
+_PREP = "(dispatched_at_us - received_at_us) / 1000000.0"
+_REGULAR = "irregular IS NULL"
+# Dia do pedido com divisão arredondada para baixo (a `/` do SQLite trunca para zero antes de 1970).
+_DAY = f"((ordered_at_us - ((ordered_at_us % {DAY_US}) + {DAY_US}) % {DAY_US}) / {DAY_US})"
+
+
+class _SequentialSum:
+    """`seq_sum`: soma de floats na ordem de chegada, como o `+=` do Python (o `SUM` pode compensar o arredondamento)."""
+
+    def __init__(self) -> None:
+        self.total = 0.0
+
+    def step(self, value) -> None:
+        if value is not None:
+            self.total += value
+
+    def finalize(self) -> float:
+        return self.total
+
+
+def _day_us(day: date) -> int:
+    return (day.toordinal() - EPOCH_ORDINAL) * DAY_US
+
+
+class SQLiteOrderSource(OrderSource):
+    """
+    Histórico de pedidos em SQLite, com índices por data do pedido, cliente e produto. As
+    agregações (vendas por mês, totais por cliente, produtos mais vendidos, janelas de preparo,
+    resumos de período) rodam em SQL e só os grupos voltam para o Python, então anos de
+    histórico ficam em disco. Os pedidos são normalizados pelo `OrderStore` na importação;
+    os irregulares ficam guardados como JSON e passam pelo `MetricsAggregator`, como no store.
+    """
+
+    def __init__(self, path: str, create: bool = False) -> None:
+        if not create and not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.create_aggregate("seq_sum", 1, _SequentialSum)
+        self._metrics_cache = None
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _meta(self, key: str, default=None):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    @property
+    def restaurante(self) -> dict:
+        return self._meta("restaurante", {})
+
+    def version(self) -> list | None:
+        """[caminho, revisão]: a revisão sobe a cada importação, de qualquer processo."""
+        return [os.path.abspath(self.path), self._meta("revision", 0)]
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM pedidos")[0][0]
+
+    def set_restaurant(self, restaurante: dict) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('restaurante', ?)",
+                (json.dumps(restaurante, ensure_ascii=False),),
+            )
+            self._bump_revision()
+
+    def _bump_revision(self) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('revision', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def add_orders(self, pedidos, batch_size: int = IMPORT_BATCH_SIZE) -> int:
+        """Acrescenta pedidos, em lotes normalizados pelo `OrderStore`. Retorna quantos entraram."""
+        added = 0
+        batch = []
+        for pedido in pedidos:
+            batch.append(pedido)
+            if len(batch) >= batch_size:
+                added += self._insert_batch(batch)
+                batch = []
+        if batch:
+            added += self._insert_batch(batch)
+        return added
+
+    def _insert_batch(self, pedidos: list) -> int:
+        store = OrderStore()
+        store.extend(pedidos)
+        product_names = store.product_names
+        with self._lock, self._conn, tracer.span("sqlite.insert", orders=len(store)):
+            next_row = self._conn.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM pedidos").fetchone()[0]
+            pedido_rows = []
+            item_rows = []
+            client_rows = []
+            for row in range(len(store)):
+                if row in store.irregular:
+                    pedido = store.irregular[row]
+                    client = client_key(pedido)
+                    total = pedido.get("total") if isinstance(pedido, dict) else None
+                    if not isinstance(total, (int, float)):
+                        total = None
+                    client_json = None if client is None else json.dumps(client[0], ensure_ascii=False)
+                    pedido_rows.append((next_row + row, None, None, None, total, None, None, None, client_json,
+                                        json.dumps(pedido, ensure_ascii=False)))
+                    if client is not None and total is not None:
+                        client_rows.append((client_json, client[1], total))
+                    continue
+
+                ordered_at = store.ordered_at_us[row]
+                day = date.fromordinal(EPOCH_ORDINAL + ordered_at // DAY_US)
+                received_at = store.received_at_us[row]
+                dispatched_at = store.dispatched_at_us[row]
+                prep_key = None
+                if received_at == MISSING:
+                    received_at = dispatched_at = None
+                else:
+                    prep_key = bucket_key((dispatched_at - received_at) / 1_000_000)
+                code = store.client_codes[row]
+                client_json = json.dumps(store.client_ids[code], ensure_ascii=False)
+                total = store.totals[row]
+                pedido_rows.append((
+                    next_row + row, ordered_at, f"{day.year:04d}-{day.month:02d}", store.weekdays[row], total,
+                    received_at, dispatched_at, prep_key, client_json, None,
+                ))
+                client_rows.append((client_json, store.client_names[code], total))
+                for position in range(store.item_offsets[row], store.item_offsets[row + 1]):
+                    item_rows.append((next_row + row, product_names[store.item_products[position]], store.item_quantities[position]))
+
+            self._conn.executemany("INSERT INTO pedidos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", pedido_rows)
+            self._conn.executemany("INSERT INTO itens VALUES (?, ?, ?)", item_rows)
+            # Somas por cliente na ordem de chegada (as mesmas do ClientsAggregator).
+            self._conn.executemany(
+                "INSERT INTO clientes (client_key, nome, orders, spent) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (client_key) DO UPDATE SET orders = orders + 1, spent = spent + excluded.spent",
+                client_rows,
+            )
+            self._bump_revision()
+        self._metrics_cache = None
+        return len(store)
+
+    def metrics(self, today: date | None = None) -> dict:
+        today = today or date.today()
+        key = (today, self._meta("revision", 0))
+        cached = self._metrics_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with tracer.span("sqlite.metrics"):
+            result = self._aggregate(today).result(today)
+        self._metrics_cache = (key, result)
+        return result
+
+    def _aggregate(self, today: date) -> MetricsAggregator:
+        """
+        `MetricsAggregator` montado dos grupos calculados em SQL. Dos buckets diários, só os dias
+        das janelas "hoje" e "últimos 30 dias" são trazidos (os únicos que `result(today)` lê).
+        """
+        aggregator = MetricsAggregator()
+        aggregator.set_restaurant(self.restaurante)
+        # As somas de float seguem a ordem dos pedidos (`row`), como o agregador de referência.
+        aggregator.grand_total_sold = self._query(f"SELECT seq_sum(total) FROM pedidos WHERE {_REGULAR} ORDER BY row")[0][0]
+
+        prep_rows = f"SELECT weekday, {_PREP} AS seconds FROM pedidos WHERE {_REGULAR} AND received_at_us IS NOT NULL ORDER BY row"
+        aggregator.overall_prep_seconds, aggregator.overall_orders_count = self._query(
+            f"SELECT seq_sum(seconds), COUNT(*) FROM ({prep_rows})"
+        )[0]
+        for weekday, seconds, count in self._query(f"SELECT weekday, seq_sum(seconds), COUNT(*) FROM ({prep_rows}) GROUP BY weekday"):
+            day = WEEKDAYS[weekday]
+            aggregator.prep_time_by_day[day]["total_seconds"] = seconds
+            aggregator.prep_time_by_day[day]["count"] = count
+
+        for weekday, key, count in self._query(
+            f"SELECT weekday, prep_key, COUNT(*) FROM pedidos "
+            f"WHERE {_REGULAR} AND prep_key IS NOT NULL GROUP BY weekday, prep_key"
+        ):
+            aggregator.prep_sketch.counts[key] += count
+            aggregator.prep_sketch_by_day[WEEKDAYS[weekday]].counts[key] += count
+
+        window = (_day_us(today - timedelta(days=30)), _day_us(today + timedelta(days=1)))
+        for day_number, seconds, count in self._query(
+            f"SELECT day, seq_sum(seconds), COUNT(*) FROM ("
+            f"SELECT {_DAY} AS day, {_PREP} AS seconds FROM pedidos "
+            f"WHERE ordered_at_us >= ? AND ordered_at_us < ? AND received_at_us IS NOT NULL ORDER BY row) GROUP BY day",
+            window,
+        ):
+            aggregator.prep_by_date[date.fromordinal(EPOCH_ORDINAL + day_number)] = [seconds, count]
+        for day_number, key, count in self._query(
+            f"SELECT {_DAY}, prep_key, COUNT(*) FROM pedidos "
+            f"WHERE ordered_at_us >= ? AND ordered_at_us < ? AND prep_key IS NOT NULL GROUP BY 1, 2",
+            window,
+        ):
+            day = date.fromordinal(EPOCH_ORDINAL + day_number)
+            sketch = aggregator.prep_sketch_by_date.get(day)
+            if sketch is None:
+                sketch = aggregator.prep_sketch_by_date[day] = LogHistogram()
+            sketch.counts[key] += count
+
+        # Ordem de primeira aparição, como nos dicts do agregador.
+        month_totals = dict(self._query(
+            f"SELECT month, seq_sum(total) FROM (SELECT month, total FROM pedidos WHERE {_REGULAR} ORDER BY row) GROUP BY month"
+        ))
+        for month, weekday, count in self._query(
+            f"SELECT month, weekday, COUNT(*) FROM pedidos WHERE {_REGULAR} "
+            f"GROUP BY month, weekday ORDER BY MIN(row)"
+        ):
+            month_data = aggregator.sales_by_month.get(month)
+            if month_data is None:
+                month_data = aggregator.sales_by_month[month] = {"total_value_sold": month_totals[month], "sales_by_day": Counter()}
+            month_data["sales_by_day"][WEEKDAYS[weekday]] += count
+
+        irregular = [json.loads(payload) for (payload,) in self._query(
+            "SELECT irregular FROM pedidos WHERE irregular IS NOT NULL ORDER BY row"
+        )]
+        # Sem pedidos irregulares, os 3 mais vendidos saem prontos do SQL.
+        limit = "" if irregular else "LIMIT 3"
+        aggregator.product_counter.update(dict(self._query(
+            f"SELECT product, SUM(quantity) FROM itens GROUP BY product ORDER BY SUM(quantity) DESC, MIN(rowid) {limit}"
+        )))
+        if irregular:
+            others = MetricsAggregator()
+            others.add_many(irregular)
+            aggregator.merge(others)
+        return aggregator
+
+    def _client_row(self, row: tuple) -> dict:
+        client_json, nome, orders, spent = row
+        return {
+            "cliente_id": json.loads(client_json),
+            "nome": nome,
+            "numero_de_pedidos": orders,
+            "valor_total_gasto": round(spent, 2),
+        }
+
+    @staticmethod
+    def _sort_column(sort_by: str) -> str:
+        if sort_by not in CLIENT_SORT_KEYS:
+            raise ValueError(f"Ordenação inválida: {sort_by!r}. Use uma de {CLIENT_SORT_KEYS}.")
+        return "spent" if sort_by == "valor_total_gasto" else "orders"
+
+    def top_clients(self, k: int, sort_by: str = "valor_total_gasto") -> list:
+        column = self._sort_column(sort_by)
+        rows = self._query(f"SELECT client_key, nome, orders, spent FROM clientes ORDER BY {column} DESC, seq LIMIT ?", (k,))
+        return [self._client_row(row) for row in rows]
+
+    def clients_page(self, sort_by: str = "valor_total_gasto", limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> dict:
+        """
+        Mesma página (e mesmos cursores) de `ClientTable.page`, por paginação keyset sobre o
+        índice (valor, ordem de aparição): cada página lê só as suas linhas.
+        """
+        column = self._sort_column(sort_by)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where = ""
+        params = []
+        offset = 0
+        if cursor:
+            after_value, after_index, offset = decode_cursor(cursor, sort_by)
+            where = f"WHERE {column} < ? OR ({column} = ? AND seq > ?)"
+            params = [after_value, after_value, after_index + 1]
+        rows = self._query(
+            f"SELECT seq, client_key, nome, orders, spent FROM clientes {where} ORDER BY {column} DESC, seq LIMIT ?",
+            (*params, limit + 1),
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            seq, _, _, orders, spent = rows[-1]
+            next_cursor = encode_cursor(sort_by, spent if column == "spent" else orders, seq - 1, offset + limit)
+        return {
+            "sort_by": sort_by,
+            "total_clients": self._query("SELECT COUNT(*) FROM clientes")[0][0],
+            "offset": offset,
+            "clients": [self._client_row(row[1:]) for row in rows],
+            "next_cursor": next_cursor,
+        }
+
+    def summarize(self, start: date, end: date, weekday: int | None = None, client: str | None = None, product: str | None = None) -> dict:
+        """Mesmo resultado de `OrderStore.summarize`, com o filtro e os grupos em SQL."""
+        conditions = [_REGULAR, "ordered_at_us >= ?", "ordered_at_us < ?"]
+        params = [_day_us(start), _day_us(end)]
+        if weekday is not None:
+            conditions.append("weekday = ?")
+            params.append(weekday)
+        if client is not None:
+            conditions.append("client_key IN (SELECT client_key FROM clientes WHERE client_key = ? OR nome = ?)")
+            params += [json.dumps(client, ensure_ascii=False), client]
+        if product is not None:
+            conditions.append("row IN (SELECT pedido_row FROM itens WHERE product = ?)")
+            params.append(product)
+        # Em ordem de data (e de chegada), a mesma do índice de datas do `OrderStore`.
+        matched = (
+            f"SELECT row, ordered_at_us, total, weekday, received_at_us, dispatched_at_us FROM pedidos "
+            f"WHERE {' AND '.join(conditions)} ORDER BY ordered_at_us, row"
+        )
+
+        with tracer.span("sqlite.summarize"):
+            orders, total_sold, prep_seconds, prep_count = self._query(
+                f"WITH matched AS ({matched}) "
+                f"SELECT COUNT(*), seq_sum(total), seq_sum({_PREP}), COUNT(received_at_us) FROM matched",
+                params,
+            )[0]
+            orders_by_weekday = dict(self._query(
+                f"WITH matched AS ({matched}) SELECT weekday, COUNT(*) FROM matched GROUP BY weekday", params
+            ))
+            # Desempate pela primeira aparição em ordem de data, como no índice do `OrderStore`.
+            product_totals = self._query(
+                f"WITH matched AS ({matched}), sold AS ("
+                f"SELECT product, quantity, ROW_NUMBER() OVER (ORDER BY matched.ordered_at_us, itens.rowid) AS position "
+                f"FROM itens JOIN matched ON itens.pedido_row = matched.row) "
+                f"SELECT product, SUM(quantity) FROM sold GROUP BY product ORDER BY SUM(quantity) DESC, MIN(position)",
+                params,
+            )
+        if product is not None:
+            units_sold = sum(quantity for name, quantity in product_totals if name == product)
+        else:
+            units_sold = sum(quantity for _, quantity in product_totals)
+        return {
+            "orders": orders,
+            "total_sold": round(total_sold, 2),
+            "avg_ticket": round(total_sold / orders, 2) if orders else 0.0,
+            "avg_prep_seconds": int(prep_seconds / prep_count) if prep_count else 0,
+            "units_sold": units_sold,
+            "orders_by_weekday": {day: orders_by_weekday[code] for code, day in enumerate(WEEKDAYS) if code in orders_by_weekday},
+            "top_products": [{"name": name, "sold": sold} for name, sold in product_totals[:3]],
+        }
+
+    @property
+    def product_names(self) -> list:
+        return [name for (name,) in self._query("SELECT product FROM itens GROUP BY product ORDER BY MIN(rowid)")]
+
+    @property
+    def client_names(self) -> list:
+        return [name for (name,) in self._query("SELECT nome FROM clientes ORDER BY seq")]
+
+    def anomaly_store(self, today: date | None = None) -> OrderStore:
+        """
+        Só as últimas semanas do histórico (`ANOMALY_HISTORY_DAYS` até o último pedido, no
+        máximo hoje), em colunas, para a varredura de anomalias.
+        """
+        today = today or date.today()
+        last = self._query(f"SELECT MAX(ordered_at_us) FROM pedidos WHERE {_REGULAR}")[0][0]
+        store = OrderStore(self.restaurante)
+        if last is None:
+            return store
+        end_ordinal = min(today.toordinal(), EPOCH_ORDINAL + last // DAY_US + 1)
+        since = _day_us(date.fromordinal(end_ordinal - ANOMALY_HISTORY_DAYS))
+        with tracer.span("sqlite.anomaly_store") as span:
+            rows = self._query(
+                f"SELECT row, total, ordered_at_us, received_at_us, dispatched_at_us, weekday FROM pedidos "
+                f"WHERE {_REGULAR} AND ordered_at_us >= ? ORDER BY row",
+                (since,),
+            )
+            items = self._query(
+                "SELECT pedido_row, product, quantity FROM itens WHERE pedido_row IN "
+                f"(SELECT row FROM pedidos WHERE {_REGULAR} AND ordered_at_us >= ?) ORDER BY pedido_row, rowid",
+                (since,),
+            )
+            span.set(orders=len(rows), days=ANOMALY_HISTORY_DAYS)
+
+        product_index = {}
+        item_offsets = array("q", [0])
+        item_products = array("i")
+        item_quantities = array("q")
+        position = 0
+        for row, *_ in rows:
+            while position < len(items) and items[position][0] == row:
+                _, name, quantity = items[position]
+                item_products.append(product_index.setdefault(name, len(product_index)))
+                item_quantities.append(quantity)
+                position += 1
+            item_offsets.append(len(item_products))
+        columns = {
+            "totals": array("d", (row[1] for row in rows)),
+            "ordered_at_us": array("q", (row[2] for row in rows)),
+            "received_at_us": array("q", (MISSING if row[3] is None else row[3] for row in rows)),
+            "dispatched_at_us": array("q", (MISSING if row[4] is None else row[4] for row in rows)),
+            "weekdays": array("b", (row[5] for row in rows)),
+            "client_codes": array("i", [-1] * len(rows)),
+            "item_offsets": item_offsets,
+            "item_products": item_products,
+            "item_quantities": item_quantities,
+        }
+        return OrderStore.from_columns(self.restaurante, columns, [], [], list(product_index), {})
+
+
+def import_orders(source_path: str, db_path: str) -> int:
+    """Importa um arquivo de pedidos (JSON legado ou NDJSON, lido em streaming) para o SQLite."""
+    from utils.order_stream import OrderStream
+
+    source = SQLiteOrderSource(db_path, create=True)
+    try:
+        stream = OrderStream(source_path)
+        count = source.add_orders(stream)
+        if stream.restaurante:
+            source.set_restaurant(stream.restaurante)
+        return count
+    finally:
+        source.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Importa pedidos (JSON legado ou NDJSON) para um banco SQLite indexado.")
+    parser.add_argument("source", help="arquivo de pedidos (.json ou .ndjson)")
+    parser.add_argument("database", help="banco SQLite de destino (.db); pedidos são acrescentados se ele já existir")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    total = import_orders(args.source, args.database)
+    print(f"{total} pedido(s) importados para {args.database} ({time.perf_counter() - started:.1f}s)")
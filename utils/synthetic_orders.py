@@ -0,0 +1,107 @@
+import json
+import random
+from datetime import date, datetime, timedelta
+
+from utils.metrics_aggregation import WEEKDAYS
+
+SYNTHETIC_RESTAURANT = {
+    "id": 900,
+    "nome": "Restaurante Sintético",
+    "categoria": "Comida Brasileira",
+    "endereco": "Rua dos Testes, 100, Recife - PE",
+    "avaliacao": 4.5,
+}
+
+PRODUCTS = [
+    ("Tapioca de Frango com Catupiry", 18.0),
+    ("Tapioca de Carne de Sol com Queijo Coalho", 20.0),
+    ("Tapioca de Queijo Coalho", 14.0),
+    ("Tapioca de Frango com Queijo", 17.0),
+    ("Tapioca de Coco com Leite Condensado", 15.0),
+    ("Cuscuz com Ovo", 12.0),
+    ("Cuscuz com Charque", 16.5),
+    ("Suco de Acerola 500ml", 6.5),
+    ("Suco de Caju 500ml", 6.5),
+    ("Café Preto", 4.0),
+    ("Café com Leite", 5.5),
+    ("Bolo de Rolo (fatia)", 8.0),
+]
+
+FIRST_NAMES = ["Carlos", "Larissa", "Marcos", "Juliana", "Paulo", "Renata", "João", "Luciana", "Mariana", "Felipe", "Ana", "Bruno"]
+LAST_NAMES = ["Henrique", "Gomes", "Vinícius", "Azevedo", "Ricardo", "Silva", "Lucas", "Teixeira", "Costa", "Andrade", "Souza", "Lima"]
+PAYMENT_METHODS = ["Pix", "Cartão de Crédito", "Cartão de Débito", "Dinheiro"]
+STATUSES = ["Entregue", "Entregue", "Entregue", "Saiu para entrega"]
+
+
+def generate_orders(count: int, seed: int = 42, end_date: date | None = None, days: int = 365, clients: int | None = None):
+    """
+    Gera `count` pedidos no mesmo formato de `data/pedidos.json`, de forma determinística
+    para uma dada `seed`. É um gerador: 10M pedidos não ficam em memória ao mesmo tempo.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    start = datetime.combine(end_date - timedelta(days=days - 1), datetime.min.time())
+    span_minutes = days * 24 * 60
+    clients = clients or max(10, count // 20)
+
+    for index in range(count):
+        client_id = rng.randrange(clients)
+        pedido_dt = start + timedelta(minutes=rng.randrange(span_minutes))
+        recebimento_dt = pedido_dt + timedelta(seconds=rng.randint(20, 180))
+        # Preparo mais lento no fim de semana, para as análises terem algum sinal.
+        slow_factor = 1.3 if pedido_dt.weekday() >= 5 else 1.0
+        envio_dt = recebimento_dt + timedelta(seconds=max(60, int(rng.gauss(900, 240) * slow_factor)))
+
+        itens = []
+        total = 0.0
+        for name, price in rng.sample(PRODUCTS, rng.randint(1, 3)):
+            quantity = rng.randint(1, 3)
+            itens.append({"nome": name, "quantidade": quantity, "preco_unitario": price})
+            total += quantity * price
+
+        yield {
+            "id": 5000 + index,
+            "cliente": {
+                "id": 200 + client_id,
+                "nome": f"{FIRST_NAMES[client_id % len(FIRST_NAMES)]} {LAST_NAMES[(client_id // len(FIRST_NAMES)) % len(LAST_NAMES)]} {client_id}",
+                "endereco_entrega": f"Rua {client_id % 97}, {client_id % 1000}, Recife - PE",
+            },
+            "data_pedido": pedido_dt.isoformat(),
+            "dia_semana": WEEKDAYS[pedido_dt.weekday()],
+            "data_recebimento": recebimento_dt.isoformat(),
+            "data_envio": envio_dt.isoformat(),
+            "status": rng.choice(STATUSES),
+            "itens": itens,
+            "total": round(total, 2),
+            "forma_pagamento": rng.choice(PAYMENT_METHODS),
+        }
+
+
+def write_orders(path: str, count: int, seed: int = 42, **kwargs) -> str:
+    """Grava os pedidos sintéticos em streaming, como JSON legado ou NDJSON (pela extensão)."""
+    orders = generate_orders(count, seed=seed, **kwargs)
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            f.write(json.dumps({"restaurante": SYNTHETIC_RESTAURANT}, ensure_ascii=False) + "\n")
+            for pedido in orders:
+                f.write(json.dumps(pedido, ensure_ascii=False) + "\n")
+        else:
+            f.write('{"restaurante": ' + json.dumps(SYNTHETIC_RESTAURANT, ensure_ascii=False) + ', "pedidos": [')
+            for index, pedido in enumerate(orders):
+                f.write(",\n" if index else "\n")
+                f.write(json.dumps(pedido, ensure_ascii=False))
+            f.write("\n]}\n")
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera pedidos sintéticos no formato de data/pedidos.json")
+    parser.add_argument("path", help="arquivo de saída (.json ou .ndjson)")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    write_orders(args.path, args.count, seed=args.seed, days=args.days)
+    print(f"{args.count} pedido(s) sintéticos gravados em {args.path}")
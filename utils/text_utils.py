@@ -0,0 +1,9 @@
+import re
+import unicodedata
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e só com letras, dígitos, `/` e espaços."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"[^a-z0-9/ ]+", " ", text).strip()
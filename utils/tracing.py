@@ -0,0 +1,314 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "started_at", "duration_ms", "parent", "turn")
+
+    def __init__(self, name: str, attrs: dict, parent, turn) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.parent = parent
+        self.turn = turn
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "started_at": round(self.started_at, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "parent": self.parent.name if self.parent is not None else None,
+            "turn": self.turn.label if self.turn is not None else None,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    """Devolvido quando o tracing está desligado: custo de uma chamada de função."""
+
+    spans = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def format(self) -> str:
+        return ""
+
+    def breakdown(self) -> list:
+        return []
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ("_tracer", "_name", "_attrs", "_span", "_started")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._attrs = attrs
+
+    def __enter__(self) -> Span:
+        self._span = Span(self._name, self._attrs, _current_span.get(), _current_turn.get())
+        _current_span.set(self._span)
+        self._started = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._span.duration_ms = (time.perf_counter() - self._started) * 1000
+        if exc_type is not None:
+            self._span.attrs["error"] = exc_type.__name__
+        # Geradores assíncronos podem retomar em outro Context (ex.: BackgroundLoop.iterate), onde
+        # o token não vale; restaurar o pai explicitamente funciona nos dois casos.
+        _current_span.set(self._span.parent)
+        self._tracer._record(self._span)
+        return False
+
+
+class Turn:
+    """Spans de uma interação do usuário (um turno do chat), para o detalhamento por etapa."""
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.spans = []
+        self._started = time.perf_counter()
+        self.duration_ms = 0.0
+        self._token = None
+
+    def __enter__(self) -> "Turn":
+        self._token = _current_turn.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        _current_turn.reset(self._token)
+        return False
+
+    def breakdown(self) -> list:
+        rows = {}
+        for span in self.spans:
+            row = rows.setdefault(span.name, {"span": span.name, "count": 0, "total_ms": 0.0})
+            row["count"] += 1
+            row["total_ms"] += span.duration_ms
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    row[key] = row.get(key, 0) + value
+                elif isinstance(value, bool):
+                    row[key] = row.get(key, 0) + int(value)
+        for row in rows.values():
+            row["total_ms"] = round(row["total_ms"], 3)
+        return sorted(rows.values(), key=lambda row: row["total_ms"], reverse=True)
+
+    def format(self) -> str:
+        lines = [f"Turno '{self.label}': {self.duration_ms:.1f} ms"]
+        for row in self.breakdown():
+            extras = ", ".join(f"{key}={value}" for key, value in row.items() if key not in {"span", "count", "total_ms"})
+            lines.append(f"  - {row['span']}: {row['total_ms']:.1f} ms ({row['count']}x){' ' + extras if extras else ''}")
+        return "\n".join(lines)
+
+
+class Tracer:
+    """
+    Tracing leve dos caminhos quentes (leitura/parse, agregação, prompts, LLM).
+
+    Desligado por padrão; `AGENT_TRACING=1` liga, `AGENT_TRACE_FILE` exporta cada span em
+    JSONL e `AGENT_METRICS_PORT` serve os agregados em formato texto do Prometheus (a partir
+    de `serve_metrics_from_env()`, chamado pelo agent.py e pelo app.py).
+    """
+
+    def __init__(self, enabled: bool = False, jsonl_path: str | None = None) -> None:
+        self.enabled = enabled
+        self._jsonl_path = jsonl_path
+        self._jsonl_file = None
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._seconds = defaultdict(float)
+        self._attr_totals = defaultdict(float)
+        self._flag_totals = defaultdict(int)
+        self._server = None
+
+    def configure(self, enabled: bool | None = None, jsonl_path: str | None = None) -> None:
+        if enabled is not None:
+            self.enabled = enabled
+        if jsonl_path is not None:
+            with self._lock:
+                self._close_jsonl()
+                self._jsonl_path = jsonl_path
+
+    def close(self) -> None:
+        """Fecha o arquivo JSONL (reaberto no próximo span, se o tracing continuar ligado)."""
+        with self._lock:
+            self._close_jsonl()
+
+    def _close_jsonl(self) -> None:
+        if self._jsonl_file is not None:
+            self._jsonl_file.close()
+            self._jsonl_file = None
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return _SpanContext(self, name, attrs)
+
+    def turn(self, label: str):
+        if not self.enabled:
+            return _NOOP
+        return Turn(label)
+
+    def annotate(self, **attrs) -> None:
+        """Acrescenta atributos ao span corrente (ex.: tokens informados pelo modelo)."""
+        if not self.enabled:
+            return
+        span = _current_span.get()
+        if span is not None:
+            span.attrs.update(attrs)
+
+    def traced(self, name: str | None = None):
+        """Decorator para funções síncronas, assíncronas e geradores assíncronos."""
+
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            if inspect.isasyncgenfunction(func):
+                @functools.wraps(func)
+                async def async_gen_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        async for item in func(*args, **kwargs):
+                            yield item
+                        return
+                    with self.span(span_name):
+                        async for item in func(*args, **kwargs):
+                            yield item
+                return async_gen_wrapper
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    def _record(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" if self._jsonl_path else None
+        with self._lock:
+            self._counts[span.name] += 1
+            self._seconds[span.name] += span.duration_ms / 1000
+            for key, value in span.attrs.items():
+                # bool é subclasse de int: flags (ex.: cache_hit) são contadas à parte.
+                if isinstance(value, bool):
+                    self._flag_totals[(span.name, key)] += value
+                elif isinstance(value, (int, float)):
+                    self._attr_totals[(span.name, key)] += float(value)
+            if line is not None:
+                # Um handle aberto com buffer de linha: cada span é uma escrita, sem open/close.
+                if self._jsonl_file is None:
+                    self._jsonl_file = open(self._jsonl_path, "a", encoding="utf-8", buffering=1)
+                self._jsonl_file.write(line)
+        if span.turn is not None:
+            span.turn.spans.append(span)
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP agent_span_count_total Número de spans concluídos.",
+                "# TYPE agent_span_count_total counter",
+            ]
+            lines += [f'agent_span_count_total{{span="{name}"}} {count}' for name, count in sorted(self._counts.items())]
+            lines += [
+                "# HELP agent_span_duration_seconds_total Tempo acumulado por span.",
+                "# TYPE agent_span_duration_seconds_total counter",
+            ]
+            lines += [f'agent_span_duration_seconds_total{{span="{name}"}} {seconds:.6f}' for name, seconds in sorted(self._seconds.items())]
+            lines += [
+                "# HELP agent_span_attribute_total Soma dos atributos numéricos dos spans (tamanhos, tokens).",
+                "# TYPE agent_span_attribute_total counter",
+            ]
+            lines += [
+                f'agent_span_attribute_total{{span="{name}",attribute="{key}"}} {value:g}'
+                for (name, key), value in sorted(self._attr_totals.items())
+            ]
+            lines += [
+                "# HELP agent_span_flag_total Spans em que o atributo booleano era verdadeiro (cache hits, coalescência).",
+                "# TYPE agent_span_flag_total counter",
+            ]
+            lines += [
+                f'agent_span_flag_total{{span="{name}",attribute="{key}"}} {count}'
+                for (name, key), count in sorted(self._flag_totals.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int, host: str = "127.0.0.1") -> None:
+        """Serve `/metrics` no formato do Prometheus numa thread daemon (idempotente)."""
+        with self._lock:
+            if self._server is not None:
+                return
+            self._server = self._metrics_server(port, host)
+        threading.Thread(target=self._server.serve_forever, name="agent-metrics", daemon=True).start()
+
+    def _metrics_server(self, port: int, host: str) -> ThreadingHTTPServer:
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return ThreadingHTTPServer((host, port), MetricsHandler)
+
+
+tracer = Tracer(
+    enabled=os.getenv("AGENT_TRACING", "").strip().lower() in {"1", "true", "yes", "on"},
+    jsonl_path=os.getenv("AGENT_TRACE_FILE") or None,
+)
+
+
+def serve_metrics_from_env() -> None:
+    """Sobe o `/metrics` quando o tracing está ligado e `AGENT_METRICS_PORT` definido."""
+    port = os.getenv("AGENT_METRICS_PORT")
+    if tracer.enabled and port:
+        tracer.start_metrics_server(int(port))
+
+traced = tracer.traced